@@ -0,0 +1,218 @@
+import json
+import os
+import time
+from typing import Dict, List, Optional
+from openai import OpenAI
+
+_TERMINAL_STATUSES = ('completed', 'failed', 'expired', 'cancelled')
+
+class BatchRunner:
+    """Runs chat completion requests through the OpenAI Batch API.
+
+    Requests are written to JSONL input files, uploaded and submitted as batches, which
+    are then polled until they end. Successful responses are appended to a results log and
+    failed requests are resubmitted in a new batch, up to `max_attempts` times.
+
+    Everything needed to continue lives in `state_dir`: submitted batches are recorded before
+    polling starts, so an interrupted run picks up the same batches instead of paying for
+    them twice, and requests already in the results log are never submitted again. The
+    attempts of each request are counted from the recorded batches, so `max_attempts`
+    also holds across interrupted runs.
+    """
+
+    def __init__(self, client: OpenAI, state_dir: str, endpoint: str = '/v1/chat/completions', poll_interval: float = 30.0,
+                 max_attempts: int = 3, max_requests_per_batch: int = 50000, max_file_bytes: int = 100 * 1024 * 1024):
+        """
+        Initializes the BatchRunner.
+
+        Args:
+            client (OpenAI): The client used for the file and batch endpoints. Its base URL may point
+                to any server implementing them.
+            state_dir (str): Directory holding the input files, the submitted batches and the results log.
+            endpoint (str): The endpoint every request is sent to.
+            poll_interval (float): Seconds between two status checks.
+            max_attempts (int): Number of batches a request may be submitted in before it is given up.
+            max_requests_per_batch (int): Maximum number of requests per batch.
+            max_file_bytes (int): Maximum size of an input file.
+        """
+        self.client = client
+        self.state_dir = state_dir
+        self.endpoint = endpoint
+        self.poll_interval = poll_interval
+        self.max_attempts = max_attempts
+        self.max_requests_per_batch = max_requests_per_batch
+        self.max_file_bytes = max_file_bytes
+
+        self.batches_path = os.path.join(state_dir, 'batches.json')
+        self.results_path = os.path.join(state_dir, 'results.jsonl')
+        os.makedirs(state_dir, exist_ok=True)
+
+        self.attempts = {}
+        self.errors = {}
+
+    def _load_batches(self) -> List[dict]:
+        if not os.path.exists(self.batches_path):
+            return []
+        with open(self.batches_path, 'r', encoding='utf-8') as file:
+            return json.load(file)
+
+    def _save_batches(self, batches: List[dict]):
+        temporary_path = f'{self.batches_path}.tmp'
+        with open(temporary_path, 'w', encoding='utf-8') as file:
+            json.dump(batches, file)
+            file.flush()
+            os.fsync(file.fileno())
+        os.replace(temporary_path, self.batches_path)
+
+    def _load_results(self) -> Dict[str, str]:
+        results = {}
+        if not os.path.exists(self.results_path):
+            return results
+
+        with open(self.results_path, 'r', encoding='utf-8') as file:
+            for line in file:
+                if not line.endswith('\n'):
+                    break
+                record = json.loads(line)
+                results[record['custom_id']] = record['content']
+
+        return results
+
+    def _save_results(self, results: Dict[str, str]):
+        with open(self.results_path, 'a', encoding='utf-8') as file:
+            for custom_id, content in results.items():
+                file.write(json.dumps({'custom_id': custom_id, 'content': content}, ensure_ascii=False) + '\n')
+            file.flush()
+            os.fsync(file.fileno())
+
+    def _split(self, requests: Dict[str, dict]) -> List[List[str]]:
+        chunks = []
+        chunk = []
+        chunk_bytes = 0
+        for custom_id, body in requests.items():
+            size = len(json.dumps(body, ensure_ascii=False).encode('utf-8')) + 128
+            if chunk and (len(chunk) >= self.max_requests_per_batch or chunk_bytes + size > self.max_file_bytes):
+                chunks.append(chunk)
+                chunk = []
+                chunk_bytes = 0
+            chunk.append(custom_id)
+            chunk_bytes += size
+        if chunk:
+            chunks.append(chunk)
+
+        return chunks
+
+    def _submit(self, requests: Dict[str, dict], batches: List[dict]):
+        for custom_ids in self._split(requests):
+            input_path = os.path.join(self.state_dir, f'input_{len(batches)}.jsonl')
+            with open(input_path, 'w', encoding='utf-8') as file:
+                for custom_id in custom_ids:
+                    line = {'custom_id': custom_id, 'method': 'POST', 'url': self.endpoint, 'body': requests[custom_id]}
+                    file.write(json.dumps(line, ensure_ascii=False) + '\n')
+
+            with open(input_path, 'rb') as file:
+                input_file = self.client.files.create(file=file, purpose='batch')
+            batch = self.client.batches.create(input_file_id=input_file.id, endpoint=self.endpoint, completion_window='24h')
+
+            for custom_id in custom_ids:
+                self.attempts[custom_id] = self.attempts.get(custom_id, 0) + 1
+            batches.append({'id': batch.id, 'custom_ids': custom_ids, 'collected': False})
+            self._save_batches(batches)
+
+    def _read_file(self, file_id: Optional[str]) -> List[dict]:
+        if not file_id:
+            return []
+        text = self.client.files.content(file_id).text
+        return [json.loads(line) for line in text.splitlines() if line.strip()]
+
+    def _collect(self, batch) -> Dict[str, str]:
+        results = {}
+        for line in self._read_file(batch.output_file_id) + self._read_file(batch.error_file_id):
+            custom_id = line.get('custom_id')
+            response = line.get('response') or {}
+            if response.get('status_code') == 200:
+                results[custom_id] = response['body']['choices'][0]['message']['content']
+                self.errors.pop(custom_id, None)
+            else:
+                error = line.get('error') or response.get('body', {}).get('error') or {}
+                self.errors[custom_id] = error.get('message') or f"status code {response.get('status_code')}"
+
+        return results
+
+    def run(self, requests: Dict[str, dict]) -> Dict[str, Optional[str]]:
+        """
+        Runs the requests to completion.
+
+        Args:
+            requests (Dict[str, dict]): The request bodies (e.g., built by `OpenAIPredictor.batch_body`),
+                keyed by a unique id that maps each response back to its dataset row.
+
+        Returns:
+            Dict[str, Optional[str]]: The response content of each request, or None for requests that
+                still failed after `max_attempts` batches (the reasons are kept in `errors`).
+        """
+        results = {custom_id: content for custom_id, content in self._load_results().items() if custom_id in requests}
+        batches = self._load_batches()
+        in_flight = {custom_id for batch in batches if not batch['collected'] for custom_id in batch['custom_ids']}
+
+        self.attempts = {}
+        for batch in batches:
+            for custom_id in batch['custom_ids']:
+                self.attempts[custom_id] = self.attempts.get(custom_id, 0) + 1
+
+        # Requests that used up their attempts in an earlier run are not submitted again.
+        failed = {
+            custom_id for custom_id in requests
+            if custom_id not in results and custom_id not in in_flight and self.attempts.get(custom_id, 0) >= self.max_attempts
+        }
+        for custom_id in failed:
+            self.errors.setdefault(custom_id, f'failed in an earlier run after {self.max_attempts} attempts')
+
+        if results or in_flight or failed:
+            print(f"Batch API: {len(results)} responses already collected, {len(in_flight)} requests in submitted batches, "
+                  f"{len(failed)} requests out of attempts.")
+
+        while True:
+            pending = {
+                custom_id: body for custom_id, body in requests.items()
+                if custom_id not in results and custom_id not in in_flight and custom_id not in failed
+            }
+            if pending:
+                self._submit(pending, batches)
+                in_flight.update(pending)
+
+            if not in_flight:
+                break
+
+            time.sleep(self.poll_interval)
+
+            for entry in batches:
+                if entry['collected']:
+                    continue
+
+                batch = self.client.batches.retrieve(entry['id'])
+                if batch.status not in _TERMINAL_STATUSES:
+                    continue
+
+                collected = self._collect(batch)
+                self._save_results(collected)
+                results.update(collected)
+
+                for custom_id in entry['custom_ids']:
+                    in_flight.discard(custom_id)
+                    if custom_id in collected:
+                        continue
+                    self.errors.setdefault(custom_id, f'batch {batch.status}')
+                    if self.attempts.get(custom_id, 0) >= self.max_attempts:
+                        failed.add(custom_id)
+
+                entry['collected'] = True
+                self._save_batches(batches)
+
+                missing = len(entry['custom_ids']) - len(collected)
+                print(f"Batch {entry['id']} {batch.status}: {len(collected)} succeeded, {missing} failed.")
+
+        if failed:
+            print(f"Batch API: {len(failed)} requests failed after {self.max_attempts} attempts.")
+
+        return {custom_id: results.get(custom_id) for custom_id in requests}
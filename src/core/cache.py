@@ -0,0 +1,187 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from typing import Dict, List, Optional, Union
+
+def make_cache_key(service: str, model_name: str, messages: Union[str, List[Dict[str, str]]], max_tokens: int, temperature: float) -> str:
+    """
+    Builds the content address of a request.
+
+    Args:
+        service (str): The service name (e.g., 'openai').
+        model_name (str): The model name.
+        messages (Union[str, List[Dict[str, str]]]): The fully rendered messages.
+        max_tokens (int): Maximum number of tokens to generate.
+        temperature (float): Sampling temperature.
+
+    Returns:
+        str: The SHA-256 hex digest identifying the request.
+    """
+    payload = json.dumps(
+        {
+            'service': service.lower(),
+            'model_name': model_name,
+            'messages': messages,
+            'max_tokens': max_tokens,
+            'temperature': temperature,
+        },
+        sort_keys=True,
+        ensure_ascii=False,
+    )
+
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+# Number of least recently used entries removed at once when the cache is over its size budget.
+_EVICTION_BATCH = 32
+
+class ResponseCache:
+    """Persistent SQLite cache of model responses, keyed by `make_cache_key`.
+
+    The total size of the responses is read once when the cache is opened and kept up to date
+    by this process, so a write does not scan the table. Writes of other processes sharing the
+    file are counted the next time the cache is opened.
+    """
+
+    def __init__(self, path: str = 'cache/responses.sqlite', max_size_bytes: int = None):
+        """
+        Opens (or creates) the cache database.
+
+        Args:
+            path (str): Path to the SQLite file.
+            max_size_bytes (int, optional): Maximum total size of the stored responses. The least
+                recently used entries are evicted beyond it. Unlimited if None.
+        """
+        self.path = path
+        self.max_size_bytes = max_size_bytes
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        self.evictions = 0
+        self.lock = threading.Lock()
+
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        self.connection = sqlite3.connect(path, check_same_thread=False, timeout=30)
+        self.connection.execute('PRAGMA journal_mode=WAL')
+        self.connection.execute(
+            'CREATE TABLE IF NOT EXISTS responses ('
+            'key TEXT PRIMARY KEY, response TEXT NOT NULL, size INTEGER NOT NULL, '
+            'created_at REAL NOT NULL, accessed_at REAL NOT NULL)'
+        )
+        self.connection.execute('CREATE INDEX IF NOT EXISTS responses_accessed_at ON responses (accessed_at)')
+        self.connection.commit()
+        self.size_bytes = self.connection.execute('SELECT COALESCE(SUM(size), 0) FROM responses').fetchone()[0]
+
+    def get(self, key: str) -> Optional[str]:
+        """
+        Looks up a response.
+
+        Args:
+            key (str): The request key.
+
+        Returns:
+            Optional[str]: The cached response, or None on a miss.
+        """
+        with self.lock:
+            row = self.connection.execute('SELECT response FROM responses WHERE key = ?', (key,)).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+
+            self.hits += 1
+            self.connection.execute('UPDATE responses SET accessed_at = ? WHERE key = ?', (time.time(), key))
+            self.connection.commit()
+            return row[0]
+
+    def put(self, key: str, response: str):
+        """
+        Stores a response and evicts the least recently used entries if the cache is too large.
+
+        Args:
+            key (str): The request key.
+            response (str): The response to store.
+        """
+        if response is None:
+            return
+
+        now = time.time()
+        size = len(response.encode('utf-8'))
+        with self.lock:
+            replaced = self.connection.execute('SELECT size FROM responses WHERE key = ?', (key,)).fetchone()
+            self.connection.execute(
+                'INSERT OR REPLACE INTO responses (key, response, size, created_at, accessed_at) VALUES (?, ?, ?, ?, ?)',
+                (key, response, size, now, now)
+            )
+            self.size_bytes += size - (replaced[0] if replaced else 0)
+            if self.max_size_bytes is not None:
+                self._evict()
+            self.connection.commit()
+
+    def _evict(self):
+        oldest = 'SELECT key FROM responses ORDER BY accessed_at ASC LIMIT ?'
+        while self.size_bytes > self.max_size_bytes:
+            freed, count = self.connection.execute(
+                f'SELECT COALESCE(SUM(size), 0), COUNT(*) FROM responses WHERE key IN ({oldest})', (_EVICTION_BATCH,)
+            ).fetchone()
+            if not count:
+                self.size_bytes = 0
+                break
+            self.connection.execute(f'DELETE FROM responses WHERE key IN ({oldest})', (_EVICTION_BATCH,))
+            self.size_bytes -= freed
+            self.evictions += count
+
+    def clear(self):
+        """Removes every entry from the cache."""
+        with self.lock:
+            self.connection.execute('DELETE FROM responses')
+            self.connection.commit()
+            self.size_bytes = 0
+
+    def stats(self) -> dict:
+        """
+        Returns the hit/miss counters of this process and the size of the cache.
+
+        Returns:
+            dict: The cache statistics.
+        """
+        with self.lock:
+            entries, size_bytes = self.connection.execute('SELECT COUNT(*), COALESCE(SUM(size), 0) FROM responses').fetchone()
+
+        lookups = self.hits + self.misses
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': self.hits / lookups if lookups else 0.0,
+            'coalesced': self.coalesced,
+            'evictions': self.evictions,
+            'entries': entries,
+            'size_bytes': size_bytes,
+        }
+
+_caches: Dict[str, ResponseCache] = {}
+_caches_lock = threading.Lock()
+
+def get_response_cache(path: str, max_size_bytes: int = None) -> ResponseCache:
+    """
+    Returns the process-wide ResponseCache for a database file, so that the target model
+    and the judge share one connection and one set of statistics.
+
+    Args:
+        path (str): Path to the SQLite file.
+        max_size_bytes (int, optional): Maximum total size of the stored responses.
+
+    Returns:
+        ResponseCache: The shared cache.
+    """
+    key = os.path.abspath(path)
+    with _caches_lock:
+        if key not in _caches:
+            _caches[key] = ResponseCache(path=path, max_size_bytes=max_size_bytes)
+        elif max_size_bytes is not None:
+            _caches[key].max_size_bytes = max_size_bytes
+        return _caches[key]
@@ -0,0 +1,266 @@
+import asyncio
+import contextvars
+import threading
+import time
+from collections import deque
+from typing import Dict, Optional, Tuple
+from src.core.rate_limiter import is_throttled
+
+_current_slot = contextvars.ContextVar('current_slot', default=None)
+
+def is_timeout(exception: BaseException) -> bool:
+    """
+    Checks whether an exception (or any exception it was raised from) is a timeout.
+
+    Args:
+        exception (BaseException): The exception raised by a client.
+
+    Returns:
+        bool: True for client or server timeouts.
+    """
+    seen = set()
+    while exception is not None and id(exception) not in seen:
+        seen.add(id(exception))
+        if isinstance(exception, (asyncio.TimeoutError, TimeoutError)) or 'Timeout' in type(exception).__name__:
+            return True
+        if getattr(exception, 'status_code', None) in (408, 504):
+            return True
+        exception = exception.__cause__ or exception.__context__
+
+    return False
+
+def report_error(exception: BaseException):
+    """
+    Reports a failed attempt to the AIMDController that owns the current request, if any.
+
+    Predictors call this for every failed attempt, so that throttling is seen by the
+    controller even when the request later succeeds after a retry.
+
+    Args:
+        exception (BaseException): The exception raised by the attempt.
+    """
+    slot = _current_slot.get()
+    if slot is not None:
+        slot.controller._on_error(slot, exception)
+
+class _Slot:
+    def __init__(self, controller: 'AIMDController'):
+        self.controller = controller
+        self.started_at = time.monotonic()
+        self.failed = False
+
+class AIMDController:
+    """Additive-increase / multiplicative-decrease limit on the number of in-flight requests.
+
+    The window grows by `increase` after `limit` consecutive healthy completions (about
+    once per round trip) and is multiplied by `decrease_factor` on throttling or timeouts.
+    A request is healthy when it did not fail and the latency EWMA stays within
+    `latency_tolerance` times the best EWMA seen so far (or under `latency_target` if given).
+    """
+
+    def __init__(self, initial_limit: int = 4, min_limit: int = 1, max_limit: int = 64, increase: int = 1,
+                 decrease_factor: float = 0.5, latency_tolerance: float = 2.0, latency_target: float = None,
+                 smoothing: float = 0.2):
+        """
+        Initializes the AIMDController.
+
+        Args:
+            initial_limit (int): Initial number of in-flight requests.
+            min_limit (int): Lower bound of the window.
+            max_limit (int): Upper bound of the window.
+            increase (int): Additive increase applied after a full window of healthy requests.
+            decrease_factor (float): Multiplicative factor applied on throttling or timeouts.
+            latency_tolerance (float): Allowed ratio between the current and the best latency EWMA.
+            latency_target (float, optional): Absolute latency target in seconds. Overrides
+                `latency_tolerance` when given.
+            smoothing (float): Weight of the newest sample in the latency EWMA.
+        """
+        self.limit = max(min_limit, min(initial_limit, max_limit))
+        self.min_limit = min_limit
+        self.max_limit = max_limit
+        self.increase = increase
+        self.decrease_factor = decrease_factor
+        self.latency_tolerance = latency_tolerance
+        self.latency_target = latency_target
+        self.smoothing = smoothing
+
+        self.in_flight = 0
+        self.healthy_streak = 0
+        self.completed = 0
+        self.errors = 0
+        self.throttles = 0
+        self.timeouts = 0
+        self.latency_ewma = None
+        self.best_latency_ewma = None
+        self.last_decrease_at = 0.0
+        self.decisions = deque(maxlen=1000)
+
+        self.lock = threading.Lock()
+        self._loop = None
+        self._condition = None
+
+    def _get_condition(self) -> asyncio.Condition:
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop:
+            # A new event loop (e.g. a new asyncio.run) cannot have requests in flight.
+            self._loop = loop
+            self._condition = asyncio.Condition()
+            self.in_flight = 0
+        return self._condition
+
+    def _decide(self, action: str, new_limit: int, reason: str):
+        new_limit = max(self.min_limit, min(new_limit, self.max_limit))
+        if new_limit == self.limit:
+            return
+        self.decisions.append({
+            'time': time.time(),
+            'action': action,
+            'old_limit': self.limit,
+            'new_limit': new_limit,
+            'reason': reason,
+        })
+        self.limit = new_limit
+
+    def _is_latency_healthy(self) -> bool:
+        if self.latency_target is not None:
+            return self.latency_ewma <= self.latency_target
+        return self.latency_ewma <= self.latency_tolerance * self.best_latency_ewma
+
+    def _on_error(self, slot: _Slot, exception: BaseException):
+        with self.lock:
+            slot.failed = True
+            self.errors += 1
+            self.healthy_streak = 0
+
+            throttled = is_throttled(exception)
+            timed_out = not throttled and is_timeout(exception)
+            self.throttles += throttled
+            self.timeouts += timed_out
+
+            # Requests sent before the last cut were issued under the old window;
+            # their failures must not cut the window again.
+            if (throttled or timed_out) and slot.started_at > self.last_decrease_at:
+                reason = 'throttled' if throttled else 'timeout'
+                self._decide('decrease', int(self.limit * self.decrease_factor), reason)
+                self.last_decrease_at = time.monotonic()
+
+    def _on_success(self, slot: _Slot):
+        latency = time.monotonic() - slot.started_at
+        with self.lock:
+            self.completed += 1
+            if self.latency_ewma is None:
+                self.latency_ewma = latency
+            else:
+                self.latency_ewma = self.smoothing * latency + (1 - self.smoothing) * self.latency_ewma
+            if self.best_latency_ewma is None or self.latency_ewma < self.best_latency_ewma:
+                self.best_latency_ewma = self.latency_ewma
+
+            if slot.failed or not self._is_latency_healthy():
+                self.healthy_streak = 0
+                return
+
+            self.healthy_streak += 1
+            if self.healthy_streak >= self.limit:
+                self.healthy_streak = 0
+                self._decide('increase', self.limit + self.increase, 'healthy')
+
+    async def acquire(self) -> _Slot:
+        """
+        Waits until the number of in-flight requests is below the current window.
+
+        Returns:
+            _Slot: The slot to pass to `release`.
+        """
+        condition = self._get_condition()
+        async with condition:
+            await condition.wait_for(lambda: self.in_flight < self.limit)
+            self.in_flight += 1
+
+        return _Slot(self)
+
+    async def release(self, slot: _Slot, exception: Optional[BaseException] = None):
+        """
+        Records the outcome of a request and frees its slot.
+
+        Args:
+            slot (_Slot): The slot returned by `acquire`.
+            exception (BaseException, optional): The exception that ended the request, if any.
+        """
+        if exception is None:
+            self._on_success(slot)
+        elif not slot.failed:
+            self._on_error(slot, exception)
+
+        condition = self._get_condition()
+        async with condition:
+            self.in_flight -= 1
+            condition.notify_all()
+
+    def slot(self) -> '_SlotContext':
+        """
+        Returns an async context manager that holds a slot for the duration of a request.
+
+        Returns:
+            _SlotContext: The context manager.
+        """
+        return _SlotContext(self)
+
+    def stats(self) -> dict:
+        """
+        Returns the current window and counters.
+
+        Returns:
+            dict: The controller state, including the latest decisions.
+        """
+        with self.lock:
+            return {
+                'limit': self.limit,
+                'in_flight': self.in_flight,
+                'completed': self.completed,
+                'errors': self.errors,
+                'throttles': self.throttles,
+                'timeouts': self.timeouts,
+                'latency_ewma': self.latency_ewma,
+                'best_latency_ewma': self.best_latency_ewma,
+                'decisions': list(self.decisions)[-10:],
+            }
+
+class _SlotContext:
+    def __init__(self, controller: AIMDController):
+        self.controller = controller
+        self.slot = None
+        self.token = None
+
+    async def __aenter__(self) -> _Slot:
+        self.slot = await self.controller.acquire()
+        self.token = _current_slot.set(self.slot)
+        return self.slot
+
+    async def __aexit__(self, exc_type, exc, tb):
+        _current_slot.reset(self.token)
+        if isinstance(exc, asyncio.CancelledError):
+            exc = None
+            self.slot.failed = True
+        await self.controller.release(self.slot, exc)
+        return False
+
+_controllers: Dict[Tuple[str, str], AIMDController] = {}
+_controllers_lock = threading.Lock()
+
+def get_concurrency_controller(service: str, model_name: str, **kwargs) -> AIMDController:
+    """
+    Returns the process-wide AIMDController of a backend, creating it on first use.
+
+    Args:
+        service (str): The service name (e.g., 'openai').
+        model_name (str): The model name.
+        **kwargs: Arguments for the AIMDController constructor, used only on creation.
+
+    Returns:
+        AIMDController: The shared controller.
+    """
+    key = (service.lower(), model_name)
+    with _controllers_lock:
+        if key not in _controllers:
+            _controllers[key] = AIMDController(**kwargs)
+        return _controllers[key]
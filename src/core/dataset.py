@@ -0,0 +1,52 @@
+import json
+from typing import Iterator, List
+import pandas as pd
+
+def iter_jsonl_chunks(path: str, chunk_size: int = 10000) -> Iterator[pd.DataFrame]:
+    """
+    Reads a JSONL dataset a chunk of rows at a time.
+
+    Args:
+        path (str): Path to the JSONL dataset.
+        chunk_size (int): Number of rows per chunk.
+
+    Yields:
+        pd.DataFrame: The chunks, indexed by the position of their rows in the whole dataset,
+            like `pd.read_json(path, lines=True)`.
+    """
+    with pd.read_json(path, lines=True, chunksize=chunk_size) as reader:
+        yield from reader
+
+def count_jsonl_rows(path: str) -> int:
+    """
+    Counts the rows of a JSONL dataset without parsing them.
+
+    Args:
+        path (str): Path to the JSONL dataset.
+
+    Returns:
+        int: The number of non-empty lines.
+    """
+    rows = 0
+    with open(path, 'rb') as file:
+        for line in file:
+            rows += bool(line.strip())
+
+    return rows
+
+def jsonl_columns(path: str) -> List[str]:
+    """
+    Returns the columns of a JSONL dataset, read from its first row.
+
+    Args:
+        path (str): Path to the JSONL dataset.
+
+    Returns:
+        List[str]: The keys of the first row. Empty if the dataset has no rows.
+    """
+    with open(path, 'r', encoding='utf-8') as file:
+        for line in file:
+            if line.strip():
+                return list(json.loads(line))
+
+    return []
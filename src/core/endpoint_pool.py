@@ -0,0 +1,261 @@
+import hashlib
+import os
+import threading
+import time
+from contextlib import contextmanager
+from typing import List, Optional
+from src.core.http_pool import OpenAIClients
+from src.core.rate_limiter import get_rate_limiter, is_throttled
+
+class CircuitBreaker:
+    """Stops sending requests to a failing endpoint for a while.
+
+    After `failure_threshold` consecutive failures the breaker opens and its endpoint gets no
+    requests for `cooldown` seconds. Then a single trial request is let through (half-open):
+    its success closes the breaker, its failure opens it again. A trial without an outcome
+    after another `cooldown` (e.g. a cancelled request) is replaced by a new one. Throttling
+    is not a failure, since it is already handled by the rate limiter.
+    """
+
+    def __init__(self, failure_threshold: int = 3, cooldown: float = 30.0):
+        """
+        Initializes the CircuitBreaker closed.
+
+        Args:
+            failure_threshold (int): Number of consecutive failures that open the breaker.
+            cooldown (float): Seconds the breaker stays open before a trial request.
+        """
+        self.failure_threshold = failure_threshold
+        self.cooldown = cooldown
+        self.state = 'closed'
+        self.consecutive_failures = 0
+        self.opened_until = 0.0
+        self.trial_started = 0.0
+        self.trips = 0
+        self.lock = threading.Lock()
+
+    def _trial_due(self) -> bool:
+        now = time.monotonic()
+        if self.state == 'open':
+            return now >= self.opened_until
+        return self.state == 'half_open' and now >= self.trial_started + self.cooldown
+
+    def available(self) -> bool:
+        """Returns whether a request may be sent now, without claiming the half-open trial."""
+        with self.lock:
+            return self.state == 'closed' or self._trial_due()
+
+    def allow(self) -> bool:
+        """
+        Claims the right to send a request.
+
+        Returns:
+            bool: True if the breaker is closed, or if it is open, its cooldown is over and
+                this request becomes the half-open trial.
+        """
+        with self.lock:
+            if self.state == 'closed':
+                return True
+            if self._trial_due():
+                self.state = 'half_open'
+                self.trial_started = time.monotonic()
+                return True
+            return False
+
+    def record_success(self):
+        with self.lock:
+            self.state = 'closed'
+            self.consecutive_failures = 0
+
+    def record_failure(self):
+        with self.lock:
+            self.consecutive_failures += 1
+            if self.state == 'half_open' or (self.state == 'closed' and self.consecutive_failures >= self.failure_threshold):
+                self.state = 'open'
+                self.opened_until = time.monotonic() + self.cooldown
+                self.trips += 1
+
+class PoolMember:
+    """One API key on one endpoint, with its own clients, rate limiter and circuit breaker."""
+
+    def __init__(self, service: str, model_name: str, api_key: str, base_url: str = None, rpm: int = None, tpm: int = None,
+                 max_connections: int = 8, failure_threshold: int = 3, cooldown: float = 30.0, latency_smoothing: float = 0.2,
+                 **client_kwargs):
+        """
+        Initializes the PoolMember.
+
+        Args:
+            service (str): The service name (e.g., 'openai').
+            model_name (str): The model name.
+            api_key (str): The API key.
+            base_url (str, optional): The base URL of the endpoint. Defaults to the client default.
+            rpm (int, optional): Requests-per-minute limit of the key.
+            tpm (int, optional): Tokens-per-minute limit of the key.
+            max_connections (int): Size of the keep-alive connection pool to the endpoint.
+            failure_threshold (int): Number of consecutive failures that open the circuit breaker.
+            cooldown (float): Seconds the circuit breaker stays open.
+            latency_smoothing (float): Weight of the latest request in the moving average of the latency.
+            **client_kwargs: Additional arguments for the clients (e.g., 'max_retries', 'timeout').
+        """
+        self.clients = OpenAIClients(api_key, base_url=base_url, max_connections=max_connections, **client_kwargs)
+        self.client = self.clients.client
+        # Keys shared with other predictors or judges share their limiter, and so their quota.
+        self.rate_limiter = get_rate_limiter(service, model_name, api_key, rpm=rpm, tpm=tpm)
+        self.breaker = CircuitBreaker(failure_threshold, cooldown)
+        self.name = f"{self.clients.base_url}#{hashlib.sha256((api_key or '').encode()).hexdigest()[:8]}"
+        self.latency_smoothing = latency_smoothing
+
+        self.lock = threading.Lock()
+        self.in_flight = 0
+        self.requests = 0
+        self.successes = 0
+        self.failures = 0
+        self.throttled = 0
+        self.tokens = 0
+        self.latency = None
+
+    @property
+    def async_client(self):
+        return self.clients.async_client
+
+    def expected_seconds(self, tokens: int = 0) -> float:
+        """
+        Estimates when a new request sent to this member would complete.
+
+        Args:
+            tokens (int): Estimated number of tokens of the request.
+
+        Returns:
+            float: The wait for quota plus the average latency scaled by the requests in flight.
+                Members without measured latency score 0, so they are tried first.
+        """
+        with self.lock:
+            queueing = (self.latency or 0.0) * (self.in_flight + 1)
+        return self.rate_limiter.expected_wait(tokens) + queueing
+
+    @contextmanager
+    def track(self):
+        """Records the outcome and latency of the request sent inside the block."""
+        started = time.perf_counter()
+        with self.lock:
+            self.in_flight += 1
+            self.requests += 1
+        try:
+            yield
+        except Exception as e:
+            with self.lock:
+                if is_throttled(e):
+                    self.throttled += 1
+                else:
+                    self.failures += 1
+            if is_throttled(e):
+                self.breaker.record_success()
+            else:
+                self.breaker.record_failure()
+            raise
+        else:
+            latency = time.perf_counter() - started
+            with self.lock:
+                self.successes += 1
+                self.latency = latency if self.latency is None else (1 - self.latency_smoothing) * self.latency + self.latency_smoothing * latency
+            self.breaker.record_success()
+        finally:
+            with self.lock:
+                self.in_flight -= 1
+
+    def record_usage(self, estimated_tokens: int, used_tokens: Optional[int]):
+        """
+        Corrects the rate limiter of the member and counts the tokens it served.
+
+        Args:
+            estimated_tokens (int): The estimate passed to the rate limiter.
+            used_tokens (Optional[int]): The usage reported by the provider, if any.
+        """
+        self.rate_limiter.record_usage(estimated_tokens, used_tokens)
+        with self.lock:
+            self.tokens += used_tokens if used_tokens is not None else estimated_tokens
+
+    def stats(self) -> dict:
+        with self.lock:
+            return {
+                'member': self.name,
+                'state': self.breaker.state,
+                'requests': self.requests,
+                'successes': self.successes,
+                'failures': self.failures,
+                'throttled': self.throttled,
+                'trips': self.breaker.trips,
+                'in_flight': self.in_flight,
+                'tokens': self.tokens,
+                'latency_seconds': self.latency,
+            }
+
+class EndpointPool:
+    """Spreads the requests of an OpenAI-compatible predictor across several API keys and endpoints.
+
+    Every request goes to the available member expected to answer first, given the quota left
+    in its rate limiter and its observed latency. Members whose circuit breaker is open are
+    skipped, so a retried request fails over to the other members. A pool with a single member
+    behaves like a plain client.
+    """
+
+    def __init__(self, service: str, model_name: str, endpoints: List[dict] = None, api_key: str = None, base_url: str = None,
+                 rpm: int = None, tpm: int = None, **kwargs):
+        """
+        Initializes the EndpointPool.
+
+        Args:
+            service (str): The service name (e.g., 'openai').
+            model_name (str): The model name.
+            endpoints (List[dict], optional): The members, as dicts with the optional keys 'base_url',
+                'api_key' (or 'api_key_env', the environment variable holding it), 'rpm' and 'tpm'.
+                Missing values fall back to the arguments below. Defaults to a single member.
+            api_key (str, optional): The default API key.
+            base_url (str, optional): The default base URL.
+            rpm (int, optional): The default requests-per-minute limit of each key.
+            tpm (int, optional): The default tokens-per-minute limit of each key.
+            **kwargs: Additional arguments for every PoolMember (e.g., 'max_connections', 'cooldown', 'max_retries').
+        """
+        self.members = [
+            PoolMember(
+                service,
+                model_name,
+                api_key=endpoint.get('api_key') or os.environ.get(endpoint.get('api_key_env', '')) or api_key,
+                base_url=endpoint.get('base_url') or base_url,
+                rpm=endpoint.get('rpm') or rpm,
+                tpm=endpoint.get('tpm') or tpm,
+                **kwargs
+            )
+            for endpoint in endpoints or [{}]
+        ]
+
+    def choose(self, tokens: int = 0) -> PoolMember:
+        """
+        Picks the member that serves the next request.
+
+        Args:
+            tokens (int): Estimated number of tokens of the request.
+
+        Returns:
+            PoolMember: The available member expected to answer first. When every circuit
+                breaker is open, the member whose breaker closes first.
+        """
+        while True:
+            available = [member for member in self.members if member.breaker.available()]
+            if not available:
+                return min(self.members, key=lambda member: member.breaker.opened_until)
+
+            member = min(available, key=lambda member: (member.expected_seconds(tokens), member.in_flight, member.requests))
+            # Another request may have claimed the half-open trial in the meantime.
+            if member.breaker.allow():
+                return member
+
+    def stats(self) -> List[dict]:
+        """
+        Returns the statistics of every member.
+
+        Returns:
+            List[dict]: Breaker state, requests, successes, failures, throttled requests, breaker trips,
+                requests in flight, tokens served and average latency of each member.
+        """
+        return [member.stats() for member in self.members]
@@ -1,29 +1,101 @@
+import asyncio
+import hashlib
+import json
 import os
+from typing import Dict, List, Tuple
 from dotenv import load_dotenv, find_dotenv
 from src.core.messages.message_manager import MessageManager
 from src.core.predictors.predictor_manager import PredictionManager
+from src.core.regex import extract_batch_verdicts, normalize_verdict
 from src.core.utils import load_yaml
 
 load_dotenv(find_dotenv())
 
 class Evaluation:
-    def __init__(self, service: str = 'openai', model_name: str = 'gpt-4o-mini'):
+    def __init__(self, service: str = 'openai', model_name: str = 'gpt-4o-mini', **kwargs):
         """
         Initialize the Evaluation class.
 
         Args:
             service (str): The service name (default is 'openai').
             model_name (str): The model name (default is 'gpt-4o-mini').
-            api_key (str): The API key for the service (default is None).
+            api_key (str): The API key for the service (default is None, which uses OPENAI_API_KEY
+                for 'openai' and the default key of the predictor for other services).
+            **kwargs: Additional keyword arguments forwarded to the PredictionManager (e.g., 'concurrency').
         """
         self.service = service
         self.model_name = model_name
-        self.api_key = os.environ.get('OPENAI_API_KEY')
+        self.api_key = kwargs.pop('api_key', None) or (os.environ.get('OPENAI_API_KEY') if service.lower() == 'openai' else None)
         self.message_configs = load_yaml('configs/message.yaml')
 
-        self.prediction_manager = PredictionManager(service=self.service, model_name=self.model_name, api_key=self.api_key)
+        self.prediction_manager = PredictionManager(service=self.service, model_name=self.model_name, api_key=self.api_key, **kwargs)
         self.message_manager = MessageManager()
-        
+
+    def judge_version(self, message_type: str = 'openai', packed: bool = False) -> str:
+        """
+        Identify the judge configuration that produces the verdicts.
+
+        The version changes whenever the judge service, model, message type or judge prompts
+        in 'configs/message.yaml' change, so verdicts from different judges are never mixed.
+
+        Args:
+            message_type (str): The type of message (e.g., 'openai').
+            packed (bool): Whether the verdicts come from packed requests (`aevaluate_batch`),
+                which also use the batch prompts.
+
+        Returns:
+            str: The first 12 hex digits of the SHA-256 of the judge configuration.
+        """
+        # Packed runs fall back to single-item requests for unanswered items, so their verdicts
+        # also depend on the single-item prompt.
+        prompt_names = ['evaluate_response_specialist', 'evaluate_response_prompt']
+        if packed:
+            prompt_names += ['evaluate_batch_response_prompt', 'evaluate_batch_response_item']
+
+        payload = json.dumps(
+            {
+                'service': self.service.lower(),
+                'model_name': self.model_name,
+                'message_type': message_type,
+                'prompts': {name: self.message_configs.get(name) for name in prompt_names},
+            },
+            sort_keys=True,
+            ensure_ascii=False,
+        )
+
+        return hashlib.sha256(payload.encode('utf-8')).hexdigest()[:12]
+
+    @staticmethod
+    def _verdict(text: str) -> str:
+        """
+        Normalize a judge answer to the stored verdict.
+
+        Every evaluation path goes through this, so single, packed, offline and concurrent
+        evaluations store the same 'sim' / 'não' values.
+
+        Args:
+            text (str): The raw judge answer.
+
+        Returns:
+            str: 'sim' or 'não', or the raw answer when it is neither, so it can still be inspected.
+        """
+        return normalize_verdict(text) or text
+
+    def _build_messages(self, result: str, message_type: str = 'openai'):
+        """
+        Build the judge messages for a prediction.
+
+        Args:
+            result (str): The result from predictions.
+            message_type (str): The type of message (e.g., 'openai').
+
+        Returns:
+            Union[str, list]: The formatted judge messages.
+        """
+        prompt_evaluate = self.message_configs.get('evaluate_response_prompt').format(text=result)
+        specialist_evaluate = self.message_configs.get('evaluate_response_specialist')
+
+        return self.message_manager.generate_message(message_type, prompt_evaluate, specialist_evaluate)
 
     def evaluate_result(self, result: str, message_type: str = 'openai') -> str:
         """
@@ -35,12 +107,317 @@ class Evaluation:
             message_configs (dict): The message configuration dictionary.
 
         Returns:
-            str: The evaluation result.
+            str: The verdict ('sim' or 'não'), or the raw judge answer when it is neither.
         """
-        prompt_evaluate = self.message_configs.get('evaluate_response_prompt').format(text=result)
+        messages_evaluate = self._build_messages(result, message_type)
+        result_evaluate = self.prediction_manager.predict(messages=messages_evaluate)
+
+        return self._verdict(result_evaluate)
+
+    async def aevaluate_result(self, result: str, message_type: str = 'openai') -> str:
+        """
+        Evaluate prediction asynchronously.
+
+        Args:
+            result (str): The result from predictions.
+            message_type (str): The type of message (e.g., 'openai').
+
+        Returns:
+            str: The verdict ('sim' or 'não'), or the raw judge answer when it is neither.
+        """
+        messages_evaluate = self._build_messages(result, message_type)
+
+        return self._verdict(await self.prediction_manager.apredict(messages=messages_evaluate))
+
+    def evaluate_offline(self, results: Dict[str, str], state_dir: str, message_type: str = 'openai', **kwargs) -> Dict[str, str]:
+        """
+        Evaluate many predictions through the offline Batch API of the judge.
+
+        Args:
+            results (Dict[str, str]): The results from predictions, keyed by a unique id (e.g., the dataset row).
+            state_dir (str): Directory holding the state of the batches.
+            message_type (str): The type of message (e.g., 'openai').
+            **kwargs: Additional arguments for the BatchRunner (e.g., 'poll_interval').
+
+        Returns:
+            Dict[str, str]: The verdict of each id, or None when its requests kept failing.
+        """
+        messages_by_id = {custom_id: self._build_messages(result, message_type) for custom_id, result in results.items()}
+        responses = self.prediction_manager.predict_offline(messages_by_id, state_dir, **kwargs)
+
+        return {custom_id: self._verdict(response) for custom_id, response in responses.items()}
+
+    async def aevaluate_many(self, results: List[str], message_type: str = 'openai', concurrency: int = None, desc: str = None) -> List[str]:
+        """
+        Evaluate several predictions concurrently.
+
+        Args:
+            results (List[str]): The results from predictions.
+            message_type (str): The type of message (e.g., 'openai').
+            concurrency (int, optional): Maximum number of in-flight judge requests.
+            desc (str, optional): Progress bar description.
+
+        Returns:
+            List[str]: The verdicts, in the same order as `results`.
+        """
+        messages_list = [self._build_messages(result, message_type) for result in results]
+        responses = await self.prediction_manager.apredict_many(messages_list, concurrency=concurrency, desc=desc)
+
+        return [self._verdict(response) for response in responses]
+
+    async def aclassify_result(self, result: str, message_type: str = 'openai', threshold: float = 0.5) -> Tuple[str, float]:
+        """
+        Evaluate prediction with a single generated token and return a calibrated score.
+
+        The judge output is restricted to the first token of 'sim' or 'não' where the backend
+        supports logit bias, and the score is read from the token log-probabilities.
+
+        Args:
+            result (str): The result from predictions.
+            message_type (str): The type of message (e.g., 'openai').
+            threshold (float): Minimum score for a 'sim' verdict.
+
+        Returns:
+            Tuple[str, float]: The verdict ('sim' or 'não') and the probability of 'sim', or
+                (None, None) if the judge answered neither. The probability is None when the
+                backend exposes no log-probabilities, since its answer carries no score.
+        """
+        messages_evaluate = self._build_messages(result, message_type)
+        probabilities = await self.prediction_manager.aclassify(messages_evaluate, candidates=['sim', 'não'])
+
+        total = sum(probabilities.values())
+        if total == 0:
+            return None, None
+
+        score = probabilities['sim'] / total
+        verdict = 'sim' if score >= threshold else 'não'
+        if not self.prediction_manager.supports_logprobs:
+            return verdict, None
+
+        return verdict, score
+
+    def classify_result(self, result: str, message_type: str = 'openai', threshold: float = 0.5) -> Tuple[str, float]:
+        """
+        Evaluate prediction with a single generated token and return a calibrated score.
+
+        Args:
+            result (str): The result from predictions.
+            message_type (str): The type of message (e.g., 'openai').
+            threshold (float): Minimum score for a 'sim' verdict.
+
+        Returns:
+            Tuple[str, float]: The verdict ('sim' or 'não') and the probability of 'sim'.
+        """
+        return asyncio.run(self.aclassify_result(result, message_type, threshold))
+
+    def _build_batch_messages(self, results: List[str], message_type: str = 'openai'):
+        """
+        Build a single judge request packing several predictions as numbered items.
+
+        Args:
+            results (List[str]): The results from predictions.
+            message_type (str): The type of message (e.g., 'openai').
+
+        Returns:
+            Union[str, list]: The formatted judge messages.
+        """
+        item_template = self.message_configs.get('evaluate_batch_response_item')
+        texts = '\n'.join(item_template.format(number=number, text=result) for number, result in enumerate(results, 1))
+
+        prompt_evaluate = self.message_configs.get('evaluate_batch_response_prompt').format(texts=texts)
         specialist_evaluate = self.message_configs.get('evaluate_response_specialist')
 
-        messages_evaluate = self.message_manager.generate_message(message_type, prompt_evaluate, specialist_evaluate)
-        result_evaluate = self.prediction_manager.predict(messages=messages_evaluate)
+        return self.message_manager.generate_message(message_type, prompt_evaluate, specialist_evaluate)
+
+    @staticmethod
+    def _split_batches(results: List[str], batch_size: int, max_batch_chars: int) -> List[List[int]]:
+        batches = []
+        batch = []
+        batch_chars = 0
+        for index, result in enumerate(results):
+            result_chars = len(str(result))
+            if batch and (len(batch) >= batch_size or batch_chars + result_chars > max_batch_chars):
+                batches.append(batch)
+                batch = []
+                batch_chars = 0
+            batch.append(index)
+            batch_chars += result_chars
+        if batch:
+            batches.append(batch)
+
+        return batches
+
+    async def _aevaluate_packed(self, indices: List[int], results: List[str], verdicts: List[str], message_type: str):
+        if len(indices) == 1:
+            index = indices[0]
+            verdicts[index] = await self.aevaluate_result(results[index], message_type)
+            return
+
+        messages_evaluate = self._build_batch_messages([results[index] for index in indices], message_type)
+        # Each verdict takes a few tokens of JSON; leave room for the braces and a code fence.
+        response = await self.prediction_manager.apredict(messages=messages_evaluate, max_tokens=16 * len(indices) + 32)
+        parsed = extract_batch_verdicts(response)
+
+        missing = []
+        for number, index in enumerate(indices, 1):
+            if number in parsed:
+                verdicts[index] = parsed[number]
+            else:
+                missing.append(index)
+
+        if missing:
+            # Retry the unanswered items in two smaller requests, down to single-item requests.
+            middle = (len(missing) + 1) // 2
+            halves = [half for half in (missing[:middle], missing[middle:]) if half]
+            await asyncio.gather(*(self._aevaluate_packed(half, results, verdicts, message_type) for half in halves))
+
+    async def aevaluate_batch(self, results: List[str], message_type: str = 'openai', batch_size: int = 8, max_batch_chars: int = 48000) -> List[str]:
+        """
+        Evaluate several predictions with packed judge requests.
+
+        Up to `batch_size` predictions are sent as numbered items in one request, and the
+        judge answers with a JSON object of verdicts. Items whose verdict is missing or
+        malformed are split off and evaluated again in smaller requests.
+
+        Args:
+            results (List[str]): The results from predictions.
+            message_type (str): The type of message (e.g., 'openai').
+            batch_size (int): Maximum number of predictions per judge request.
+            max_batch_chars (int): Maximum number of prediction characters per judge request,
+                to stay within the context window of the judge.
+
+        Returns:
+            List[str]: The verdicts ('sim' or 'não'), in the same order as `results`.
+        """
+        verdicts = [None] * len(results)
+        batches = self._split_batches(results, batch_size, max_batch_chars)
+
+        await asyncio.gather(*(self._aevaluate_packed(batch, results, verdicts, message_type) for batch in batches))
+
+        return verdicts
+
+    def evaluate_batch(self, results: List[str], message_type: str = 'openai', batch_size: int = 8, max_batch_chars: int = 48000) -> List[str]:
+        """
+        Evaluate several predictions with packed judge requests.
+
+        Args:
+            results (List[str]): The results from predictions.
+            message_type (str): The type of message (e.g., 'openai').
+            batch_size (int): Maximum number of predictions per judge request.
+            max_batch_chars (int): Maximum number of prediction characters per judge request.
+
+        Returns:
+            List[str]: The verdicts ('sim' or 'não'), in the same order as `results`.
+        """
+        return asyncio.run(self.aevaluate_batch(results, message_type, batch_size, max_batch_chars))
+
+class EnsembleEvaluation:
+    """Evaluates each response with several judges in parallel and stops at the first quorum."""
+
+    default_message_types = {
+        'openai': 'openai',
+        'maritaca_ai': 'openai',
+        'gemini': 'gemini',
+    }
+
+    def __init__(self, judges: List[dict], quorum: int = None, **kwargs):
+        """
+        Initialize the EnsembleEvaluation class.
+
+        Args:
+            judges (List[dict]): One dict per judge with 'service' and 'model_name', plus optional
+                'message_type' and PredictionManager arguments (e.g., 'api_key', 'rpm').
+            quorum (int, optional): Number of identical verdicts that settle a response. Defaults to
+                a strict majority of the judges.
+            **kwargs: Additional keyword arguments forwarded to every judge's PredictionManager.
+        """
+        if not judges:
+            raise ValueError("At least one judge is required.")
+
+        self.quorum = quorum or len(judges) // 2 + 1
+        if self.quorum > len(judges):
+            raise ValueError(f"The quorum ({self.quorum}) cannot exceed the number of judges ({len(judges)}).")
+
+        self.judges = []
+        for judge in judges:
+            judge = dict(judge)
+            service = judge.pop('service')
+            model_name = judge.pop('model_name')
+            message_type = judge.pop('message_type', self.default_message_types.get(service.lower(), 'openai'))
+            evaluation = Evaluation(service=service, model_name=model_name, **{**kwargs, **judge})
+            self.judges.append((f'{service}:{model_name}', evaluation, message_type))
+
+    async def aevaluate_result(self, result: str) -> dict:
+        """
+        Evaluate prediction with every judge concurrently.
+
+        As soon as `quorum` judges return the same verdict, the calls still in flight are
+        cancelled. A judge that fails or answers neither 'sim' nor 'não' casts no vote.
+
+        Args:
+            result (str): The result from predictions.
+
+        Returns:
+            dict: 'verdict' (the quorum verdict, the plurality verdict if no quorum was reached,
+                or None without valid votes or on a tie), 'votes' (verdict, 'invalid', 'error' or
+                'cancelled' per judge), 'agreement' (share of valid votes matching the verdict, or
+                None without a verdict) and 'quorum_reached'.
+        """
+        tasks = {
+            asyncio.ensure_future(evaluation.aevaluate_result(result, message_type)): name
+            for name, evaluation, message_type in self.judges
+        }
+        votes = {name: 'cancelled' for name in tasks.values()}
+        counts = {}
+        verdict = None
+
+        pending = set(tasks)
+        try:
+            while pending and verdict is None:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    name = tasks[task]
+                    if task.exception() is not None:
+                        votes[name] = 'error'
+                        continue
+
+                    vote = normalize_verdict(task.result())
+                    votes[name] = vote or 'invalid'
+                    if vote is not None:
+                        counts[vote] = counts.get(vote, 0) + 1
+                        if counts[vote] >= self.quorum:
+                            verdict = vote
+        finally:
+            for task in pending:
+                task.cancel()
+            if pending:
+                await asyncio.gather(*pending, return_exceptions=True)
+
+        quorum_reached = verdict is not None
+        if not quorum_reached and counts:
+            # A tie has no plurality, so it is left undecided rather than settled by arrival order.
+            top = max(counts.values())
+            leaders = [vote for vote, count in counts.items() if count == top]
+            if len(leaders) == 1:
+                verdict = leaders[0]
+
+        valid_votes = sum(counts.values())
+        return {
+            'verdict': verdict,
+            'votes': votes,
+            'agreement': counts[verdict] / valid_votes if verdict is not None else None,
+            'quorum_reached': quorum_reached,
+        }
+
+    def evaluate_result(self, result: str) -> dict:
+        """
+        Evaluate prediction with every judge concurrently.
+
+        Args:
+            result (str): The result from predictions.
+
+        Returns:
+            dict: The verdict, the per-judge votes and the agreement statistics.
+        """
+        return asyncio.run(self.aevaluate_result(result))
 
-        return result_evaluate
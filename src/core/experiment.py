@@ -0,0 +1,356 @@
+import argparse
+import asyncio
+import json
+import os
+import pandas as pd
+from typing import Callable, Dict, List
+from src.core.dataset import count_jsonl_rows, iter_jsonl_chunks
+from src.core.evaluation import Evaluation, EnsembleEvaluation
+from src.core.pipeline import Pipeline, Stage
+from src.core.predictors.predictor_manager import PredictionManager
+from src.core.regex import classify_refusal
+from src.core.result_writer import ResultWriter, finalize_results
+from src.core.streaming import build_stop_conditions
+from src.core.utils import load_yaml, check_file_exists
+from tqdm import tqdm
+
+# Options shared by the experiment scripts, with their defaults (see `run_experiment`).
+RUN_OPTIONS = {
+    'concurrency': 8,
+    'rpm': None,
+    'tpm': None,
+    'judge_rpm': None,
+    'judge_tpm': None,
+    'adaptive_concurrency': False,
+    'cache_path': None,
+    'cache_max_size_mb': None,
+    'cache_bypass': False,
+    'resume': False,
+    'predict_workers': None,
+    'evaluate_workers': None,
+    'judge_batch_size': 1,
+    'judge_logprobs': False,
+    'prefilter': False,
+    'judges': None,
+    'judge_quorum': None,
+    'batch_api': False,
+    'batch_poll_interval': 30.0,
+    'generation_batch_size': 1,
+    'prefix_cache_mb': None,
+    'group_by_specialist': False,
+    'llama_workers': 1,
+    'llama_threads': None,
+    'stream': False,
+    'stop_on_refusal': False,
+    'stop_max_chars': None,
+    'endpoints_path': None,
+    'chunk_size': 1000,
+}
+
+def add_run_arguments(parser: argparse.ArgumentParser):
+    """
+    Adds the command-line flags of the options of `run_experiment` to a parser.
+
+    Args:
+        parser (argparse.ArgumentParser): The parser of an experiment script.
+    """
+    parser.add_argument('--concurrency', type=int, default=8, help='Maximum number of in-flight requests.')
+    parser.add_argument('--rpm', type=int, default=None, help='Requests-per-minute limit for the target model.')
+    parser.add_argument('--tpm', type=int, default=None, help='Tokens-per-minute limit for the target model.')
+    parser.add_argument('--judge_rpm', type=int, default=None, help='Requests-per-minute limit for the judge model.')
+    parser.add_argument('--judge_tpm', type=int, default=None, help='Tokens-per-minute limit for the judge model.')
+    parser.add_argument('--adaptive_concurrency', action='store_true', help='Adapt the number of in-flight requests to the observed latency and throttling.')
+    parser.add_argument('--cache_path', type=str, default=None, help='Path to the SQLite response cache (e.g., "cache/responses.sqlite").')
+    parser.add_argument('--cache_max_size_mb', type=int, default=None, help='Maximum size of the response cache in MB.')
+    parser.add_argument('--cache_bypass', action='store_true', help='Ignore cached responses but store the fresh ones.')
+    parser.add_argument('--resume', action='store_true', help='Continue an interrupted run, skipping the rows already in its result log.')
+    parser.add_argument('--predict_workers', type=int, default=None, help='Number of rows sent to the target model at the same time.')
+    parser.add_argument('--evaluate_workers', type=int, default=None, help='Number of judge requests in flight at the same time.')
+    parser.add_argument('--judge_batch_size', type=int, default=1, help='Number of responses packed into a single judge request.')
+    parser.add_argument('--judge_logprobs', action='store_true', help='Judge with a single token and store the probability of "sim".')
+    parser.add_argument('--prefilter', action='store_true', help='Classify obvious refusals locally instead of calling the judge.')
+    parser.add_argument('--judges', type=str, default=None, help='Comma-separated "service:model_name" judges of an ensemble (e.g., "openai:gpt-4o-mini,gemini:gemini-1.5-flash,maritaca_ai:sabia-3").')
+    parser.add_argument('--judge_quorum', type=int, default=None, help='Number of identical verdicts that settle a response in the ensemble.')
+    parser.add_argument('--batch_api', action='store_true', help='Send every request through the offline Batch API (OpenAI-compatible services).')
+    parser.add_argument('--batch_poll_interval', type=float, default=30.0, help='Seconds between two status checks of the submitted batches.')
+    parser.add_argument('--generation_batch_size', type=int, default=1, help='Number of rows generated together by the target model.')
+    parser.add_argument('--prefix_cache_mb', type=int, default=None, help='Memory budget of the llama.cpp prefix state cache in MB.')
+    parser.add_argument('--group_by_specialist', action='store_true', help='Process rows sharing a specialist prompt back to back.')
+    parser.add_argument('--llama_workers', type=int, default=1, help='Number of llama.cpp worker processes.')
+    parser.add_argument('--llama_threads', type=int, default=None, help='Number of CPU threads per llama.cpp worker.')
+    parser.add_argument('--stream', action='store_true', help='Stream the responses of the target model and record the time to first token.')
+    parser.add_argument('--stop_on_refusal', action='store_true', help='Abort responses that open with a refusal (implies --stream).')
+    parser.add_argument('--stop_max_chars', type=int, default=None, help='Abort responses once they reach this number of characters (implies --stream).')
+    parser.add_argument('--endpoints_path', type=str, default=None, help='YAML file listing the API keys and endpoints of each service (e.g., "configs/endpoints.yaml").')
+    parser.add_argument('--chunk_size', type=int, default=1000, help='Number of dataset rows read and rendered at a time.')
+
+def run_options(args: argparse.Namespace) -> dict:
+    """
+    Returns the options of `run_experiment` parsed by `add_run_arguments`.
+
+    Args:
+        args (argparse.Namespace): The parsed command line.
+
+    Returns:
+        dict: The options, with '--judges' split into (service, model_name) pairs.
+    """
+    options = {name: getattr(args, name) for name in RUN_OPTIONS}
+    options['judges'] = [tuple(judge.split(':', 1)) for judge in args.judges.split(',')] if args.judges else None
+    return options
+
+def run_experiment(desc: str, dataset_path: str, path_to_save: str, path_to_log: str, service: str, model_name: str,
+                   render_chunk: Callable[[pd.DataFrame], List[Dict]], render: Callable[[Dict], Dict] = None, render_workers: int = None,
+                   **options):
+    """
+    Generates and judges the responses of a model for every row of a dataset.
+
+    Rows are read a chunk at a time and flow through a render, predict, evaluate and write
+    pipeline (or through the offline Batch API). Results are appended to a crash-safe log as
+    they complete, so an interrupted run continues with `resume`, and the log is finally
+    joined with the dataset into a CSV in dataset order.
+
+    Args:
+        desc (str): Name of the experiment in the progress bar (e.g., 'Zero Shot').
+        dataset_path (str): Path to the input JSONL dataset.
+        path_to_save (str): Path to the CSV file to write.
+        path_to_log (str): Path to the JSONL result log.
+        service (str): The service name of the target model.
+        model_name (str): The name of the target model.
+        render_chunk (Callable[[pd.DataFrame], List[Dict]]): Renders the pending rows of a chunk. Returns one item per
+            row, in order, holding the 'messages' of the row unless `render` sets them.
+        render (Callable[[Dict], Dict], optional): Sync or async function completing an item before its prediction
+            (e.g., retrieving few-shot examples). It runs in its own pipeline stage, and must replace the inputs it
+            reads with the 'messages' of the item, since every other key is written to the result log.
+        render_workers (int, optional): Number of items rendered by `render` at the same time. Defaults to `concurrency`.
+        **options: The run options (see `RUN_OPTIONS` for the defaults):
+            concurrency (int): Maximum number of in-flight requests.
+            rpm, tpm (int): Requests- and tokens-per-minute limits of the target model. Unlimited if None.
+            judge_rpm, judge_tpm (int): Requests- and tokens-per-minute limits of the judge model. Unlimited if None.
+            adaptive_concurrency (bool): Adapt the number of in-flight requests per backend, starting from `concurrency`.
+            cache_path (str): Path to the SQLite response cache shared by the target model and the judge. Disabled if None.
+            cache_max_size_mb (int): Size above which the least recently used cache entries are evicted. Unlimited if None.
+            cache_bypass (bool): Skip cache lookups but still store the fresh responses.
+            resume (bool): Continue an interrupted run from its result log instead of refusing to overwrite it.
+            predict_workers (int): Number of rows sent to the target model at the same time. Defaults to `concurrency`
+                (or the maximum adaptive window).
+            evaluate_workers (int): Number of judge requests in flight at the same time. Same default as `predict_workers`.
+            judge_batch_size (int): Number of responses packed into a single judge request.
+            judge_logprobs (bool): Judge each response with a single token and store the probability of 'sim' in
+                'Evaluation_Score' (left empty when the judge backend exposes no log-probabilities).
+            prefilter (bool): Classify obvious refusals locally and send only the other responses to the judge.
+                'Evaluation_Stage' records whether a verdict came from the 'local' stage or the 'judge'.
+            judges (list): Judges of an ensemble, as (service, model_name) pairs. 'Evaluation_Votes' and
+                'Evaluation_Agreement' store the per-judge verdicts.
+            judge_quorum (int): Number of identical verdicts that settle a response in the ensemble. Defaults to a majority.
+            batch_api (bool): Send every target and judge request through the offline Batch API instead of the pipeline.
+                The batches are tracked next to the result log, so `resume` continues them after an interruption.
+            batch_poll_interval (float): Seconds between two status checks of the submitted batches.
+            generation_batch_size (int): Number of rows generated together by the target model.
+            prefix_cache_mb (int): Memory budget of the llama.cpp prefix state cache. Disabled if None.
+            group_by_specialist (bool): Process the rows of each chunk grouped by Domain and Subject, so that rows
+                sharing a specialist prompt run back to back. The results keep the dataset order.
+            llama_workers (int): Number of llama.cpp worker processes sharing the memory-mapped weights.
+            llama_threads (int): Number of CPU threads per llama.cpp worker. Defaults to the cores divided by the workers.
+            stream (bool): Stream the responses of the target model and store the time to first token in 'TTFT'.
+            stop_on_refusal (bool): Abort responses that open with a refusal. Implies `stream`.
+            stop_max_chars (int): Abort responses once they reach this number of characters. Implies `stream`.
+                'Abort_Reason' records which condition aborted each response.
+            endpoints_path (str): YAML file listing, per service, the API keys and endpoints to spread the target and
+                judge requests across. Disabled if None.
+            chunk_size (int): Number of dataset rows read and rendered at a time.
+
+    Raises:
+        ValueError: If an option is unknown or the options cannot be combined.
+    """
+    unknown = set(options) - set(RUN_OPTIONS)
+    if unknown:
+        raise ValueError(f"Unknown run options: {sorted(unknown)}.")
+    options = {**RUN_OPTIONS, **options}
+
+    concurrency = options['concurrency']
+    judge_batch_size = options['judge_batch_size']
+    generation_batch_size = options['generation_batch_size']
+    batch_api = options['batch_api']
+
+    if not options['resume']:
+        check_file_exists(path_to_save)
+        check_file_exists(path_to_log)
+
+    if batch_api and (options['judges'] or options['judge_logprobs'] or judge_batch_size > 1):
+        raise ValueError("The Batch API mode supports only the single judge with one response per request.")
+
+    stop_conditions = build_stop_conditions(options['stop_on_refusal'], options['stop_max_chars'])
+    stream = options['stream'] or bool(stop_conditions)
+    if stream and (batch_api or generation_batch_size > 1):
+        raise ValueError("Streaming generates one response per request; it cannot be combined with the Batch API or batched generation.")
+
+    cache_kwargs = {
+        'cache_path': options['cache_path'],
+        'cache_max_size_bytes': options['cache_max_size_mb'] * 1024 * 1024 if options['cache_max_size_mb'] else None,
+        'cache_bypass': options['cache_bypass'],
+    }
+    endpoints = load_yaml(options['endpoints_path']) if options['endpoints_path'] else None
+    judge_kwargs = {
+        'concurrency': concurrency,
+        'rpm': options['judge_rpm'],
+        'tpm': options['judge_tpm'],
+        'adaptive_concurrency': options['adaptive_concurrency'],
+        'endpoints': endpoints,
+        **cache_kwargs,
+    }
+
+    prediction_manager = PredictionManager(
+        service=service, model_name=model_name, concurrency=concurrency, rpm=options['rpm'], tpm=options['tpm'],
+        adaptive_concurrency=options['adaptive_concurrency'], prefix_cache_mb=options['prefix_cache_mb'],
+        llama_workers=options['llama_workers'], llama_threads=options['llama_threads'], endpoints=endpoints, **cache_kwargs
+    )
+
+    evaluation = Evaluation(**judge_kwargs)
+
+    ensemble = None
+    if options['judges']:
+        ensemble = EnsembleEvaluation(
+            [{'service': judge_service, 'model_name': judge_model_name} for judge_service, judge_model_name in options['judges']],
+            quorum=options['judge_quorum'], **judge_kwargs
+        )
+
+    writer = ResultWriter(path_to_log)
+    completed_rows = writer.completed_rows()
+    if completed_rows:
+        print(f"Resuming: {len(completed_rows)} rows already done.")
+
+    def pending_items():
+        # Each chunk of the dataset is rendered while the previous one is being processed.
+        for chunk in iter_jsonl_chunks(dataset_path, options['chunk_size']):
+            chunk = chunk[~chunk.index.isin(completed_rows)]
+
+            # The specialist prompt depends only on Domain and Subject.
+            group_columns = [column for column in ('Domain', 'Subject') if column in chunk.columns] if options['group_by_specialist'] else []
+            if group_columns:
+                chunk = chunk.sort_values(group_columns, kind='stable')
+
+            for index, item in zip(chunk.index, render_chunk(chunk)):
+                yield {'index': index, **item}
+
+    def classify_locally(item):
+        local_verdict = classify_refusal(item['Results']) if options['prefilter'] else None
+        if local_verdict is not None:
+            item['Evaluation'] = local_verdict
+            item['Evaluation_Stage'] = 'local'
+        return local_verdict is not None
+
+    async def predict(item):
+        if stream:
+            outcome = await prediction_manager.apredict_stream(messages=item['messages'], stop=stop_conditions)
+            item['Results'] = outcome['text']
+            item['TTFT'] = outcome['ttft']
+            item['Abort_Reason'] = outcome['abort_reason']
+        else:
+            item['Results'] = await prediction_manager.apredict(messages=item['messages'])
+        classify_locally(item)
+        return item
+
+    async def predict_batch(items):
+        results = await prediction_manager.apredict_batch([item['messages'] for item in items], batch_size=generation_batch_size)
+        for item, result in zip(items, results):
+            item['Results'] = result
+            classify_locally(item)
+        return items
+
+    async def evaluate(item):
+        if 'Evaluation' in item:
+            return item
+
+        item['Evaluation_Stage'] = 'judge'
+        if ensemble is not None:
+            outcome = await ensemble.aevaluate_result(result=item['Results'])
+            item['Evaluation'] = outcome['verdict']
+            item['Evaluation_Votes'] = json.dumps(outcome['votes'], ensure_ascii=False)
+            item['Evaluation_Agreement'] = outcome['agreement']
+        elif options['judge_logprobs']:
+            item['Evaluation'], item['Evaluation_Score'] = await evaluation.aclassify_result(result=item['Results'])
+        else:
+            item['Evaluation'] = await evaluation.aevaluate_result(result=item['Results'])
+        return item
+
+    async def evaluate_batch(items):
+        pending = [item for item in items if 'Evaluation' not in item]
+        verdicts = await evaluation.aevaluate_batch([item['Results'] for item in pending], batch_size=judge_batch_size)
+        for item, verdict in zip(pending, verdicts):
+            item['Evaluation'] = verdict
+            item['Evaluation_Stage'] = 'judge'
+        return items
+
+    progress = tqdm(total=count_jsonl_rows(dataset_path) - len(completed_rows), desc=desc)
+
+    def write(item):
+        writer.write(item['index'], {key: value for key, value in item.items() if key not in ('index', 'messages')})
+        progress.update(1)
+
+    if options['judge_logprobs'] or ensemble is not None:
+        # Single-token and ensemble judging score each response on its own.
+        judge_batch_size = 1
+
+    default_workers = prediction_manager.controller.max_limit if prediction_manager.controller else concurrency
+    render_stages = [Stage('render', render, workers=render_workers or concurrency)] if render is not None else []
+    pipeline = Pipeline(render_stages + [
+        # A local model generates one chunk at a time, so batched generation needs a single worker.
+        Stage('predict', predict_batch, workers=options['predict_workers'] or 1, batch_size=generation_batch_size) if generation_batch_size > 1
+        else Stage('predict', predict, workers=options['predict_workers'] or default_workers),
+        Stage('evaluate', evaluate_batch if judge_batch_size > 1 else evaluate, workers=options['evaluate_workers'] or default_workers, batch_size=judge_batch_size),
+        Stage('write', write),
+    ])
+
+    def run_offline():
+        # The target model answers every row first, then the judge evaluates the answers.
+        batch_dir = f'{os.path.splitext(path_to_log)[0]}_batch'
+        rendered = []
+        asyncio.run(Pipeline(render_stages + [Stage('collect', rendered.append)]).run(pending_items()))
+        items = {str(item['index']): item for item in rendered}
+        responses = prediction_manager.predict_offline(
+            {key: item['messages'] for key, item in items.items()}, os.path.join(batch_dir, 'predict'), poll_interval=options['batch_poll_interval']
+        )
+
+        to_judge = {}
+        for key, item in items.items():
+            item['Results'] = responses[key]
+            if item['Results'] is not None and not classify_locally(item):
+                to_judge[key] = item['Results']
+
+        verdicts = evaluation.evaluate_offline(to_judge, os.path.join(batch_dir, 'evaluate'), poll_interval=options['batch_poll_interval'])
+        for key, item in items.items():
+            if key in verdicts:
+                item['Evaluation'] = verdicts[key]
+                item['Evaluation_Stage'] = 'judge'
+            # Rows whose requests kept failing stay out of the log and are retried on resume.
+            if item.get('Evaluation') is not None:
+                write(item)
+
+    try:
+        if batch_api:
+            run_offline()
+        else:
+            asyncio.run(pipeline.run(pending_items()))
+    finally:
+        progress.close()
+        writer.close()
+
+    if not batch_api:
+        print(f"Pipeline: {pipeline.stats()}")
+
+    if options['adaptive_concurrency']:
+        print(f"Target concurrency: {prediction_manager.concurrency_stats()}")
+        print(f"Judge concurrency: {evaluation.prediction_manager.concurrency_stats()}")
+
+    if options['cache_path']:
+        print(f"Cache: {prediction_manager.cache_stats()}")
+
+    if endpoints:
+        print(f"Target endpoints: {prediction_manager.endpoint_stats()}")
+        print(f"Judge endpoints: {evaluation.prediction_manager.endpoint_stats()}")
+
+    generation_stats = prediction_manager.generation_stats()
+    if generation_stats:
+        print(f"Generation: {generation_stats}")
+
+    finalize_results(path_to_log, iter_jsonl_chunks(dataset_path, options['chunk_size']), path_to_save)
@@ -0,0 +1,160 @@
+import asyncio
+import os
+import threading
+from typing import Dict, Tuple
+import httpx
+from openai import OpenAI, AsyncOpenAI
+
+# Idle connections are kept open long enough to survive the pauses imposed by the rate limiter.
+KEEPALIVE_EXPIRY = 60.0
+
+DEFAULT_OPENAI_BASE_URL = 'https://api.openai.com/v1'
+
+def _drop_closed_loops(clients: dict):
+    # Pooled connections reference their loop, so clients of closed loops must be dropped explicitly.
+    for loop in [loop for loop in clients if loop.is_closed()]:
+        del clients[loop]
+
+class ConnectionPool:
+    """Keep-alive HTTP connections to one API endpoint, shared by every predictor and judge that calls it.
+
+    The synchronous client is shared by all threads. Asynchronous connections belong to the
+    event loop that opened them, so each running event loop gets its own client, which is
+    dropped once the loop is closed (e.g. after `asyncio.run`).
+    """
+
+    def __init__(self, base_url: str, max_connections: int = 8):
+        """
+        Initializes the ConnectionPool.
+
+        Args:
+            base_url (str): The base URL of the API.
+            max_connections (int): Maximum number of open (and kept alive) connections per client.
+        """
+        self.base_url = base_url
+        self.max_connections = max_connections
+        self.limits = httpx.Limits(
+            max_connections=max_connections,
+            max_keepalive_connections=max_connections,
+            keepalive_expiry=KEEPALIVE_EXPIRY
+        )
+        # Request timeouts are set per request by the API clients.
+        self.timeout = httpx.Timeout(600.0, connect=5.0)
+        self._client = None
+        self._async_clients = {}
+        self.lock = threading.Lock()
+
+    def client(self) -> httpx.Client:
+        """
+        Returns the synchronous HTTP client of the pool.
+
+        Returns:
+            httpx.Client: The shared client.
+        """
+        with self.lock:
+            if self._client is None:
+                self._client = httpx.Client(limits=self.limits, timeout=self.timeout, follow_redirects=True)
+            return self._client
+
+    def async_client(self) -> httpx.AsyncClient:
+        """
+        Returns the asynchronous HTTP client of the running event loop.
+
+        Returns:
+            httpx.AsyncClient: The client shared by every coroutine of the loop.
+        """
+        loop = asyncio.get_running_loop()
+        with self.lock:
+            client = self._async_clients.get(loop)
+            if client is None:
+                _drop_closed_loops(self._async_clients)
+                client = self._async_clients[loop] = httpx.AsyncClient(limits=self.limits, timeout=self.timeout, follow_redirects=True)
+            return client
+
+    def stats(self) -> dict:
+        """
+        Returns the size of the pool and the number of clients using it.
+
+        Returns:
+            dict: Base URL, maximum connections and the live synchronous and asynchronous clients.
+        """
+        with self.lock:
+            return {
+                'base_url': self.base_url,
+                'max_connections': self.max_connections,
+                'sync_client': self._client is not None,
+                'async_clients': sum(not loop.is_closed() for loop in self._async_clients),
+            }
+
+_pools: Dict[Tuple[str, int], ConnectionPool] = {}
+_pools_lock = threading.Lock()
+
+def get_connection_pool(base_url: str, max_connections: int = 8) -> ConnectionPool:
+    """
+    Returns the process-wide ConnectionPool for an (endpoint, size) pair.
+
+    Args:
+        base_url (str): The base URL of the API.
+        max_connections (int): Maximum number of open connections.
+
+    Returns:
+        ConnectionPool: The shared pool.
+    """
+    key = (base_url.rstrip('/'), max_connections)
+    with _pools_lock:
+        pool = _pools.get(key)
+        if pool is None:
+            pool = _pools[key] = ConnectionPool(key[0], max_connections)
+        return pool
+
+def pool_size(**kwargs) -> int:
+    """
+    Returns the number of connections needed by a PredictionManager.
+
+    Args:
+        **kwargs: The PredictionManager kwargs ('concurrency', 'adaptive_concurrency', 'max_concurrency').
+
+    Returns:
+        int: The upper bound of its in-flight requests.
+    """
+    if kwargs.get('adaptive_concurrency', False):
+        return kwargs.get('max_concurrency') or 64
+    return kwargs.get('concurrency') or 8
+
+class OpenAIClients:
+    """Synchronous and asynchronous clients of an OpenAI-compatible API on a shared ConnectionPool."""
+
+    def __init__(self, api_key: str, base_url: str = None, max_connections: int = 8, **client_kwargs):
+        """
+        Initializes the OpenAIClients.
+
+        Args:
+            api_key (str): The API key.
+            base_url (str, optional): The base URL of the API. Defaults to the OPENAI_BASE_URL
+                environment variable, or the OpenAI API.
+            max_connections (int): Maximum number of open connections to the API.
+            **client_kwargs: Additional arguments for the clients (e.g., 'max_retries', 'timeout').
+        """
+        self.api_key = api_key
+        self.base_url = base_url or os.environ.get('OPENAI_BASE_URL') or DEFAULT_OPENAI_BASE_URL
+        self.client_kwargs = client_kwargs
+        self.pool = get_connection_pool(self.base_url, max_connections)
+        self.client = OpenAI(api_key=api_key, base_url=self.base_url, http_client=self.pool.client(), **client_kwargs)
+        self._async_clients = {}
+        self.lock = threading.Lock()
+
+    @property
+    def async_client(self) -> AsyncOpenAI:
+        """The asynchronous client of the running event loop."""
+        loop = asyncio.get_running_loop()
+        with self.lock:
+            client = self._async_clients.get(loop)
+            if client is None:
+                _drop_closed_loops(self._async_clients)
+                client = self._async_clients[loop] = AsyncOpenAI(
+                    api_key=self.api_key,
+                    base_url=self.base_url,
+                    http_client=self.pool.async_client(),
+                    **self.client_kwargs
+                )
+            return client
@@ -0,0 +1,113 @@
+from string import Formatter
+from typing import Dict, Iterable, List, Mapping, Sequence
+import pandas as pd
+from src.core.utils import load_yaml
+
+# Dataset column filled into each placeholder of `configs/message.yaml`. Other placeholders use the column of the same name.
+PLACEHOLDER_COLUMNS = {
+    'question': 'Question',
+    'domain': 'Domain',
+    'subject': 'Subject',
+}
+
+class PromptTemplate:
+    """A template of `configs/message.yaml`, parsed once and rendered a whole column at a time."""
+
+    def __init__(self, name: str, text: str):
+        """
+        Parses the template.
+
+        Args:
+            name (str): The template name.
+            text (str): The template text, with `str.format` placeholders (e.g., '{question}').
+
+        Raises:
+            ValueError: If a placeholder has a conversion, a format spec or an attribute or index lookup.
+        """
+        self.name = name
+        self.text = text
+        self.parts = []
+        for literal, field, format_spec, conversion in Formatter().parse(text):
+            if literal:
+                self.parts.append((literal, None))
+            if field is None:
+                continue
+            if format_spec or conversion or not field.isidentifier():
+                raise ValueError(f"Template '{name}' has an unsupported placeholder '{{{field}}}'. Use plain names such as '{{question}}'.")
+            self.parts.append((None, field))
+
+        self.fields = tuple(dict.fromkeys(field for _, field in self.parts if field is not None))
+
+    def check_columns(self, columns: Iterable[str], optional: Iterable[str] = (), extra: Iterable[str] = ()):
+        """
+        Checks that every placeholder has a dataset column.
+
+        Args:
+            columns (Iterable[str]): The dataset columns.
+            optional (Iterable[str]): Placeholders rendered empty when their column is missing.
+            extra (Iterable[str]): Placeholders whose values are not dataset columns (e.g., retrieved examples).
+
+        Raises:
+            ValueError: If the column of a required placeholder is missing.
+        """
+        columns = set(columns)
+        missing = [field for field in self.fields if field not in extra and PLACEHOLDER_COLUMNS.get(field, field) not in columns]
+        required = [field for field in missing if field not in optional]
+        if required:
+            raise ValueError(
+                f"Template '{self.name}' needs the columns {[PLACEHOLDER_COLUMNS.get(field, field) for field in required]}, "
+                f"which the dataset does not have ({sorted(columns)})."
+            )
+        if missing:
+            print(f"Warning: template '{self.name}' renders {missing} empty: the dataset has no such columns.")
+
+    def render(self, values: Mapping[str, object]) -> str:
+        """
+        Renders the template for a single set of values.
+
+        Args:
+            values (Mapping[str, object]): The value of each placeholder. Missing ones are rendered empty.
+
+        Returns:
+            str: The rendered text.
+        """
+        return ''.join(literal if field is None else str(values.get(field, '')) for literal, field in self.parts)
+
+    def render_frame(self, df: pd.DataFrame, extra: Mapping[str, Sequence] = None) -> List[str]:
+        """
+        Renders the template for every row of a DataFrame, column-wise.
+
+        Args:
+            df (pd.DataFrame): The rows. Placeholders without a column are rendered empty.
+            extra (Mapping[str, Sequence], optional): Values of placeholders that are not dataset columns, one per row.
+
+        Returns:
+            List[str]: The rendered text of each row, in the order of the DataFrame.
+        """
+        extra = extra or {}
+        pieces = []
+        for literal, field in self.parts:
+            if field is None:
+                pieces.append([literal] * len(df))
+            elif field in extra:
+                pieces.append([str(value) for value in extra[field]])
+            else:
+                column = PLACEHOLDER_COLUMNS.get(field, field)
+                pieces.append(df[column].astype(str).tolist() if column in df.columns else [''] * len(df))
+
+        if not pieces:
+            return [''] * len(df)
+
+        return [''.join(parts) for parts in zip(*pieces)]
+
+def load_templates(path: str = 'configs/message.yaml') -> Dict[str, PromptTemplate]:
+    """
+    Loads and parses every template of a message config.
+
+    Args:
+        path (str): Path to the YAML file of templates.
+
+    Returns:
+        Dict[str, PromptTemplate]: The parsed templates, by name.
+    """
+    return {name: PromptTemplate(name, text) for name, text in load_yaml(path).items()}
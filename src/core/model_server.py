@@ -0,0 +1,201 @@
+import json
+import queue
+import threading
+import time
+import uuid
+from concurrent.futures import Future
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List, Union
+from src.core.predictors.base import PredictionModel
+
+class ModelServer:
+    """OpenAI-compatible HTTP server that keeps a local model resident and batches requests dynamically.
+
+    Every request is queued; a single scheduler thread takes up to `max_batch_size` queued
+    requests, waiting at most `max_wait_ms` for the batch to fill up, and generates the
+    requests that share the same parameters with one `predict_batch` call.
+
+    Responses hold the text returned by `predict_batch` of the wrapped predictor: only the
+    generated text, the same string `predict` returns for the request. Greedy results can still
+    differ slightly from direct use, since batched rows are padded and run together.
+    """
+
+    def __init__(self, predictor: PredictionModel, model_name: str, max_batch_size: int = 8, max_wait_ms: float = 10.0):
+        """
+        Initializes the ModelServer and starts its scheduler.
+
+        Args:
+            predictor (PredictionModel): The loaded local predictor (e.g., HuggingFacePredictor).
+            model_name (str): The model name reported by the server.
+            max_batch_size (int): Maximum number of requests generated together.
+            max_wait_ms (float): Maximum time the first request of a batch waits for others.
+        """
+        self.predictor = predictor
+        self.model_name = model_name
+        self.max_batch_size = max_batch_size
+        self.max_wait_ms = max_wait_ms
+        self.requests = queue.Queue()
+
+        self.lock = threading.Lock()
+        self.completed = 0
+        self.batches = 0
+        self.errors = 0
+
+        self.scheduler = threading.Thread(target=self._schedule, daemon=True)
+        self.scheduler.start()
+
+    def submit(self, messages: Union[str, List[Dict[str, str]]], **kwargs) -> Future:
+        """
+        Queues a request.
+
+        Args:
+            messages (Union[str, List[Dict[str, str]]]): The prompt or chat messages.
+            **kwargs: Generation arguments (e.g., max_tokens, temperature).
+
+        Returns:
+            Future: Resolves to the generated text.
+        """
+        future = Future()
+        self.requests.put((messages, kwargs, future))
+        return future
+
+    def _collect(self) -> list:
+        batch = [self.requests.get()]
+        deadline = time.monotonic() + self.max_wait_ms / 1000
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self.requests.get(timeout=remaining))
+            except queue.Empty:
+                break
+
+        return batch
+
+    def _schedule(self):
+        while True:
+            groups = {}
+            for messages, kwargs, future in self._collect():
+                groups.setdefault(tuple(sorted(kwargs.items())), []).append((messages, future))
+
+            for key, group in groups.items():
+                try:
+                    results = self.predictor.predict_batch([messages for messages, _ in group], batch_size=len(group), **dict(key))
+                except Exception as e:
+                    for _, future in group:
+                        future.set_exception(e)
+                    with self.lock:
+                        self.errors += len(group)
+                    continue
+
+                for (_, future), result in zip(group, results):
+                    future.set_result(result)
+                with self.lock:
+                    self.completed += len(group)
+                    self.batches += 1
+
+    def stats(self) -> dict:
+        """
+        Returns the request and batching counters of the server.
+
+        Returns:
+            dict: Completed requests, batches, mean batch size, errors and queued requests.
+        """
+        with self.lock:
+            return {
+                'model': self.model_name,
+                'completed': self.completed,
+                'batches': self.batches,
+                'mean_batch_size': self.completed / self.batches if self.batches else 0.0,
+                'errors': self.errors,
+                'queued': self.requests.qsize(),
+            }
+
+    def serve(self, host: str = '127.0.0.1', port: int = 8000):
+        """
+        Serves the OpenAI-compatible endpoints until interrupted.
+
+        Endpoints: POST /v1/chat/completions (chat messages), POST /v1/completions (plain
+        prompts, e.g. the llama-3.1 message format), GET /v1/models and GET /health.
+
+        Args:
+            host (str): The interface to listen on.
+            port (int): The port to listen on.
+        """
+        server = ThreadingHTTPServer((host, port), _handler(self))
+        server.daemon_threads = True
+        print(f"Serving {self.model_name} on http://{host}:{port}/v1")
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            server.server_close()
+
+def _handler(model_server: ModelServer):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = 'HTTP/1.1'
+
+        def log_message(self, format, *args):
+            pass
+
+        def _send(self, status: int, payload: dict):
+            data = json.dumps(payload, ensure_ascii=False).encode('utf-8')
+            self.send_response(status)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        def _error(self, status: int, message: str):
+            self._send(status, {'error': {'message': message, 'type': 'invalid_request_error' if status < 500 else 'server_error'}})
+
+        def do_GET(self):
+            if self.path.rstrip('/') == '/v1/models':
+                self._send(200, {'object': 'list', 'data': [{'id': model_server.model_name, 'object': 'model', 'owned_by': 'local'}]})
+            elif self.path.rstrip('/') == '/health':
+                self._send(200, model_server.stats())
+            else:
+                self._error(404, f"Unknown path: {self.path}")
+
+        def do_POST(self):
+            path = self.path.rstrip('/')
+            if path not in ('/v1/chat/completions', '/v1/completions'):
+                self._error(404, f"Unknown path: {self.path}")
+                return
+
+            try:
+                body = json.loads(self.rfile.read(int(self.headers.get('Content-Length', 0))))
+                if not isinstance(body, dict):
+                    raise ValueError("the body must be a JSON object")
+                messages = body['messages'] if path == '/v1/chat/completions' else body['prompt']
+            except (ValueError, KeyError) as e:
+                self._error(400, f"Invalid request: {e}")
+                return
+
+            kwargs = {key: body[key] for key in ('max_tokens', 'temperature') if body.get(key) is not None}
+            try:
+                text = model_server.submit(messages, **kwargs).result()
+            except Exception as e:
+                self._error(500, str(e))
+                return
+
+            choice = {'index': 0, 'finish_reason': 'stop', 'logprobs': None}
+            if path == '/v1/chat/completions':
+                choice['message'] = {'role': 'assistant', 'content': text}
+                kind = 'chat.completion'
+            else:
+                choice['text'] = text
+                kind = 'text_completion'
+
+            self._send(200, {
+                'id': f'local-{uuid.uuid4().hex}',
+                'object': kind,
+                'created': int(time.time()),
+                'model': model_server.model_name,
+                'choices': [choice],
+                'usage': {'prompt_tokens': 0, 'completion_tokens': 0, 'total_tokens': 0},
+            })
+
+    return Handler
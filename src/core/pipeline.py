@@ -0,0 +1,183 @@
+import asyncio
+import inspect
+import time
+from typing import Any, Callable, Iterable, List
+
+_DONE = object()
+# How often a worker filling a batch checks its input queue again.
+_POLL_INTERVAL = 0.005
+
+class Stage:
+    """A pipeline step run by its own pool of workers."""
+
+    def __init__(self, name: str, function: Callable[[Any], Any], workers: int = 1, queue_size: int = None,
+                 batch_size: int = 1, batch_timeout: float = 0.5):
+        """
+        Initializes the Stage.
+
+        Args:
+            name (str): The stage name, used in the statistics.
+            function (Callable[[Any], Any]): Sync or async function applied to each item. Its
+                return value is passed to the next stage.
+            workers (int): Number of items processed at the same time.
+            queue_size (int, optional): Capacity of the input queue of the stage. Upstream stages
+                block when it is full. Defaults to twice the number of workers (and batch size).
+            batch_size (int): When greater than 1, `function` receives a list of up to `batch_size`
+                items and must return a list of results of the same length.
+            batch_timeout (float): Seconds a worker waits for a batch to fill up after its first item.
+        """
+        self.name = name
+        self.function = function
+        self.workers = workers
+        self.batch_size = batch_size
+        self.batch_timeout = batch_timeout
+        self.queue_size = queue_size or 2 * workers * batch_size
+
+        self.processed = 0
+        self.busy_seconds = 0.0
+        self.starved_seconds = 0.0
+        self.blocked_seconds = 0.0
+
+    async def _apply(self, item: Any) -> Any:
+        result = self.function(item)
+        if inspect.isawaitable(result):
+            result = await result
+        return result
+
+    def stats(self, elapsed: float) -> dict:
+        """
+        Returns the counters of the stage.
+
+        Args:
+            elapsed (float): Wall-clock duration of the run, in seconds.
+
+        Returns:
+            dict: Processed items, utilization of the workers and time spent waiting on
+                the upstream stage (starved) or the downstream queue (blocked).
+        """
+        capacity = elapsed * self.workers
+        return {
+            'workers': self.workers,
+            'processed': self.processed,
+            'utilization': self.busy_seconds / capacity if capacity else 0.0,
+            'starved_seconds': self.starved_seconds,
+            'blocked_seconds': self.blocked_seconds,
+        }
+
+class Pipeline:
+    """Chain of stages connected by bounded asyncio queues.
+
+    Every stage runs independently, so a slow stage only limits throughput through
+    backpressure on its input queue instead of keeping the other stages idle. Items may
+    leave the pipeline out of order.
+    """
+
+    def __init__(self, stages: List[Stage]):
+        """
+        Initializes the Pipeline.
+
+        Args:
+            stages (List[Stage]): The stages, in processing order.
+        """
+        if not stages:
+            raise ValueError("A pipeline needs at least one stage.")
+
+        self.stages = stages
+        self.elapsed = 0.0
+
+    async def _feed(self, source: Iterable, queue: asyncio.Queue, workers: int):
+        for item in source:
+            await queue.put(item)
+        for _ in range(workers):
+            await queue.put(_DONE)
+
+    async def _collect(self, stage: Stage, input_queue: asyncio.Queue):
+        item = await input_queue.get()
+        if item is _DONE:
+            return [], True
+
+        batch = [item]
+        deadline = time.monotonic() + stage.batch_timeout
+        # Polling with get_nowait instead of wait_for(queue.get()): a get that completes as
+        # wait_for times out would take the item off the queue and then lose it.
+        while len(batch) < stage.batch_size:
+            try:
+                item = input_queue.get_nowait()
+            except asyncio.QueueEmpty:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                await asyncio.sleep(min(remaining, _POLL_INTERVAL))
+                continue
+            if item is _DONE:
+                return batch, True
+            batch.append(item)
+
+        return batch, False
+
+    async def _work(self, stage: Stage, input_queue: asyncio.Queue, output_queue: asyncio.Queue):
+        done = False
+        while not done:
+            started = time.monotonic()
+            batch, done = await self._collect(stage, input_queue)
+            stage.starved_seconds += time.monotonic() - started
+            if not batch:
+                return
+
+            started = time.monotonic()
+            if stage.batch_size > 1:
+                results = await stage._apply(batch)
+            else:
+                results = [await stage._apply(batch[0])]
+            stage.busy_seconds += time.monotonic() - started
+            stage.processed += len(batch)
+
+            if output_queue is not None:
+                started = time.monotonic()
+                for result in results:
+                    await output_queue.put(result)
+                stage.blocked_seconds += time.monotonic() - started
+
+    async def _run_stage(self, stage: Stage, input_queue: asyncio.Queue, output_queue: asyncio.Queue, next_workers: int):
+        await asyncio.gather(*(self._work(stage, input_queue, output_queue) for _ in range(stage.workers)))
+        if output_queue is not None:
+            for _ in range(next_workers):
+                await output_queue.put(_DONE)
+
+    async def run(self, source: Iterable):
+        """
+        Pushes every item of `source` through the stages.
+
+        If any stage raises, the other workers are cancelled and the exception is re-raised.
+
+        Args:
+            source (Iterable): The input items. It is consumed lazily, as the first queue drains.
+        """
+        queues = [asyncio.Queue(maxsize=stage.queue_size) for stage in self.stages]
+        tasks = [asyncio.ensure_future(self._feed(source, queues[0], self.stages[0].workers))]
+
+        for position, stage in enumerate(self.stages):
+            is_last = position == len(self.stages) - 1
+            output_queue = None if is_last else queues[position + 1]
+            next_workers = 0 if is_last else self.stages[position + 1].workers
+            tasks.append(asyncio.ensure_future(self._run_stage(stage, queues[position], output_queue, next_workers)))
+
+        started = time.monotonic()
+        try:
+            await asyncio.gather(*tasks)
+        except BaseException:
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+            raise
+        finally:
+            self.elapsed = time.monotonic() - started
+
+    def stats(self) -> dict:
+        """
+        Returns the statistics of every stage for the last run.
+
+        Returns:
+            dict: The stage statistics, keyed by stage name.
+        """
+        return {stage.name: stage.stats(self.elapsed) for stage in self.stages}
@@ -1,5 +1,17 @@
+import asyncio
+import threading
 from abc import ABC, abstractmethod
-from typing import List, Dict, Union
+from typing import AsyncIterator, Iterator, List, Dict, Union
+
+async def _close_stream(chunks: Iterator[str], pending: asyncio.Future, lock: threading.Lock):
+    try:
+        if pending is not None:
+            # Closing a generator while another thread runs it raises ValueError.
+            await asyncio.wait([pending])
+        if chunks is not None:
+            await asyncio.to_thread(chunks.close)
+    finally:
+        lock.release()
 
 class PredictionModel(ABC):
     """Abstract base class for prediction models."""
@@ -18,3 +30,122 @@ class PredictionModel(ABC):
             str: The prediction result.
         """
         pass
+
+    async def apredict(self, messages: Union[str, List[Dict[str, str]]], **kwargs) -> str:
+        """
+        Asynchronous version of `predict`.
+
+        Predictors backed by an async client should override this method. The default
+        implementation runs the blocking `predict` in a worker thread so that local
+        models can still be driven from an event loop. Calls are serialized per instance,
+        since local models are not safe to use from several threads at once.
+
+        Args:
+            messages (Union[str, List[Dict[str, str]]]): The input data for prediction.
+            **kwargs: Additional arguments forwarded to `predict` (e.g., max_tokens, temperature).
+
+        Returns:
+            str: The prediction result.
+        """
+        return await asyncio.to_thread(self._locked_predict, messages, **kwargs)
+
+    def stream(self, messages: Union[str, List[Dict[str, str]]], **kwargs) -> Iterator[str]:
+        """
+        Generates the prediction as a stream of text chunks.
+
+        Predictors that can stream should override this method. Closing the returned
+        generator must abort the generation. The default implementation yields the
+        result of `predict` as a single chunk.
+
+        Args:
+            messages (Union[str, List[Dict[str, str]]]): The input data for prediction.
+            **kwargs: Additional arguments forwarded to `predict` (e.g., max_tokens, temperature).
+
+        Yields:
+            str: The next chunk of generated text.
+        """
+        yield self.predict(messages, **kwargs)
+
+    async def astream(self, messages: Union[str, List[Dict[str, str]]], **kwargs) -> AsyncIterator[str]:
+        """
+        Asynchronous version of `stream`.
+
+        Predictors backed by an async client should override this method. The default
+        implementation pulls the chunks of the blocking `stream` from a worker thread,
+        holding the lock of the instance for the whole generation, or yields the result
+        of `apredict` when `stream` is not overridden.
+
+        Args:
+            messages (Union[str, List[Dict[str, str]]]): The input data for prediction.
+            **kwargs: Additional arguments forwarded to `stream` (e.g., max_tokens, temperature).
+
+        Yields:
+            str: The next chunk of generated text.
+        """
+        if type(self).stream is PredictionModel.stream:
+            yield await self.apredict(messages, **kwargs)
+            return
+
+        lock = self.__dict__.setdefault('_predict_lock', threading.Lock())
+        acquiring = asyncio.ensure_future(asyncio.to_thread(lock.acquire))
+        try:
+            await asyncio.shield(acquiring)
+        except asyncio.CancelledError:
+            # The worker thread takes the lock anyway, so it is handed back as soon as it does.
+            acquiring.add_done_callback(lambda _: lock.release())
+            raise
+
+        chunks = None
+        pending = None
+        try:
+            chunks = self.stream(messages, **kwargs)
+            while True:
+                pending = asyncio.ensure_future(asyncio.to_thread(next, chunks, None))
+                chunk = await asyncio.shield(pending)
+                pending = None
+                if chunk is None:
+                    break
+                yield chunk
+        finally:
+            # A cancellation cannot interrupt the cleanup task: the generator is closed once the
+            # chunk being generated is done, and the lock is always released.
+            await asyncio.shield(asyncio.ensure_future(_close_stream(chunks, pending, lock)))
+
+    def predict_batch(self, messages_list: List[Union[str, List[Dict[str, str]]]], **kwargs) -> List[str]:
+        """
+        Performs prediction for several inputs.
+
+        Local predictors that can generate several sequences in one forward pass should
+        override this method. The default implementation calls `predict` for each input.
+
+        Args:
+            messages_list (List[Union[str, List[Dict[str, str]]]]): The inputs for prediction.
+            **kwargs: Additional arguments forwarded to `predict` (e.g., max_tokens, temperature).
+                'batch_size' is accepted and ignored.
+
+        Returns:
+            List[str]: The prediction results, in input order.
+        """
+        kwargs.pop('batch_size', None)
+        return [self.predict(messages, **kwargs) for messages in messages_list]
+
+    async def apredict_batch(self, messages_list: List[Union[str, List[Dict[str, str]]]], **kwargs) -> List[str]:
+        """
+        Asynchronous version of `predict_batch`, serialized with `apredict` on the same instance.
+
+        Args:
+            messages_list (List[Union[str, List[Dict[str, str]]]]): The inputs for prediction.
+            **kwargs: Additional arguments forwarded to `predict_batch`.
+
+        Returns:
+            List[str]: The prediction results, in input order.
+        """
+        return await asyncio.to_thread(self._locked_call, self.predict_batch, messages_list, **kwargs)
+
+    def _locked_predict(self, messages: Union[str, List[Dict[str, str]]], **kwargs) -> str:
+        return self._locked_call(self.predict, messages, **kwargs)
+
+    def _locked_call(self, function, *args, **kwargs):
+        lock = self.__dict__.setdefault('_predict_lock', threading.Lock())
+        with lock:
+            return function(*args, **kwargs)
@@ -1,45 +1,172 @@
 import os
+from typing import AsyncIterator, Iterator
 import google.generativeai as genai
 from src.core.predictors.base import PredictionModel
 from dotenv import load_dotenv, find_dotenv
 from tenacity import (
     retry,
-    stop_after_attempt,
     wait_random_exponential
 )
+from src.core.rate_limiter import (
+    get_rate_limiter,
+    estimate_tokens,
+    get_retry_after,
+    stop_after_attempt_unless_throttled
+)
+from src.core.concurrency import report_error
 from google.generativeai.types import HarmCategory, HarmBlockThreshold
 
 
 load_dotenv(find_dotenv())
 
+SAFETY_SETTINGS = {
+    HarmCategory.HARM_CATEGORY_HATE_SPEECH: HarmBlockThreshold.BLOCK_NONE,
+    HarmCategory.HARM_CATEGORY_HARASSMENT: HarmBlockThreshold.BLOCK_NONE,
+    HarmCategory.HARM_CATEGORY_SEXUALLY_EXPLICIT: HarmBlockThreshold.BLOCK_NONE,
+    HarmCategory.HARM_CATEGORY_DANGEROUS_CONTENT: HarmBlockThreshold.BLOCK_NONE,
+}
+
+def _cancel_stream(response):
+    # Streamed responses of the SDK have no close method; cancelling the underlying gRPC call
+    # (or closing its iterator) ends the request, so the server stops generating.
+    iterator = getattr(response, '_iterator', None)
+    close = getattr(iterator, 'cancel', None) or getattr(iterator, 'close', None)
+    if close is not None:
+        close()
+
+async def _acancel_stream(response):
+    iterator = getattr(response, '_iterator', None)
+    cancel = getattr(iterator, 'cancel', None)
+    if cancel is not None:
+        cancel()
+        return
+    aclose = getattr(iterator, 'aclose', None)
+    if aclose is not None:
+        await aclose()
+
 class GeminiPredictor(PredictionModel):
-    def __init__(self, model_name: str, api_key: str = None):
+    def __init__(self, model_name: str, api_key: str = None, rpm: int = None, tpm: int = None):
         self.model_name = model_name
         self.api_key = api_key or os.environ.get('GEMINI_API_KEY')
         genai.configure(api_key=self.api_key)
-    
+        # Model objects are reused across calls; the gRPC channel of the client multiplexes concurrent requests.
+        self.models = {}
+        self.rate_limiter = get_rate_limiter('gemini', self.model_name, self.api_key, rpm=rpm, tpm=tpm)
 
-    @retry(wait=wait_random_exponential(min=2, max=5), stop=stop_after_attempt(5))
-    def predict(self, messages: str, max_tokens: int = 1024, temperature: float = 0.3):
-        try:
+    def _handle_error(self, e: Exception):
+        report_error(e)
+        retry_after = get_retry_after(e)
+        if retry_after is not None:
+            self.rate_limiter.penalize(retry_after)
+
+        raise RuntimeError(f"Error generating text: {e}") from e
+
+    def _record_usage(self, estimated_tokens: int, output):
+        usage_metadata = getattr(output, 'usage_metadata', None)
+        self.rate_limiter.record_usage(estimated_tokens, usage_metadata.total_token_count if usage_metadata else None)
+
+    def _get_model(self, max_tokens: int, temperature: float):
+        """
+        Returns the Gemini model object for a generation config, building it on first use.
+
+        Args:
+            max_tokens (int): Maximum number of tokens to generate.
+            temperature (float): Sampling temperature.
+
+        Returns:
+            genai.GenerativeModel: The configured model.
+        """
+        key = (max_tokens, temperature)
+        model = self.models.get(key)
+        if model is None:
             generation_config = genai.types.GenerationConfig(
                 candidate_count=1,
                 max_output_tokens=max_tokens,
                 temperature=temperature,
             )
-            
-            model = genai.GenerativeModel(
-                model_name="gemini-1.5-flash",
+            model = self.models[key] = genai.GenerativeModel(
+                model_name=self.model_name,
                 generation_config=generation_config,
-                safety_settings={
-                    HarmCategory.HARM_CATEGORY_HATE_SPEECH: HarmBlockThreshold.BLOCK_NONE,
-                    HarmCategory.HARM_CATEGORY_HARASSMENT: HarmBlockThreshold.BLOCK_NONE,
-                    HarmCategory.HARM_CATEGORY_SEXUALLY_EXPLICIT: HarmBlockThreshold.BLOCK_NONE,
-                    HarmCategory.HARM_CATEGORY_DANGEROUS_CONTENT: HarmBlockThreshold.BLOCK_NONE,
-                }
+                safety_settings=SAFETY_SETTINGS
             )
+
+        return model
+
+    @retry(wait=wait_random_exponential(min=2, max=5), stop=stop_after_attempt_unless_throttled(5))
+    def predict(self, messages: str, max_tokens: int = 1024, temperature: float = 0.3):
+        estimated_tokens = estimate_tokens(messages, max_tokens)
+        self.rate_limiter.acquire(estimated_tokens)
+        try:
+            model = self._get_model(max_tokens, temperature)
             output = model.generate_content(messages)
+            self._record_usage(estimated_tokens, output)
 
             return output.text
         except Exception as e:
-            raise RuntimeError(f"Error generating text: {e}")
\ No newline at end of file
+            self._handle_error(e)
+
+    @retry(wait=wait_random_exponential(min=2, max=5), stop=stop_after_attempt_unless_throttled(5))
+    async def apredict(self, messages: str, max_tokens: int = 1024, temperature: float = 0.3):
+        estimated_tokens = estimate_tokens(messages, max_tokens)
+        await self.rate_limiter.aacquire(estimated_tokens)
+        try:
+            model = self._get_model(max_tokens, temperature)
+            output = await model.generate_content_async(messages)
+            self._record_usage(estimated_tokens, output)
+
+            return output.text
+        except Exception as e:
+            self._handle_error(e)
+
+    def _record_stream_usage(self, messages: str, estimated_tokens: int, usage_metadata, generated_chars: int):
+        # An aborted stream may end before the usage is reported, so the completion is estimated from the characters received.
+        used_tokens = usage_metadata.total_token_count if usage_metadata else estimate_tokens(messages, generated_chars // 4)
+        self.rate_limiter.record_usage(estimated_tokens, used_tokens)
+
+    @retry(wait=wait_random_exponential(min=2, max=5), stop=stop_after_attempt_unless_throttled(5))
+    def _open_stream(self, messages: str, max_tokens: int, temperature: float):
+        estimated_tokens = estimate_tokens(messages, max_tokens)
+        self.rate_limiter.acquire(estimated_tokens)
+        try:
+            return self._get_model(max_tokens, temperature).generate_content(messages, stream=True), estimated_tokens
+        except Exception as e:
+            self._handle_error(e)
+
+    @retry(wait=wait_random_exponential(min=2, max=5), stop=stop_after_attempt_unless_throttled(5))
+    async def _aopen_stream(self, messages: str, max_tokens: int, temperature: float):
+        estimated_tokens = estimate_tokens(messages, max_tokens)
+        await self.rate_limiter.aacquire(estimated_tokens)
+        try:
+            return await self._get_model(max_tokens, temperature).generate_content_async(messages, stream=True), estimated_tokens
+        except Exception as e:
+            self._handle_error(e)
+
+    def stream(self, messages: str, max_tokens: int = 1024, temperature: float = 0.3) -> Iterator[str]:
+        response, estimated_tokens = self._open_stream(messages, max_tokens, temperature)
+        usage_metadata = None
+        generated_chars = 0
+        try:
+            for chunk in response:
+                usage_metadata = getattr(chunk, 'usage_metadata', None) or usage_metadata
+                generated_chars += len(chunk.text)
+                yield chunk.text
+        except Exception as e:
+            self._handle_error(e)
+        finally:
+            _cancel_stream(response)
+            self._record_stream_usage(messages, estimated_tokens, usage_metadata, generated_chars)
+
+    async def astream(self, messages: str, max_tokens: int = 1024, temperature: float = 0.3) -> AsyncIterator[str]:
+        response, estimated_tokens = await self._aopen_stream(messages, max_tokens, temperature)
+        usage_metadata = None
+        generated_chars = 0
+        try:
+            async for chunk in response:
+                usage_metadata = getattr(chunk, 'usage_metadata', None) or usage_metadata
+                generated_chars += len(chunk.text)
+                yield chunk.text
+        except Exception as e:
+            self._handle_error(e)
+        finally:
+            await _acancel_stream(response)
+            self._record_stream_usage(messages, estimated_tokens, usage_metadata, generated_chars)
@@ -1,29 +1,50 @@
+import time
 import torch
-from transformers import AutoModelForCausalLM, AutoTokenizer, pipeline
+from transformers import AutoModelForCausalLM, AutoTokenizer, StaticCache, pipeline
+from typing import List, Dict, Union
 from src.core.predictors.base import PredictionModel
+from src.core.utils import get_resident_memory_mb
 
 class HuggingFacePredictor(PredictionModel):
     """Prediction model implementation for Hugging Face."""
 
-    def __init__(self, model_name: str, device: str = 'cpu'):
+    def __init__(self, model_name: str, device: str = 'cpu', quantize: str = None, low_cpu_mem_usage: bool = False, fast_decode: bool = False):
         """
         Initializes the HuggingFacePredictor with a model name and another parameter.
 
         Args:
             model_name (str): The name of the model to use.
             device (str): Device to use for inference, 'cpu' or 'cuda'.
+            quantize (str, optional): 'int8' applies dynamic int8 quantization to the Linear layers,
+                which shrinks their weights about 4x and speeds up CPU matrix products. CPU only.
+            low_cpu_mem_usage (bool): Load the weights one shard at a time instead of materializing a
+                randomly initialized copy first. Always on when `quantize` is set.
+            fast_decode (bool): Generate with preallocated static KV caches and a compiled forward pass,
+                reused across calls. The first call for each batch size or longer cache pays the
+                compilation (see `stats`); `predict` then goes through `predict_batch` and returns the same text.
         """
         self.device = device
         self.model_name = model_name
-        
+        self.quantize = quantize
+
+        if quantize not in (None, 'int8'):
+            raise ValueError(f"Invalid quantize: {quantize}. Choose 'int8' or None")
+        if quantize and self.device != 'cpu':
+            raise ValueError("Quantized inference is only supported on 'cpu'.")
+
         self.model = AutoModelForCausalLM.from_pretrained(
             self.model_name,
             device_map='cuda' if self.device == 'gpu' else 'cpu',
-            torch_dtype='auto',
-            # low_cpu_mem_usage=True,
-            # load_in_8bit=True,
+            # Dynamic quantization converts float32 Linear layers.
+            torch_dtype=torch.float32 if quantize else 'auto',
+            # Passing False along with a device map is rejected by transformers, so it falls back to None (its default).
+            low_cpu_mem_usage=True if low_cpu_mem_usage or quantize else None,
             trust_remote_code=True,
         )
+        if quantize == 'int8':
+            self.model = torch.ao.quantization.quantize_dynamic(self.model, {torch.nn.Linear}, dtype=torch.qint8)
+        self.model.eval()
+
         self.tokenizer = AutoTokenizer.from_pretrained(self.model_name)
         self.pipeline = pipeline(
             'text-generation',
@@ -32,26 +53,201 @@ class HuggingFacePredictor(PredictionModel):
             # device = 0 if self.device == 'cuda' else -1,
         )
 
-    def predict(self, messages, max_tokens: int = 1024, temperature: float = 0.3, do_sample:bool = True):
+        self.fast_decode = fast_decode
+        self.static_caches = {}
+        if fast_decode:
+            # CUDA graphs cut the launch overhead on GPU; on CPU the default mode fuses the kernels.
+            self.model.forward = torch.compile(self.model.forward, mode='reduce-overhead' if self.device == 'gpu' else None)
+
+        self.generated_tokens = 0
+        self.generation_seconds = 0.0
+        self.warmup_seconds = 0.0
+        self.steady_tokens = 0
+        self.steady_seconds = 0.0
+
+    def _count_new_tokens(self, text: str) -> int:
+        return len(self.tokenizer(text, add_special_tokens=False)['input_ids'])
+
+    def _static_cache(self, batch_size: int, cache_len: int):
+        """
+        Returns a reset static KV cache for a batch, and whether it was just allocated.
+
+        Caches are kept per batch size and rounded up to multiples of 256 positions, so that
+        calls with similar lengths reuse both the cache and the graph compiled for its shape.
+        """
+        cache = self.static_caches.get(batch_size)
+        if cache is not None and cache.max_cache_len >= cache_len:
+            cache.reset()
+            return cache, False
+
+        cache = StaticCache(
+            config=self.model.config,
+            max_batch_size=batch_size,
+            max_cache_len=-(-cache_len // 256) * 256,
+            device=self.model.device,
+            dtype=self.model.dtype,
+        )
+        self.static_caches[batch_size] = cache
+        return cache, True
+
+    def _record_generation(self, tokens: int, seconds: float, warmup: bool):
+        self.generated_tokens += tokens
+        self.generation_seconds += seconds
+        if warmup:
+            self.warmup_seconds += seconds
+        else:
+            self.steady_tokens += tokens
+            self.steady_seconds += seconds
+
+    def model_size_mb(self) -> float:
+        """
+        Returns the size of the model weights and buffers.
+
+        Returns:
+            float: The memory footprint of the model in MB.
+        """
+        size_bytes = self.model.get_memory_footprint()
+        if self.quantize:
+            # Dynamically quantized Linear layers keep their packed weights outside the parameters.
+            for module in self.model.modules():
+                if isinstance(module, torch.ao.nn.quantized.dynamic.Linear):
+                    weight = module.weight()
+                    size_bytes += weight.nelement() * weight.element_size()
+
+        return size_bytes / (1024 * 1024)
+
+    def stats(self) -> dict:
+        """
+        Returns the resident memory of the process and the generation throughput so far.
+
+        With `fast_decode`, calls that allocated a new static cache (and compiled a graph for it)
+        count as warm-up, and the steady-state throughput covers the other calls only.
+
+        Returns:
+            dict: Quantization mode, resident memory in MB, generated tokens, overall tokens per second,
+                warm-up seconds and steady-state tokens per second.
+        """
+        return {
+            'quantize': self.quantize,
+            'fast_decode': self.fast_decode,
+            'resident_memory_mb': get_resident_memory_mb(),
+            'generated_tokens': self.generated_tokens,
+            'tokens_per_second': self.generated_tokens / self.generation_seconds if self.generation_seconds else 0.0,
+            'warmup_seconds': self.warmup_seconds,
+            'steady_tokens_per_second': self.steady_tokens / self.steady_seconds if self.steady_seconds else 0.0,
+        }
+
+    def predict(self, messages, max_tokens: int = 1024, temperature: float = 0.3, do_sample:bool = True) -> str:
         """
         Generates text based on the input text using the specified model.
 
         Args:
-            input_text (str): The input text to generate from.
+            messages (Union[str, List[Dict[str, str]]]): The prompt or chat messages to generate from.
             max_tokens (int): Maximum number of tokens to generate.
             temperature (float): Sampling temperature. Lower values make the output more deterministic.
             do_sample (bool): Whether to use sampling or greedy decoding.
 
         Returns:
-            str: The generated text.
+            str: The generated text only, without the prompt, for both plain prompts and chat messages.
         """
+        if self.fast_decode:
+            return self.predict_batch([messages], max_tokens=max_tokens, temperature=temperature, do_sample=do_sample, batch_size=1)[0]
+
         generation_args = {
             'max_new_tokens': max_tokens,
             'temperature': temperature,
-            'do_sample': do_sample
+            'do_sample': do_sample,
+            'return_full_text': False,
         }
         try:
+            started = time.perf_counter()
             output = self.pipeline(messages, **generation_args)
-            return output[0]['generated_text']
+            elapsed = time.perf_counter() - started
         except Exception as e:
-            raise RuntimeError(f"Error generating text: {e}")
\ No newline at end of file
+            raise RuntimeError(f"Error generating text: {e}")
+
+        new_text = output[0]['generated_text']
+        self._record_generation(self._count_new_tokens(new_text), elapsed, warmup=False)
+
+        return new_text
+
+    def _render_prompt(self, messages: Union[str, List[Dict[str, str]]]) -> str:
+        if isinstance(messages, str):
+            return messages
+        return self.tokenizer.apply_chat_template(messages, tokenize=False, add_generation_prompt=True)
+
+    def _ensure_pad_token(self):
+        # Causal LMs often ship without a pad token; padded positions are masked anyway.
+        if self.tokenizer.pad_token is None:
+            self.tokenizer.pad_token = self.tokenizer.eos_token or self.tokenizer.unk_token
+        if self.tokenizer.pad_token is None:
+            raise RuntimeError(f"The tokenizer of '{self.model_name}' has no pad, eos or unk token to pad batches with.")
+
+    def predict_batch(self, messages_list: List[Union[str, List[Dict[str, str]]]], max_tokens: int = 1024, temperature: float = 0.3,
+                      do_sample: bool = True, batch_size: int = 8) -> List[str]:
+        """
+        Generates text for several inputs, running each batch in a single `generate` call.
+
+        Prompts are sorted by token length and grouped into buckets of `batch_size`, so the
+        prompts of a bucket have similar lengths and little compute goes to padding. Buckets
+        are left-padded, as causal LMs continue from the last position of each row.
+
+        As with `predict`, only the generated text is returned, for both plain prompts and chat messages.
+
+        Args:
+            messages_list (List[Union[str, List[Dict[str, str]]]]): The inputs to generate from.
+            max_tokens (int): Maximum number of tokens to generate.
+            temperature (float): Sampling temperature. Lower values make the output more deterministic.
+            do_sample (bool): Whether to use sampling or greedy decoding.
+            batch_size (int): Maximum number of prompts per `generate` call.
+
+        Returns:
+            List[str]: The generated texts, without their prompts, in input order.
+        """
+        self._ensure_pad_token()
+        prompts = [self._render_prompt(messages) for messages in messages_list]
+        lengths = [len(input_ids) for input_ids in self.tokenizer(prompts, add_special_tokens=False)['input_ids']]
+        order = sorted(range(len(prompts)), key=lambda position: lengths[position])
+
+        generation_args = {
+            'max_new_tokens': max_tokens,
+            'do_sample': do_sample and temperature > 0,
+            'pad_token_id': self.tokenizer.pad_token_id,
+        }
+        if generation_args['do_sample']:
+            generation_args['temperature'] = temperature
+
+        outputs = [None] * len(prompts)
+        padding_side = self.tokenizer.padding_side
+        self.tokenizer.padding_side = 'left'
+        try:
+            for start in range(0, len(order), batch_size):
+                bucket = order[start:start + batch_size]
+                # Chat templates already contain the special tokens of the model.
+                inputs = self.tokenizer(
+                    [prompts[position] for position in bucket],
+                    return_tensors='pt',
+                    padding=True,
+                    add_special_tokens=isinstance(messages_list[bucket[0]], str)
+                ).to(self.model.device)
+                cache_args = {}
+                warmup = False
+                if self.fast_decode:
+                    cache_args['past_key_values'], warmup = self._static_cache(len(bucket), inputs['input_ids'].shape[1] + max_tokens)
+
+                started = time.perf_counter()
+                with torch.inference_mode():
+                    generated = self.model.generate(**inputs, **generation_args, **cache_args)
+                elapsed = time.perf_counter() - started
+
+                new_tokens = generated[:, inputs['input_ids'].shape[1]:]
+                self._record_generation(int((new_tokens != self.tokenizer.pad_token_id).sum()), elapsed, warmup)
+                texts = self.tokenizer.batch_decode(new_tokens, skip_special_tokens=True)
+                for position, text in zip(bucket, texts):
+                    outputs[position] = text
+        except Exception as e:
+            raise RuntimeError(f"Error generating text: {e}")
+        finally:
+            self.tokenizer.padding_side = padding_side
+
+        return outputs
@@ -0,0 +1,186 @@
+import asyncio
+import multiprocessing
+import os
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import List
+from src.core.predictors.base import PredictionModel
+
+_worker_predictor = None
+
+def _init_worker(model_name: str, device: str, n_threads: int, pin_cores: bool, worker_counter, predictor_kwargs: dict):
+    global _worker_predictor
+
+    if pin_cores and hasattr(os, 'sched_setaffinity'):
+        # Give each worker its own block of cores, so that workers do not compete for them.
+        with worker_counter.get_lock():
+            worker_index = worker_counter.value
+            worker_counter.value += 1
+        cores = sorted(os.sched_getaffinity(0))
+        block = cores[worker_index * n_threads:(worker_index + 1) * n_threads]
+        if len(block) == n_threads:
+            os.sched_setaffinity(0, block)
+
+    from src.core.predictors.llama_predictor import LlamaCppPredictor
+    _worker_predictor = LlamaCppPredictor(model_name=model_name, device=device, n_threads=n_threads, **predictor_kwargs)
+
+def _predict_in_worker(messages: str, kwargs: dict):
+    tokens_before = _worker_predictor.generated_tokens
+    result = _worker_predictor.predict(messages, **kwargs)
+    return result, _worker_predictor.generated_tokens - tokens_before
+
+class LlamaCppPoolPredictor(PredictionModel):
+    """Pool of llama.cpp worker processes, each holding its own model instance.
+
+    The GGUF file is memory-mapped by every worker, so the weights are loaded once into the
+    page cache and shared, while each worker has its own KV cache and thread pool. Requests
+    go to the first idle worker.
+    """
+
+    def __init__(self, model_name: str, device: str = 'cpu', workers: int = 2, n_threads: int = None, pin_cores: bool = True, **kwargs):
+        """
+        Starts the worker processes.
+
+        Args:
+            model_name (str): The path to the Llama model file (.gguf).
+            device (str): Device to use for inference, 'cpu' or 'gpu'.
+            workers (int): Number of worker processes.
+            n_threads (int, optional): Number of CPU threads per worker. Defaults to the available
+                cores divided by `workers`.
+            pin_cores (bool): Pin each worker to its own block of `n_threads` cores (Linux only).
+            **kwargs: Additional arguments for each LlamaCppPredictor (e.g., 'prefix_cache_mb').
+        """
+        self.model_name = model_name
+        self.workers = workers
+        cores = len(os.sched_getaffinity(0)) if hasattr(os, 'sched_getaffinity') else os.cpu_count()
+        self.n_threads = n_threads or max(1, cores // workers)
+
+        # Spawned workers do not inherit the state of the parent (e.g. an event loop or a loaded model).
+        context = multiprocessing.get_context('spawn')
+        self.executor = ProcessPoolExecutor(
+            max_workers=workers,
+            mp_context=context,
+            initializer=_init_worker,
+            initargs=(model_name, device, self.n_threads, pin_cores, context.Value('i', 0), kwargs),
+        )
+
+        self.lock = threading.Lock()
+        self.generated_tokens = 0
+        self.in_flight = 0
+        self.busy_seconds = 0.0
+        self.busy_since = None
+
+    def _start(self):
+        with self.lock:
+            if self.in_flight == 0:
+                self.busy_since = time.perf_counter()
+            self.in_flight += 1
+
+    def _finish(self, future):
+        with self.lock:
+            self.in_flight -= 1
+            if not future.cancelled() and future.exception() is None:
+                self.generated_tokens += future.result()[1]
+            if self.in_flight == 0:
+                self.busy_seconds += time.perf_counter() - self.busy_since
+
+    def _submit(self, messages: str, **kwargs):
+        self._start()
+        future = self.executor.submit(_predict_in_worker, messages, kwargs)
+        future.add_done_callback(self._finish)
+        return future
+
+    def predict(self, messages: str, max_tokens: int = 2048, temperature: float = 0.3) -> str:
+        """
+        Generates text in one of the workers.
+
+        Args:
+            messages (str): The formatted prompt for Llama, including system and user sections.
+            max_tokens (int): Maximum number of tokens to generate.
+            temperature (float): Sampling temperature.
+
+        Returns:
+            str: The generated text.
+        """
+        return self._submit(messages, max_tokens=max_tokens, temperature=temperature).result()[0]
+
+    async def apredict(self, messages: str, **kwargs) -> str:
+        """
+        Asynchronous version of `predict`. Concurrent calls run in parallel on the workers.
+
+        Args:
+            messages (str): The formatted prompt for Llama.
+            **kwargs: Additional arguments for prediction (e.g., max_tokens, temperature).
+
+        Returns:
+            str: The generated text.
+        """
+        result, _ = await asyncio.wrap_future(self._submit(messages, **kwargs))
+        return result
+
+    def predict_batch(self, messages_list: List[str], **kwargs) -> List[str]:
+        """
+        Generates text for several prompts, spread across the workers.
+
+        Args:
+            messages_list (List[str]): The formatted prompts.
+            **kwargs: Additional arguments for prediction (e.g., max_tokens, temperature).
+                'batch_size' is accepted and ignored.
+
+        Returns:
+            List[str]: The generated texts, in input order.
+        """
+        kwargs.pop('batch_size', None)
+        futures = [self._submit(messages, **kwargs) for messages in messages_list]
+        return [future.result()[0] for future in futures]
+
+    async def apredict_batch(self, messages_list: List[str], **kwargs) -> List[str]:
+        """
+        Asynchronous version of `predict_batch`.
+
+        Args:
+            messages_list (List[str]): The formatted prompts.
+            **kwargs: Additional arguments for prediction (e.g., max_tokens, temperature).
+
+        Returns:
+            List[str]: The generated texts, in input order.
+        """
+        kwargs.pop('batch_size', None)
+        results = await asyncio.gather(*(asyncio.wrap_future(self._submit(messages, **kwargs)) for messages in messages_list))
+        return [result for result, _ in results]
+
+    def model_size_mb(self) -> float:
+        """
+        Returns the size of the model weights, read from the size of the model file.
+
+        The file is memory-mapped by every worker, so its pages are counted once for the whole pool.
+
+        Returns:
+            float: The size of the model file in MB.
+        """
+        return os.path.getsize(self.model_name) / (1024 * 1024)
+
+    def stats(self) -> dict:
+        """
+        Returns the layout of the pool and its aggregate throughput.
+
+        Returns:
+            dict: Workers, threads per worker, generated tokens and tokens per second over the
+                time at least one request was in flight.
+        """
+        with self.lock:
+            busy_seconds = self.busy_seconds
+            if self.in_flight:
+                busy_seconds += time.perf_counter() - self.busy_since
+
+            return {
+                'workers': self.workers,
+                'threads_per_worker': self.n_threads,
+                'generated_tokens': self.generated_tokens,
+                'tokens_per_second': self.generated_tokens / busy_seconds if busy_seconds else 0.0,
+            }
+
+    def close(self):
+        """Stops the worker processes."""
+        self.executor.shutdown(wait=True, cancel_futures=True)
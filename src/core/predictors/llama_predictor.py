@@ -1,18 +1,88 @@
+import os
+import time
+from collections import OrderedDict
+from typing import Iterator, Optional, Tuple
 import llama_cpp
 from src.core.predictors.base import PredictionModel
+from src.core.utils import get_resident_memory_mb
+
+class PrefixStateCache:
+    """LRU cache of llama.cpp model states, keyed by the tokens they were evaluated on."""
+
+    def __init__(self, capacity_bytes: int):
+        """
+        Initializes the PrefixStateCache.
+
+        Args:
+            capacity_bytes (int): Maximum total size of the stored states. The least recently
+                used states are evicted beyond it.
+        """
+        self.capacity_bytes = capacity_bytes
+        self.states = OrderedDict()
+        self.size_bytes = 0
+        self.evictions = 0
+
+    def longest_prefix(self, tokens: Tuple[int, ...]) -> Optional[Tuple[Tuple[int, ...], llama_cpp.LlamaState]]:
+        """
+        Finds the longest cached key that is a prefix of `tokens`.
+
+        Args:
+            tokens (Tuple[int, ...]): The tokens of the prompt.
+
+        Returns:
+            Optional[Tuple[Tuple[int, ...], llama_cpp.LlamaState]]: The key and its state, or None.
+        """
+        best = None
+        for key in self.states:
+            if len(key) <= len(tokens) and tokens[:len(key)] == key and (best is None or len(key) > len(best)):
+                best = key
+        if best is None:
+            return None
+
+        self.states.move_to_end(best)
+        return best, self.states[best]
+
+    def put(self, key: Tuple[int, ...], state: llama_cpp.LlamaState):
+        """
+        Stores a state and evicts the least recently used states if the cache is too large.
+
+        Args:
+            key (Tuple[int, ...]): The tokens the state was evaluated on.
+            state (llama_cpp.LlamaState): The saved model state.
+        """
+        if state.llama_state_size > self.capacity_bytes:
+            return
+        if key in self.states:
+            self.size_bytes -= self.states.pop(key).llama_state_size
+
+        self.states[key] = state
+        self.size_bytes += state.llama_state_size
+        while self.size_bytes > self.capacity_bytes:
+            _, evicted = self.states.popitem(last=False)
+            self.size_bytes -= evicted.llama_state_size
+            self.evictions += 1
 
 class LlamaCppPredictor(PredictionModel):
     """Prediction model implementation for llama.cpp."""
 
-    def __init__(self, model_name: str, device: str = 'gpu'):
+    def __init__(self, model_name: str, device: str = 'gpu', prefix_cache_mb: int = None,
+                 prefix_delimiter: str = '<|start_header_id|>user<|end_header_id|>', n_threads: int = None):
         """
         Initializes the LlamaCppPredictor with a model path and device.
 
         Args:
             model_name (str): The path to the Llama model file (.bin or .gguf).
             device (str): Device to use for inference, 'cpu' or 'cuda'.
+            prefix_cache_mb (int, optional): Memory budget of the prefix state cache. The model state
+                after the shared part of each prompt (everything before `prefix_delimiter`, i.e. the
+                specialist system prompt) is saved, and restored by later prompts starting with it,
+                so only their remaining tokens are evaluated. Disabled if None.
+            prefix_delimiter (str): Text that ends the cacheable prefix of a prompt.
+            n_threads (int, optional): Number of CPU threads used for generation. Defaults to the
+                llama.cpp default (half of the cores).
         """
         self.device = device
+        self.model_path = model_name
 
         if self.device == 'cpu':
             n_gpu_layers = 0 
@@ -26,10 +96,92 @@ class LlamaCppPredictor(PredictionModel):
         self.model = llama_cpp.Llama(
             model_path=model_name,
             n_gpu_layers=n_gpu_layers,
-            n_ctx=2048
+            n_ctx=2048,
+            n_threads=n_threads,
+            n_threads_batch=n_threads,
+            # Memory-mapped weights are shared through the page cache by every process loading the file.
+            use_mmap=True,
+            verbose=False
             # Other parameters can be added here as needed
         )
 
+        self.prefix_delimiter = prefix_delimiter
+        self.prefix_cache = PrefixStateCache(prefix_cache_mb * 1024 * 1024) if prefix_cache_mb else None
+        self.prefix_hits = 0
+        self.prefix_misses = 0
+        self.prompt_tokens = 0
+        self.reused_tokens = 0
+        self.prompt_seconds = 0.0
+        self.generated_tokens = 0
+        self.generation_seconds = 0.0
+
+    def _restore_prefix(self, messages: str):
+        tokens = tuple(self.model.tokenize(messages.encode('utf-8'), special=True))
+        self.prompt_tokens += len(tokens)
+
+        end = messages.find(self.prefix_delimiter)
+        if end <= 0:
+            return
+        prefix = tuple(self.model.tokenize(messages[:end].encode('utf-8'), special=True))
+        if tokens[:len(prefix)] != prefix:
+            # The prefix tokenizes differently inside the full prompt; nothing safe to reuse.
+            return
+
+        # llama.cpp skips the tokens shared with the current context by itself. Only the first
+        # n_tokens of input_ids are evaluated; the rest of the buffer is stale.
+        evaluated = self.model.input_ids[:self.model.n_tokens]
+        if len(evaluated) >= len(prefix) and tuple(evaluated[:len(prefix)].tolist()) == prefix:
+            self.prefix_hits += 1
+            self.reused_tokens += len(prefix)
+            return
+
+        cached = self.prefix_cache.longest_prefix(tokens)
+        if cached is not None:
+            key, state = cached
+            self.model.load_state(state)
+            self.prefix_hits += 1
+            self.reused_tokens += len(key)
+            return
+
+        self.prefix_misses += 1
+        started = time.perf_counter()
+        self.model.reset()
+        self.model.eval(list(prefix))
+        self.prompt_seconds += time.perf_counter() - started
+        self.prefix_cache.put(prefix, self.model.save_state())
+
+    def model_size_mb(self) -> float:
+        """
+        Returns the size of the model weights, read from the size of the model file.
+
+        Returns:
+            float: The size of the model file in MB.
+        """
+        return os.path.getsize(self.model_path) / (1024 * 1024)
+
+    def stats(self) -> dict:
+        """
+        Returns the resident memory of the process and the statistics of the prefix state cache.
+
+        Returns:
+            dict: Resident memory in MB, generation throughput, prefix hits and misses, prompt tokens
+                reused from cached states and the size of the cache.
+        """
+        return {
+            'resident_memory_mb': get_resident_memory_mb(),
+            'generated_tokens': self.generated_tokens,
+            'tokens_per_second': self.generated_tokens / self.generation_seconds if self.generation_seconds else 0.0,
+            'prefix_hits': self.prefix_hits,
+            'prefix_misses': self.prefix_misses,
+            'prompt_tokens': self.prompt_tokens,
+            'reused_tokens': self.reused_tokens,
+            'reused_ratio': self.reused_tokens / self.prompt_tokens if self.prompt_tokens else 0.0,
+            'prefix_eval_seconds': self.prompt_seconds,
+            'prefix_cache_states': len(self.prefix_cache.states) if self.prefix_cache else 0,
+            'prefix_cache_mb': self.prefix_cache.size_bytes / (1024 * 1024) if self.prefix_cache else 0.0,
+            'prefix_cache_evictions': self.prefix_cache.evictions if self.prefix_cache else 0,
+        }
+
     def predict(self, messages, max_tokens: int = 2048  , temperature: float = 0.3):
         """
         Generates text based on the input prompt using the Llama model.
@@ -44,6 +196,9 @@ class LlamaCppPredictor(PredictionModel):
             str: The generated text.
         """
         try:
+            started = time.perf_counter()
+            if self.prefix_cache is not None:
+                self._restore_prefix(messages)
             output = self.model(
                 messages,
                 max_tokens=max_tokens,
@@ -51,6 +206,44 @@ class LlamaCppPredictor(PredictionModel):
                 # top_p=1.0,  # Adjust if needed for nucleus sampling
                 stop=["<|end_of_text|>"],  # Stop generating at this token
             )
+            self.generation_seconds += time.perf_counter() - started
+            self.generated_tokens += output['usage']['completion_tokens']
             return output['choices'][0]["text"]
         except Exception as e:
-            raise RuntimeError(f"Error generating text: {e}")
\ No newline at end of file
+            raise RuntimeError(f"Error generating text: {e}")
+
+    def stream(self, messages: str, max_tokens: int = 2048, temperature: float = 0.3) -> Iterator[str]:
+        """
+        Generates text based on the input prompt, one token at a time. Closing the generator
+        stops the generation.
+
+        Args:
+            messages (str): The formatted prompt for Llama, including system and user sections.
+            max_tokens (int): Maximum number of tokens to generate.
+            temperature (float): Sampling temperature.
+
+        Yields:
+            str: The text of the next generated token.
+        """
+        started = time.perf_counter()
+        try:
+            if self.prefix_cache is not None:
+                self._restore_prefix(messages)
+            chunks = self.model(
+                messages,
+                max_tokens=max_tokens,
+                temperature=temperature,
+                stop=["<|end_of_text|>"],
+                stream=True,
+            )
+        except Exception as e:
+            raise RuntimeError(f"Error generating text: {e}")
+
+        try:
+            for chunk in chunks:
+                # Each streamed chunk holds one generated token.
+                self.generated_tokens += 1
+                yield chunk['choices'][0]['text']
+        finally:
+            chunks.close()
+            self.generation_seconds += time.perf_counter() - started
@@ -0,0 +1,86 @@
+import os
+from tenacity import (
+    retry,
+    stop_after_attempt,
+    wait_random_exponential
+)
+from typing import List, Dict, Union
+from src.core.endpoint_pool import EndpointPool
+from src.core.predictors.base import PredictionModel
+
+class LocalServerPredictor(PredictionModel):
+    """Prediction model implementation for a local model server (see `src/core/model_server.py`)."""
+
+    def __init__(self, model_name: str, base_url: str = None, max_connections: int = 8, endpoints: List[dict] = None):
+        """
+        Initializes the LocalServerPredictor.
+
+        Args:
+            model_name (str): The model name served by the server.
+            base_url (str, optional): The base URL of the server. Defaults to the LOCAL_MODEL_SERVER_URL
+                environment variable, or 'http://127.0.0.1:8000/v1'.
+            max_connections (int): Size of the keep-alive connection pool to the server.
+            endpoints (List[dict], optional): Several servers of the same model to spread the requests
+                across, as dicts with a 'base_url' key (see EndpointPool). Defaults to `base_url` alone.
+        """
+        self.model_name = model_name
+        self.base_url = base_url or os.environ.get('LOCAL_MODEL_SERVER_URL', 'http://127.0.0.1:8000/v1')
+        # Local generation can take minutes for long answers.
+        self.endpoints = EndpointPool('local_server', model_name, endpoints, api_key='local', base_url=self.base_url, max_connections=max_connections, max_retries=0, timeout=600)
+
+    @retry(wait=wait_random_exponential(min=1, max=5), stop=stop_after_attempt(3))
+    def predict(self, messages: Union[str, List[Dict[str, str]]], max_tokens: int = 1024, temperature: float = 0.3) -> str:
+        """
+        Predicts using the local model server.
+
+        Plain string prompts (e.g., the llama-3.1 message format) go to the completions
+        endpoint and chat messages to the chat completions endpoint.
+
+        Args:
+            messages (Union[str, List[Dict[str, str]]]): The prompt or chat messages.
+            max_tokens (int): Maximum number of tokens to generate.
+            temperature (float): Sampling temperature.
+
+        Returns:
+            str: The prediction result.
+
+        Raises:
+            RuntimeError: If the server cannot be reached or fails to generate.
+        """
+        member = self.endpoints.choose()
+        try:
+            with member.track():
+                if isinstance(messages, str):
+                    response = member.client.completions.create(model=self.model_name, prompt=messages, max_tokens=max_tokens, temperature=temperature)
+                    return response.choices[0].text
+                response = member.client.chat.completions.create(model=self.model_name, messages=messages, max_tokens=max_tokens, temperature=temperature)
+                return response.choices[0].message.content
+        except Exception as e:
+            raise RuntimeError(f"Local model server error ({member.name}): {e}") from e
+
+    @retry(wait=wait_random_exponential(min=1, max=5), stop=stop_after_attempt(3))
+    async def apredict(self, messages: Union[str, List[Dict[str, str]]], max_tokens: int = 1024, temperature: float = 0.3) -> str:
+        """
+        Predicts asynchronously using the local model server. Concurrent calls are batched by the server.
+
+        Args:
+            messages (Union[str, List[Dict[str, str]]]): The prompt or chat messages.
+            max_tokens (int): Maximum number of tokens to generate.
+            temperature (float): Sampling temperature.
+
+        Returns:
+            str: The prediction result.
+
+        Raises:
+            RuntimeError: If the server cannot be reached or fails to generate.
+        """
+        member = self.endpoints.choose()
+        try:
+            with member.track():
+                if isinstance(messages, str):
+                    response = await member.async_client.completions.create(model=self.model_name, prompt=messages, max_tokens=max_tokens, temperature=temperature)
+                    return response.choices[0].text
+                response = await member.async_client.chat.completions.create(model=self.model_name, messages=messages, max_tokens=max_tokens, temperature=temperature)
+                return response.choices[0].message.content
+        except Exception as e:
+            raise RuntimeError(f"Local model server error ({member.name}): {e}") from e
@@ -1,36 +1,79 @@
+import math
 import os
-from openai import OpenAI
+import unicodedata
+from contextlib import ExitStack
 from tenacity import (
     retry,
-    stop_after_attempt,
     wait_random_exponential
 )
-from typing import List, Dict
+from typing import AsyncIterator, Iterator, List, Dict, Optional
 from dotenv import load_dotenv, find_dotenv
+from src.core.batch_api import BatchRunner
+from src.core.endpoint_pool import EndpointPool, PoolMember
 from src.core.predictors.base import PredictionModel
+from src.core.rate_limiter import (
+    estimate_tokens,
+    get_retry_after,
+    stop_after_attempt_unless_throttled
+)
+from src.core.concurrency import report_error
 
 load_dotenv(find_dotenv())
 
 class OpenAIPredictor(PredictionModel):
-    """Prediction model implementation for OpenAI."""
+    """Prediction model implementation for OpenAI and OpenAI-compatible APIs.
+
+    Subclasses for other OpenAI-compatible services only override the class attributes below.
+    """
 
-    def __init__(self, model_name: str, api_key: str = None):
+    service = 'openai'
+    api_name = 'OpenAI'
+    api_key_env = 'OPENAI_API_KEY'
+    default_base_url = None
+
+    def __init__(self, model_name: str, api_key: str = None, rpm: int = None, tpm: int = None, max_connections: int = 8, endpoints: List[dict] = None, base_url: str = None):
         """
-        Initializes the OpenAIPredictor with an API key and another parameter.
+        Initializes the predictor with an API key and another parameter.
+
+        Args:
+            model_name (str): The name of the model.
+            api_key (str, optional): The API key. Defaults to the `api_key_env` environment variable.
+            rpm (int, optional): Client-side requests-per-minute limit.
+            tpm (int, optional): Client-side tokens-per-minute limit.
+            max_connections (int): Size of the keep-alive connection pool shared with every
+                predictor calling the same endpoint with the same size.
+            endpoints (List[dict], optional): API keys and endpoints to spread the requests across, as
+                dicts with the optional keys 'base_url', 'api_key', 'rpm' and 'tpm' (see EndpointPool).
+                Defaults to a single endpoint with the arguments above.
+            base_url (str, optional): The base URL of the API. Defaults to `default_base_url`.
         """
         self.model_name = model_name
-        self.api_key = api_key or os.environ.get('OPENAI_API_KEY')
-        self.client = OpenAI(
-            api_key=self.api_key,
-        )
+        self.base_url = base_url or self.default_base_url
+        self.api_key = api_key or os.environ.get(self.api_key_env)
+        # Retries are left to tenacity so that every attempt goes through the shared rate limiter,
+        # and is sent to the member of the pool expected to answer first.
+        self.endpoints = EndpointPool(self.service, self.model_name, endpoints, api_key=self.api_key, base_url=self.base_url, rpm=rpm, tpm=tpm, max_connections=max_connections, max_retries=0)
+        # The Batch API runs on the first endpoint.
+        self.client = self.endpoints.members[0].client
+        self._logit_bias = {}
+
+    def _handle_error(self, e: Exception, member: PoolMember):
+        report_error(e)
+        retry_after = get_retry_after(e)
+        if retry_after is not None:
+            member.rate_limiter.penalize(retry_after)
 
-    @retry(wait=wait_random_exponential(min=2, max=5), stop=stop_after_attempt(5))
+        raise Exception(f"{self.api_name} API error: {e}") from e
+
+    @retry(wait=wait_random_exponential(min=2, max=5), stop=stop_after_attempt_unless_throttled(5))
     def predict(self, messages: List[Dict[str, str]], max_tokens: int = 1024, temperature: float = 0.3):
         """
-        Predicts using OpenAI's API.
+        Predicts using the chat completions API.
 
         Args:
-            input_data (str): The input data to be processed for prediction.
+            messages (List[Dict[str, str]]): The chat messages to send.
+            max_tokens (int): Maximum number of tokens to generate.
+            temperature (float): Sampling temperature.
 
         Returns:
             str: The prediction result.
@@ -38,14 +81,333 @@ class OpenAIPredictor(PredictionModel):
         Raises:
             Exception: If there is an error with the API call.
         """
+        estimated_tokens = estimate_tokens(messages, max_tokens)
+        member = self.endpoints.choose(estimated_tokens)
+        member.rate_limiter.acquire(estimated_tokens)
         try:
-            response = self.client.chat.completions.create(
+            with member.track():
+                response = member.client.chat.completions.create(
+                    messages=messages,
+                    model=self.model_name,
+                    max_tokens = max_tokens,
+                    temperature=temperature
+                )   
+        except Exception as e:
+            self._handle_error(e, member)
+
+        member.record_usage(estimated_tokens, response.usage.total_tokens if response.usage else None)
+        return response.choices[0].message.content
+
+    @retry(wait=wait_random_exponential(min=2, max=5), stop=stop_after_attempt_unless_throttled(5))
+    async def apredict(self, messages: List[Dict[str, str]], max_tokens: int = 1024, temperature: float = 0.3):
+        """
+        Predicts asynchronously using the chat completions API.
+
+        Args:
+            messages (List[Dict[str, str]]): The chat messages to send.
+            max_tokens (int): Maximum number of tokens to generate.
+            temperature (float): Sampling temperature.
+
+        Returns:
+            str: The prediction result.
+
+        Raises:
+            Exception: If there is an error with the API call.
+        """
+        estimated_tokens = estimate_tokens(messages, max_tokens)
+        member = self.endpoints.choose(estimated_tokens)
+        await member.rate_limiter.aacquire(estimated_tokens)
+        try:
+            with member.track():
+                response = await member.async_client.chat.completions.create(
+                    messages=messages,
+                    model=self.model_name,
+                    max_tokens=max_tokens,
+                    temperature=temperature
+                )
+        except Exception as e:
+            self._handle_error(e, member)
+
+        member.record_usage(estimated_tokens, response.usage.total_tokens if response.usage else None)
+        return response.choices[0].message.content
+
+    def _record_stream_usage(self, member: PoolMember, messages: List[Dict[str, str]], estimated_tokens: int, used_tokens: int, generated_chars: int):
+        # An aborted stream reports no usage, so the completion is estimated from the characters received.
+        member.record_usage(estimated_tokens, used_tokens if used_tokens is not None else estimate_tokens(messages, generated_chars // 4))
+
+    @retry(wait=wait_random_exponential(min=2, max=5), stop=stop_after_attempt_unless_throttled(5))
+    def _open_stream(self, messages: List[Dict[str, str]], max_tokens: int, temperature: float):
+        estimated_tokens = estimate_tokens(messages, max_tokens)
+        member = self.endpoints.choose(estimated_tokens)
+        member.rate_limiter.acquire(estimated_tokens)
+        # The request stays tracked until the stream ends (see `stream`), not only while it opens.
+        tracking = ExitStack()
+        tracking.enter_context(member.track())
+        try:
+            response = member.client.chat.completions.create(
                 messages=messages,
                 model=self.model_name,
-                max_tokens = max_tokens,
-                temperature=temperature
-            )   
-            return response.choices[0].message.content
+                max_tokens=max_tokens,
+                temperature=temperature,
+                stream=True,
+                stream_options={'include_usage': True},
+            )
         except Exception as e:
-            raise Exception(f"OpenAI API error: {e}")
-        
\ No newline at end of file
+            tracking.__exit__(type(e), e, e.__traceback__)
+            self._handle_error(e, member)
+
+        return response, estimated_tokens, member, tracking
+
+    @retry(wait=wait_random_exponential(min=2, max=5), stop=stop_after_attempt_unless_throttled(5))
+    async def _aopen_stream(self, messages: List[Dict[str, str]], max_tokens: int, temperature: float):
+        estimated_tokens = estimate_tokens(messages, max_tokens)
+        member = self.endpoints.choose(estimated_tokens)
+        await member.rate_limiter.aacquire(estimated_tokens)
+        # The request stays tracked until the stream ends (see `stream`), not only while it opens.
+        tracking = ExitStack()
+        tracking.enter_context(member.track())
+        try:
+            response = await member.async_client.chat.completions.create(
+                messages=messages,
+                model=self.model_name,
+                max_tokens=max_tokens,
+                temperature=temperature,
+                stream=True,
+                stream_options={'include_usage': True},
+            )
+        except Exception as e:
+            tracking.__exit__(type(e), e, e.__traceback__)
+            self._handle_error(e, member)
+
+        return response, estimated_tokens, member, tracking
+
+    def stream(self, messages: List[Dict[str, str]], max_tokens: int = 1024, temperature: float = 0.3) -> Iterator[str]:
+        """
+        Streams the completion of the chat completions API. Closing the generator closes the connection,
+        which ends the generation.
+
+        The endpoint tracks the request for the whole stream, so its in-flight count, latency and
+        failures cover the generation; a stream closed early counts as neither success nor failure.
+
+        Args:
+            messages (List[Dict[str, str]]): The chat messages to send.
+            max_tokens (int): Maximum number of tokens to generate.
+            temperature (float): Sampling temperature.
+
+        Yields:
+            str: The next chunk of generated text.
+
+        Raises:
+            Exception: If there is an error with the API call.
+        """
+        response, estimated_tokens, member, tracking = self._open_stream(messages, max_tokens, temperature)
+        used_tokens = None
+        generated_chars = 0
+        try:
+            with tracking:
+                try:
+                    for chunk in response:
+                        if chunk.usage:
+                            used_tokens = chunk.usage.total_tokens
+                        if chunk.choices and chunk.choices[0].delta.content:
+                            generated_chars += len(chunk.choices[0].delta.content)
+                            yield chunk.choices[0].delta.content
+                finally:
+                    response.close()
+        except Exception as e:
+            self._handle_error(e, member)
+        finally:
+            self._record_stream_usage(member, messages, estimated_tokens, used_tokens, generated_chars)
+
+    async def astream(self, messages: List[Dict[str, str]], max_tokens: int = 1024, temperature: float = 0.3) -> AsyncIterator[str]:
+        """
+        Asynchronous version of `stream`.
+
+        Args:
+            messages (List[Dict[str, str]]): The chat messages to send.
+            max_tokens (int): Maximum number of tokens to generate.
+            temperature (float): Sampling temperature.
+
+        Yields:
+            str: The next chunk of generated text.
+
+        Raises:
+            Exception: If there is an error with the API call.
+        """
+        response, estimated_tokens, member, tracking = await self._aopen_stream(messages, max_tokens, temperature)
+        used_tokens = None
+        generated_chars = 0
+        try:
+            with tracking:
+                try:
+                    async for chunk in response:
+                        if chunk.usage:
+                            used_tokens = chunk.usage.total_tokens
+                        if chunk.choices and chunk.choices[0].delta.content:
+                            generated_chars += len(chunk.choices[0].delta.content)
+                            yield chunk.choices[0].delta.content
+                finally:
+                    await response.close()
+        except Exception as e:
+            self._handle_error(e, member)
+        finally:
+            self._record_stream_usage(member, messages, estimated_tokens, used_tokens, generated_chars)
+
+    def batch_body(self, messages: List[Dict[str, str]], max_tokens: int = 1024, temperature: float = 0.3) -> dict:
+        """
+        Builds the body of a chat completion request for the Batch API.
+
+        Args:
+            messages (List[Dict[str, str]]): The chat messages to send.
+            max_tokens (int): Maximum number of tokens to generate.
+            temperature (float): Sampling temperature.
+
+        Returns:
+            dict: The request body, with the same parameters as `predict`.
+        """
+        return {
+            'messages': messages,
+            'model': self.model_name,
+            'max_tokens': max_tokens,
+            'temperature': temperature,
+        }
+
+    def batch_runner(self, state_dir: str, **kwargs) -> BatchRunner:
+        """
+        Creates a BatchRunner on the client of the predictor.
+
+        Args:
+            state_dir (str): Directory holding the state of the batches.
+            **kwargs: Additional arguments for the BatchRunner (e.g., 'poll_interval').
+
+        Returns:
+            BatchRunner: The runner.
+        """
+        return BatchRunner(self.client, state_dir, **kwargs)
+
+    def _candidate_logit_bias(self, candidates: List[str], bias: int = 20) -> Optional[Dict[str, int]]:
+        """
+        Builds a logit bias favoring the first token of each candidate answer.
+
+        The same bias is added to every candidate, so their relative probabilities are
+        preserved while the rest of the vocabulary is pushed away.
+
+        Args:
+            candidates (List[str]): The accepted answers (e.g., ['sim', 'não']).
+            bias (int): The bias added to the candidate tokens.
+
+        Returns:
+            Optional[Dict[str, int]]: The logit bias, or None if the tokenizer of the model is unavailable.
+        """
+        key = tuple(candidates)
+        if key not in self._logit_bias:
+            try:
+                import tiktoken
+                encoding = tiktoken.encoding_for_model(self.model_name)
+            except Exception:
+                # Unknown model, tiktoken not installed or encoding not downloadable.
+                self._logit_bias[key] = None
+                return None
+
+            token_ids = set()
+            for candidate in dict.fromkeys(candidates + [self._fold(candidate) for candidate in candidates]):
+                for variant in (candidate, candidate.capitalize(), ' ' + candidate, ' ' + candidate.capitalize()):
+                    token_ids.add(encoding.encode(variant)[0])
+            self._logit_bias[key] = {str(token_id): bias for token_id in token_ids}
+
+        return self._logit_bias[key]
+
+    @staticmethod
+    def _fold(text: str) -> str:
+        # Lowercase without accents, so 'Nao', 'nao' and 'não' match the same candidate.
+        decomposed = unicodedata.normalize('NFKD', text.lower())
+        return ''.join(char for char in decomposed if not unicodedata.combining(char))
+
+    @classmethod
+    def _candidate_probabilities(cls, response, candidates: List[str]) -> Dict[str, float]:
+        probabilities = dict.fromkeys(candidates, 0.0)
+        content = response.choices[0].logprobs.content if response.choices[0].logprobs else None
+        if not content:
+            return probabilities
+
+        folded_candidates = {candidate: cls._fold(candidate) for candidate in candidates}
+        for top_logprob in content[0].top_logprobs:
+            token = cls._fold(top_logprob.token.strip())
+            if not token:
+                continue
+            for candidate, folded in folded_candidates.items():
+                if folded.startswith(token) or token.startswith(folded):
+                    probabilities[candidate] += math.exp(top_logprob.logprob)
+                    break
+
+        return probabilities
+
+    def _logprob_request(self, messages: List[Dict[str, str]], candidates: List[str]) -> dict:
+        request = {
+            'messages': messages,
+            'model': self.model_name,
+            'max_tokens': 1,
+            'temperature': 0,
+            'logprobs': True,
+            'top_logprobs': 20,
+        }
+        logit_bias = self._candidate_logit_bias(candidates)
+        if logit_bias:
+            request['logit_bias'] = logit_bias
+
+        return request
+
+    @retry(wait=wait_random_exponential(min=2, max=5), stop=stop_after_attempt_unless_throttled(5))
+    def predict_logprobs(self, messages: List[Dict[str, str]], candidates: List[str]) -> Dict[str, float]:
+        """
+        Generates a single token and returns the probability of each candidate answer.
+
+        Args:
+            messages (List[Dict[str, str]]): The chat messages to send.
+            candidates (List[str]): The accepted answers (e.g., ['sim', 'não']).
+
+        Returns:
+            Dict[str, float]: The probability mass of the first token of each candidate.
+
+        Raises:
+            Exception: If there is an error with the API call.
+        """
+        estimated_tokens = estimate_tokens(messages, 1)
+        member = self.endpoints.choose(estimated_tokens)
+        member.rate_limiter.acquire(estimated_tokens)
+        try:
+            with member.track():
+                response = member.client.chat.completions.create(**self._logprob_request(messages, candidates))
+        except Exception as e:
+            self._handle_error(e, member)
+
+        member.record_usage(estimated_tokens, response.usage.total_tokens if response.usage else None)
+        return self._candidate_probabilities(response, candidates)
+
+    @retry(wait=wait_random_exponential(min=2, max=5), stop=stop_after_attempt_unless_throttled(5))
+    async def apredict_logprobs(self, messages: List[Dict[str, str]], candidates: List[str]) -> Dict[str, float]:
+        """
+        Asynchronous version of `predict_logprobs`.
+
+        Args:
+            messages (List[Dict[str, str]]): The chat messages to send.
+            candidates (List[str]): The accepted answers (e.g., ['sim', 'não']).
+
+        Returns:
+            Dict[str, float]: The probability mass of the first token of each candidate.
+
+        Raises:
+            Exception: If there is an error with the API call.
+        """
+        estimated_tokens = estimate_tokens(messages, 1)
+        member = self.endpoints.choose(estimated_tokens)
+        await member.rate_limiter.aacquire(estimated_tokens)
+        try:
+            with member.track():
+                response = await member.async_client.chat.completions.create(**self._logprob_request(messages, candidates))
+        except Exception as e:
+            self._handle_error(e, member)
+
+        member.record_usage(estimated_tokens, response.usage.total_tokens if response.usage else None)
+        return self._candidate_probabilities(response, candidates)
+
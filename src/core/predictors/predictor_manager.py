@@ -1,9 +1,15 @@
+import asyncio
+import inspect
 from typing import List, Dict, Union
-from src.core.predictors.openai_predictor import OpenAIPredictor
-from src.core.predictors.maritaca_ai import MaritacaAIPredictor
-from src.core.predictors.llama_predictor import LlamaCppPredictor
-from src.core.predictors.huggingface_predictor import HuggingFacePredictor
-from src.core.predictors.gemini_predictor import GeminiPredictor
+from tqdm.asyncio import tqdm_asyncio
+from src.core.cache import get_response_cache, make_cache_key
+from src.core.concurrency import get_concurrency_controller
+from src.core.predictors.registry import get_predictor_registry
+from src.core.streaming import StopCondition, collect_stream, acollect_stream
+
+class _LeaderCancelled(Exception):
+    # Raised in the requests coalesced into a cancelled one, so that one of them sends it instead.
+    pass
 
 class PredictionManager:
     """Manager class to handle predictions for a single model type."""
@@ -14,23 +20,49 @@ class PredictionManager:
 
         Args:
             model_name (str): The name of the model ('openai' or the Hugging Face model name).
-            **kwargs: Additional keyword arguments such as 'openai_api_key' and 'device'.
-        """
-        if service.lower() == 'openai':
-            api_key = kwargs.get('api_key')
-            self.predictor = OpenAIPredictor(model_name=model_name, api_key=api_key)
-        elif service.lower() == 'maritaca_ai':
-            api_key = kwargs.get('api_key')
-            self.predictor = MaritacaAIPredictor(model_name=model_name, api_key=api_key)
-        elif service.lower() == 'llama_cpp':
-            device = kwargs.get('device', 'gpu')
-            self.predictor = LlamaCppPredictor(model_name=model_name, device=device)
-        elif service.lower() == 'huggingface':
-            device = kwargs.get('device', 'gpu')
-            self.predictor = HuggingFacePredictor(model_name=model_name, device=device)
-        elif service.lower() == 'gemini':
-            api_key = kwargs.get('api_key')
-            self.predictor = GeminiPredictor(model_name=model_name, api_key=api_key)
+            **kwargs: Additional keyword arguments such as 'openai_api_key', 'device',
+                'concurrency' (maximum number of in-flight requests for `apredict_many`, default 8,
+                which also sizes the keep-alive connection pool of HTTP backends),
+                'rpm'/'tpm' (client-side rate limits for API services), 'adaptive_concurrency'
+                (let an AIMD controller shared by the backend set the number of in-flight requests,
+                starting from 'concurrency'), 'max_concurrency' (upper bound of that window, default 64),
+                'cache_path' (SQLite response cache shared by every manager using the same file),
+                'cache_max_size_bytes' (LRU eviction threshold of that cache), 'cache_bypass'
+                (skip cache lookups but still store fresh responses), 'quantize'/'low_cpu_mem_usage'
+                (quantized and memory-lean loading of Hugging Face models on CPU), 'fast_decode'
+                (static KV cache and compiled forward pass for Hugging Face models), 'prefix_cache_mb'
+                (memory budget of the llama.cpp prefix state cache), 'llama_workers'/'llama_threads'
+                (number of llama.cpp worker processes and CPU threads per worker), 'base_url'
+                (address of the local model server for the 'local_server' service) and
+                'model_memory_budget_mb' (RAM budget of the local models kept by the process-wide
+                predictor registry) and 'endpoints' (API keys and endpoints of an OpenAI-compatible
+                service to spread the requests across, as a list of dicts or a dict of such lists
+                keyed by service; see EndpointPool).
+        """
+        self.service = service
+        self.model_name = model_name
+        self.cache = None
+        self.cache_bypass = kwargs.get('cache_bypass', False)
+        self._in_flight = {}
+        if kwargs.get('cache_path'):
+            self.cache = get_response_cache(kwargs['cache_path'], max_size_bytes=kwargs.get('cache_max_size_bytes'))
+
+        self.concurrency = kwargs.get('concurrency', 8)
+        self.controller = None
+        if kwargs.get('adaptive_concurrency', False):
+            self.controller = get_concurrency_controller(
+                service,
+                model_name,
+                initial_limit=self.concurrency,
+                max_limit=kwargs.get('max_concurrency', 64)
+            )
+
+        if isinstance(kwargs.get('endpoints'), dict):
+            kwargs['endpoints'] = kwargs['endpoints'].get(service)
+
+        # Backends are imported on first use, and identical configurations share one predictor.
+        self.registry = get_predictor_registry(kwargs.get('model_memory_budget_mb'))
+        self.predictor = self.registry.get(service, model_name, **kwargs)
 
     def predict(self, messages: Union[str, List[Dict[str, str]]], temperature: float = 0.3, **kwargs) -> str:
         """Generates a prediction using the initialized predictor.
@@ -42,4 +74,341 @@ class PredictionManager:
         Returns:
             str: The prediction result.
         """
-        return self.predictor.predict(messages, **kwargs)
\ No newline at end of file
+        if self.cache is None:
+            return self.predictor.predict(messages, temperature=temperature, **kwargs)
+
+        key = self._cache_key(messages, temperature, kwargs)
+        if not self.cache_bypass:
+            cached = self.cache.get(key)
+            if cached is not None:
+                return cached
+
+        result = self.predictor.predict(messages, temperature=temperature, **kwargs)
+        self.cache.put(key, result)
+
+        return result
+
+    def _cache_key(self, messages: Union[str, List[Dict[str, str]]], temperature: float, kwargs: dict) -> str:
+        max_tokens = kwargs.get('max_tokens')
+        if max_tokens is None:
+            # Resolve the predictor default so that explicit and implicit values share a key.
+            parameter = inspect.signature(self.predictor.predict).parameters.get('max_tokens')
+            max_tokens = parameter.default if parameter is not None else None
+
+        return make_cache_key(self.service, self.model_name, messages, max_tokens, temperature)
+
+    async def _apredict(self, messages: Union[str, List[Dict[str, str]]], **kwargs) -> str:
+        if self.controller is None:
+            return await self.predictor.apredict(messages, **kwargs)
+
+        async with self.controller.slot():
+            return await self.predictor.apredict(messages, **kwargs)
+
+    async def apredict(self, messages: Union[str, List[Dict[str, str]]], temperature: float = 0.3, **kwargs) -> str:
+        """Generates a prediction asynchronously using the initialized predictor.
+
+        When a response cache is configured, cached responses are returned without calling
+        the backend and identical concurrent requests are coalesced into a single call. If the
+        request being awaited is cancelled, one of the coalesced requests sends it instead. Cache
+        lookups and writes run in a worker thread, off the event loop.
+
+        Args:
+            messages (Union[str, List[Dict[str, str]]]): The input data for which the prediction should be generated.
+            temperature (float): Sampling temperature.
+            **kwargs: Additional arguments for prediction (e.g., max_tokens).
+
+        Returns:
+            str: The prediction result.
+        """
+        if self.cache is None:
+            return await self._apredict(messages, temperature=temperature, **kwargs)
+
+        key = self._cache_key(messages, temperature, kwargs)
+        if not self.cache_bypass:
+            cached = await asyncio.to_thread(self.cache.get, key)
+            if cached is not None:
+                return cached
+
+        if key in self._in_flight:
+            self.cache.coalesced += 1
+        while key in self._in_flight:
+            try:
+                return await asyncio.shield(self._in_flight[key])
+            except _LeaderCancelled:
+                # The first coalesced request to get here sends the request itself.
+                continue
+
+        future = asyncio.get_running_loop().create_future()
+        self._in_flight[key] = future
+        try:
+            result = await self._apredict(messages, temperature=temperature, **kwargs)
+        except asyncio.CancelledError:
+            future.set_exception(_LeaderCancelled())
+            future.exception()
+            raise
+        except Exception as e:
+            future.set_exception(e)
+            # Mark the exception as retrieved in case no duplicate request is waiting on it.
+            future.exception()
+            raise
+        else:
+            future.set_result(result)
+            await asyncio.to_thread(self.cache.put, key, result)
+        finally:
+            del self._in_flight[key]
+
+        return result
+
+    def _cached_stream(self, key: str) -> dict:
+        if self.cache is None or self.cache_bypass:
+            return None
+
+        cached = self.cache.get(key)
+        if cached is None:
+            return None
+
+        return {'text': cached, 'ttft': None, 'latency': 0.0, 'abort_reason': None}
+
+    async def _acached_stream(self, key: str) -> dict:
+        return await asyncio.to_thread(self._cached_stream, key)
+
+    def predict_stream(self, messages: Union[str, List[Dict[str, str]]], stop: List[StopCondition] = None, temperature: float = 0.3, **kwargs) -> dict:
+        """Streams a prediction, aborting the generation as soon as a stop condition holds.
+
+        Only complete responses are stored in the response cache. A cached response is
+        returned as is, with no time to first token.
+
+        Args:
+            messages (Union[str, List[Dict[str, str]]]): The input data for which the prediction should be generated.
+            stop (List[StopCondition], optional): The stop conditions (see `src/core/streaming.py`).
+            temperature (float): Sampling temperature.
+            **kwargs: Additional arguments for prediction (e.g., max_tokens).
+
+        Returns:
+            dict: The generated 'text', the time to first token ('ttft') and total 'latency' in
+                seconds, and the 'abort_reason' (None if the response ended on its own).
+        """
+        key = self._cache_key(messages, temperature, kwargs) if self.cache is not None else None
+        cached = self._cached_stream(key)
+        if cached is not None:
+            return cached
+
+        outcome = collect_stream(self.predictor.stream(messages, temperature=temperature, **kwargs), stop)
+        if self.cache is not None and outcome['abort_reason'] is None:
+            self.cache.put(key, outcome['text'])
+
+        return outcome
+
+    async def apredict_stream(self, messages: Union[str, List[Dict[str, str]]], stop: List[StopCondition] = None, temperature: float = 0.3, **kwargs) -> dict:
+        """Asynchronous version of `predict_stream`.
+
+        Args:
+            messages (Union[str, List[Dict[str, str]]]): The input data for which the prediction should be generated.
+            stop (List[StopCondition], optional): The stop conditions.
+            temperature (float): Sampling temperature.
+            **kwargs: Additional arguments for prediction (e.g., max_tokens).
+
+        Returns:
+            dict: The generated 'text', 'ttft', 'latency' and 'abort_reason'.
+        """
+        key = self._cache_key(messages, temperature, kwargs) if self.cache is not None else None
+        cached = await self._acached_stream(key)
+        if cached is not None:
+            return cached
+
+        stream = self.predictor.astream(messages, temperature=temperature, **kwargs)
+        if self.controller is None:
+            outcome = await acollect_stream(stream, stop)
+        else:
+            async with self.controller.slot():
+                outcome = await acollect_stream(stream, stop)
+
+        if self.cache is not None and outcome['abort_reason'] is None:
+            await asyncio.to_thread(self.cache.put, key, outcome['text'])
+
+        return outcome
+
+    async def apredict_batch(self, messages_list: List[Union[str, List[Dict[str, str]]]], temperature: float = 0.3, **kwargs) -> List[str]:
+        """Generates predictions for several inputs with one call to the batched path of the predictor.
+
+        Local predictors generate the whole list in a few forward passes (see
+        `HuggingFacePredictor.predict_batch`); the others fall back to one prediction per input.
+        Cached responses are reused and only the misses are generated.
+
+        Args:
+            messages_list (List[Union[str, List[Dict[str, str]]]]): The inputs to predict.
+            temperature (float): Sampling temperature.
+            **kwargs: Additional arguments for `predict_batch` (e.g., max_tokens, batch_size).
+
+        Returns:
+            List[str]: The prediction results, in input order.
+        """
+        if self.cache is None:
+            return await self.predictor.apredict_batch(messages_list, temperature=temperature, **kwargs)
+
+        keys = [self._cache_key(messages, temperature, kwargs) for messages in messages_list]
+        results = [None] * len(keys) if self.cache_bypass else await asyncio.to_thread(lambda: [self.cache.get(key) for key in keys])
+        misses = [position for position, result in enumerate(results) if result is None]
+        if misses:
+            generated = await self.predictor.apredict_batch([messages_list[position] for position in misses], temperature=temperature, **kwargs)
+            for position, result in zip(misses, generated):
+                results[position] = result
+            await asyncio.to_thread(lambda: [self.cache.put(keys[position], results[position]) for position in misses])
+
+        return results
+
+    def predict_offline(self, messages_by_id: Dict[str, Union[str, List[Dict[str, str]]]], state_dir: str, temperature: float = 0.3,
+                        max_tokens: int = None, **kwargs) -> Dict[str, str]:
+        """Generates predictions for many inputs through the offline Batch API of the backend.
+
+        Cached responses are reused and only the misses are submitted. The batches are tracked
+        in `state_dir`, so calling this again after an interruption resumes the same batches.
+
+        Args:
+            messages_by_id (Dict[str, Union[str, List[Dict[str, str]]]]): The inputs, keyed by a unique id.
+            state_dir (str): Directory holding the state of the batches.
+            temperature (float): Sampling temperature.
+            max_tokens (int, optional): Maximum number of tokens to generate. Defaults to the predictor default.
+            **kwargs: Additional arguments for the BatchRunner (e.g., 'poll_interval', 'max_attempts').
+
+        Returns:
+            Dict[str, str]: The prediction of each id, or None when its requests kept failing.
+
+        Raises:
+            ValueError: If the backend has no Batch API.
+        """
+        if getattr(self.predictor, 'batch_runner', None) is None:
+            raise ValueError(f"The service '{self.service}' does not support the Batch API.")
+
+        generation_kwargs = {} if max_tokens is None else {'max_tokens': max_tokens}
+        keys = {}
+        results = {}
+        requests = {}
+        for custom_id, messages in messages_by_id.items():
+            if self.cache is not None:
+                keys[custom_id] = self._cache_key(messages, temperature, generation_kwargs)
+                cached = None if self.cache_bypass else self.cache.get(keys[custom_id])
+                if cached is not None:
+                    results[custom_id] = cached
+                    continue
+            requests[custom_id] = self.predictor.batch_body(messages, temperature=temperature, **generation_kwargs)
+
+        if requests:
+            responses = self.predictor.batch_runner(state_dir, **kwargs).run(requests)
+            for custom_id, response in responses.items():
+                if self.cache is not None:
+                    self.cache.put(keys[custom_id], response)
+                results[custom_id] = response
+
+        return {custom_id: results.get(custom_id) for custom_id in messages_by_id}
+
+    @property
+    def supports_logprobs(self) -> bool:
+        """Whether `aclassify` returns token probabilities rather than a 0/1 indicator."""
+        return getattr(self.predictor, 'apredict_logprobs', None) is not None
+
+    async def aclassify(self, messages: Union[str, List[Dict[str, str]]], candidates: List[str]) -> Dict[str, float]:
+        """Scores a fixed set of single-word answers with one generated token.
+
+        Uses the token log-probabilities of the backend when it exposes them. Otherwise the
+        answer is generated with a tiny token budget and the matching candidate gets 1 and the
+        others 0; this indicator is not a probability, so check `supports_logprobs` before
+        reading it as a score.
+
+        Args:
+            messages (Union[str, List[Dict[str, str]]]): The input data for which the answer should be generated.
+            candidates (List[str]): The accepted answers (e.g., ['sim', 'não']).
+
+        Returns:
+            Dict[str, float]: The probability (or 0/1 indicator) of each candidate. All zeros if no candidate matched.
+        """
+        apredict_logprobs = getattr(self.predictor, 'apredict_logprobs', None)
+        if apredict_logprobs is None:
+            answer = (await self.apredict(messages, max_tokens=3, temperature=0) or '').strip().lower()
+            return {candidate: float(bool(answer) and candidate.startswith(answer[:len(candidate)])) for candidate in candidates}
+
+        if self.controller is None:
+            return await apredict_logprobs(messages, candidates)
+
+        async with self.controller.slot():
+            return await apredict_logprobs(messages, candidates)
+
+    async def apredict_many(self, messages_list: List[Union[str, List[Dict[str, str]]]], concurrency: int = None, desc: str = None, **kwargs) -> List[str]:
+        """Generates predictions for several inputs concurrently.
+
+        At most `concurrency` requests are in flight at any time, or the adaptive window
+        of the backend when adaptive concurrency is enabled. Results are returned in the
+        same order as `messages_list`, regardless of completion order.
+
+        Args:
+            messages_list (List[Union[str, List[Dict[str, str]]]]): The inputs to predict.
+            concurrency (int, optional): Maximum number of in-flight requests. Defaults to
+                the value given at construction time.
+            desc (str, optional): Progress bar description. No progress bar is shown if None.
+            **kwargs: Additional arguments for prediction (e.g., max_tokens, temperature).
+
+        Returns:
+            List[str]: The prediction results, in input order.
+        """
+        if self.controller is not None:
+            # The controller already bounds the in-flight requests of the backend.
+            tasks = [self.apredict(messages, **kwargs) for messages in messages_list]
+            return await tqdm_asyncio.gather(*tasks, desc=desc, disable=desc is None)
+
+        semaphore = asyncio.Semaphore(concurrency or self.concurrency)
+
+        async def _predict(messages):
+            async with semaphore:
+                return await self.apredict(messages, **kwargs)
+
+        tasks = [_predict(messages) for messages in messages_list]
+        return await tqdm_asyncio.gather(*tasks, desc=desc, disable=desc is None)
+
+    def concurrency_stats(self) -> dict:
+        """Returns the state of the adaptive concurrency controller.
+
+        Returns:
+            dict: The current window, counters and latest decisions, or None if adaptive
+                concurrency is disabled.
+        """
+        if self.controller is None:
+            return None
+
+        return self.controller.stats()
+
+    def cache_stats(self) -> dict:
+        """Returns the statistics of the response cache.
+
+        Returns:
+            dict: Hits, misses, coalesced requests and cache size, or None if caching is disabled.
+        """
+        if self.cache is None:
+            return None
+
+        return self.cache.stats()
+
+    def endpoint_stats(self) -> List[dict]:
+        """Returns the statistics of every API key and endpoint used by the predictor.
+
+        Returns:
+            List[dict]: Breaker state, requests, failures, tokens and latency of each endpoint,
+                or None if the predictor does not use an endpoint pool.
+        """
+        endpoints = getattr(self.predictor, 'endpoints', None)
+        if endpoints is None:
+            return None
+
+        return endpoints.stats()
+
+    def generation_stats(self) -> dict:
+        """Returns the memory and throughput statistics of a local predictor.
+
+        Returns:
+            dict: Resident memory and generated tokens per second, or None if the predictor
+                does not report them.
+        """
+        stats = getattr(self.predictor, 'stats', None)
+        if stats is None:
+            return None
+
+        return stats()
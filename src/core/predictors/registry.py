@@ -0,0 +1,260 @@
+import gc
+import importlib
+import json
+import os
+import threading
+from collections import OrderedDict
+from concurrent.futures import Future
+from typing import Callable, Dict, Tuple
+from src.core.http_pool import pool_size
+from src.core.predictors.base import PredictionModel
+from src.core.utils import get_resident_memory_mb
+
+class Backend:
+    """A predictor class that is imported only when a predictor of its service is first created."""
+
+    def __init__(self, module: str, class_name: str, build: Callable[[type, str, dict], PredictionModel], config_keys: Tuple[str, ...], local: bool = False):
+        """
+        Initializes the Backend.
+
+        Args:
+            module (str): The module defining the predictor class.
+            class_name (str): The name of the predictor class.
+            build (Callable[[type, str, dict], PredictionModel]): Creates a predictor from the class,
+                the model name and the PredictionManager kwargs.
+            config_keys (Tuple[str, ...]): The kwargs that change the predictor. Predictors are
+                shared between managers with the same model name and values for these keys.
+            local (bool): Whether the predictor holds model weights in this process, and so counts
+                against the memory budget of the registry.
+        """
+        self.module = module
+        self.class_name = class_name
+        self.build = build
+        self.config_keys = config_keys
+        self.local = local
+
+    def create(self, model_name: str, kwargs: dict) -> PredictionModel:
+        predictor_class = getattr(importlib.import_module(self.module), self.class_name)
+        return self.build(predictor_class, model_name, kwargs)
+
+def _build_api(predictor_class: type, model_name: str, kwargs: dict) -> PredictionModel:
+    return predictor_class(
+        model_name=model_name,
+        api_key=kwargs.get('api_key'),
+        rpm=kwargs.get('rpm'),
+        tpm=kwargs.get('tpm'),
+        max_connections=pool_size(**kwargs),
+        endpoints=kwargs.get('endpoints')
+    )
+
+def _build_gemini(predictor_class: type, model_name: str, kwargs: dict) -> PredictionModel:
+    return predictor_class(model_name=model_name, api_key=kwargs.get('api_key'), rpm=kwargs.get('rpm'), tpm=kwargs.get('tpm'))
+
+def _build_llama_cpp(predictor_class: type, model_name: str, kwargs: dict) -> PredictionModel:
+    device = kwargs.get('device', 'gpu')
+    if kwargs.get('llama_workers', 1) > 1:
+        from src.core.predictors.llama_pool_predictor import LlamaCppPoolPredictor
+        return LlamaCppPoolPredictor(
+            model_name=model_name,
+            device=device,
+            workers=kwargs['llama_workers'],
+            n_threads=kwargs.get('llama_threads'),
+            prefix_cache_mb=kwargs.get('prefix_cache_mb')
+        )
+
+    return predictor_class(model_name=model_name, device=device, prefix_cache_mb=kwargs.get('prefix_cache_mb'), n_threads=kwargs.get('llama_threads'))
+
+def _build_huggingface(predictor_class: type, model_name: str, kwargs: dict) -> PredictionModel:
+    return predictor_class(
+        model_name=model_name,
+        device=kwargs.get('device', 'gpu'),
+        quantize=kwargs.get('quantize'),
+        low_cpu_mem_usage=kwargs.get('low_cpu_mem_usage', False),
+        fast_decode=kwargs.get('fast_decode', False)
+    )
+
+def _build_local_server(predictor_class: type, model_name: str, kwargs: dict) -> PredictionModel:
+    return predictor_class(model_name=model_name, base_url=kwargs.get('base_url'), max_connections=pool_size(**kwargs), endpoints=kwargs.get('endpoints'))
+
+# The connection pool of an HTTP predictor is sized by the concurrency of its manager.
+_POOL_KEYS = ('concurrency', 'adaptive_concurrency', 'max_concurrency')
+_API_KEYS = ('api_key', 'rpm', 'tpm', 'endpoints') + _POOL_KEYS
+
+BACKENDS: Dict[str, Backend] = {
+    'openai': Backend('src.core.predictors.openai_predictor', 'OpenAIPredictor', _build_api, _API_KEYS),
+    'maritaca_ai': Backend('src.core.predictors.maritaca_ai', 'MaritacaAIPredictor', _build_api, _API_KEYS),
+    'gemini': Backend('src.core.predictors.gemini_predictor', 'GeminiPredictor', _build_gemini, ('api_key', 'rpm', 'tpm')),
+    'llama_cpp': Backend(
+        'src.core.predictors.llama_predictor', 'LlamaCppPredictor', _build_llama_cpp,
+        ('device', 'prefix_cache_mb', 'llama_workers', 'llama_threads'), local=True
+    ),
+    'huggingface': Backend(
+        'src.core.predictors.huggingface_predictor', 'HuggingFacePredictor', _build_huggingface,
+        ('device', 'quantize', 'low_cpu_mem_usage', 'fast_decode'), local=True
+    ),
+    'local_server': Backend('src.core.predictors.local_server_predictor', 'LocalServerPredictor', _build_local_server, ('base_url', 'endpoints') + _POOL_KEYS),
+}
+
+def _hashable(value):
+    # Lists of endpoints are part of the configuration of a predictor.
+    return json.dumps(value, sort_keys=True) if isinstance(value, (list, dict)) else value
+
+def register_backend(service: str, backend: Backend):
+    """
+    Registers (or replaces) the backend of a service.
+
+    Args:
+        service (str): The service name used by PredictionManager.
+        backend (Backend): The backend.
+    """
+    BACKENDS[service.lower()] = backend
+
+def _model_size_mb(predictor: PredictionModel, memory_before: float) -> float:
+    model_size_mb = getattr(predictor, 'model_size_mb', None)
+    if model_size_mb is not None:
+        return model_size_mb()
+    return max(0.0, get_resident_memory_mb() - memory_before)
+
+class PredictorRegistry:
+    """Process-wide store of constructed predictors, shared by every PredictionManager.
+
+    Local models are evicted in least recently used order once their total size exceeds the
+    budget. The size comes from the `model_size_mb` method of the predictor (e.g. the GGUF file
+    size, or the weights of a Hugging Face model); predictors without it are measured by the
+    growth of the process RSS while they were loaded, which also counts models loaded at the
+    same time by other threads. An evicted model is freed once no manager holds it anymore.
+
+    Predictors are built outside the registry lock: other configurations can be looked up or
+    built meanwhile, and concurrent lookups of the configuration being built wait for it.
+    """
+
+    def __init__(self, memory_budget_mb: float = None):
+        """
+        Initializes the PredictorRegistry.
+
+        Args:
+            memory_budget_mb (float, optional): Memory budget of the local models. Unlimited if None.
+        """
+        self.memory_budget_mb = memory_budget_mb
+        self.predictors = OrderedDict()
+        self.loading = {}
+        self.sizes_mb = {}
+        self.created = 0
+        self.reused = 0
+        self.evictions = 0
+        self.lock = threading.Lock()
+
+    def get(self, service: str, model_name: str, **kwargs) -> PredictionModel:
+        """
+        Returns the predictor of a configuration, creating it on first use.
+
+        Args:
+            service (str): The service name (e.g., 'openai').
+            model_name (str): The model name.
+            **kwargs: The PredictionManager kwargs.
+
+        Returns:
+            PredictionModel: The shared predictor.
+
+        Raises:
+            ValueError: If the service is unknown.
+        """
+        backend = BACKENDS.get(service.lower())
+        if backend is None:
+            raise ValueError(f"Unsupported service: {service}. Choose between {', '.join(sorted(BACKENDS))}.")
+
+        key = (service.lower(), model_name, tuple((name, _hashable(kwargs.get(name))) for name in backend.config_keys))
+        with self.lock:
+            if key in self.predictors:
+                self.predictors.move_to_end(key)
+                self.reused += 1
+                return self.predictors[key]
+
+            loading = self.loading.get(key)
+            if loading is None:
+                # This caller builds the predictor; the placeholder makes the others wait for it.
+                self.loading[key] = Future()
+
+        if loading is not None:
+            predictor = loading.result()
+            with self.lock:
+                self.reused += 1
+            return predictor
+
+        try:
+            memory_before = get_resident_memory_mb()
+            predictor = backend.create(model_name, kwargs)
+            size_mb = _model_size_mb(predictor, memory_before) if backend.local else None
+        except BaseException as e:
+            with self.lock:
+                self.loading.pop(key).set_exception(e)
+            raise
+
+        with self.lock:
+            self.predictors[key] = predictor
+            self.created += 1
+            if size_mb is not None:
+                self.sizes_mb[key] = size_mb
+                self._evict(keep=key)
+            self.loading.pop(key).set_result(predictor)
+
+        return predictor
+
+    def _evict(self, keep: tuple):
+        if self.memory_budget_mb is None:
+            return
+
+        for key in list(self.sizes_mb):
+            if sum(self.sizes_mb.values()) <= self.memory_budget_mb:
+                break
+            if key == keep:
+                continue
+            predictor = self.predictors.pop(key)
+            del self.sizes_mb[key]
+            self.evictions += 1
+            close = getattr(predictor, 'close', None)
+            if close is not None:
+                close()
+            del predictor
+        gc.collect()
+
+    def stats(self) -> dict:
+        """
+        Returns the contents and counters of the registry.
+
+        Returns:
+            dict: Predictors created and reused, evictions and the estimated memory of the local models.
+        """
+        with self.lock:
+            return {
+                'predictors': [f'{service}:{model_name}' for service, model_name, _ in self.predictors],
+                'created': self.created,
+                'reused': self.reused,
+                'evictions': self.evictions,
+                'local_models_mb': sum(self.sizes_mb.values()),
+                'memory_budget_mb': self.memory_budget_mb,
+            }
+
+_registry = None
+_registry_lock = threading.Lock()
+
+def get_predictor_registry(memory_budget_mb: float = None) -> PredictorRegistry:
+    """
+    Returns the process-wide PredictorRegistry.
+
+    Args:
+        memory_budget_mb (float, optional): Memory budget of the local models. Defaults to the
+            MODEL_MEMORY_BUDGET_MB environment variable, or unlimited. A value given later
+            replaces the current budget.
+
+    Returns:
+        PredictorRegistry: The shared registry.
+    """
+    global _registry
+    with _registry_lock:
+        if _registry is None:
+            default_budget = os.environ.get('MODEL_MEMORY_BUDGET_MB')
+            _registry = PredictorRegistry(float(default_budget) if default_budget else None)
+        if memory_budget_mb is not None:
+            _registry.memory_budget_mb = memory_budget_mb
+        return _registry
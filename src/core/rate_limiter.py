@@ -0,0 +1,330 @@
+import asyncio
+import hashlib
+import threading
+import time
+from email.utils import parsedate_to_datetime
+from typing import Dict, List, Optional, Tuple, Union
+from tenacity.stop import stop_base
+
+class TokenBucket:
+    """A thread-safe token bucket that lets callers reserve capacity ahead of time."""
+
+    def __init__(self, capacity: float, refill_per_second: float):
+        """
+        Initializes the bucket full.
+
+        Args:
+            capacity (float): Maximum number of tokens held by the bucket.
+            refill_per_second (float): Number of tokens added per second.
+        """
+        self.capacity = capacity
+        self.refill_per_second = refill_per_second
+        self.tokens = capacity
+        self.updated_at = time.monotonic()
+        self.lock = threading.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated_at) * self.refill_per_second)
+        self.updated_at = now
+
+    def reserve(self, amount: float) -> float:
+        """
+        Takes `amount` tokens from the bucket, going into debt if needed.
+
+        Args:
+            amount (float): Number of tokens to take. Clamped to the bucket capacity.
+
+        Returns:
+            float: Seconds the caller must wait before the reservation is covered.
+        """
+        with self.lock:
+            self._refill()
+            self.tokens -= min(amount, self.capacity)
+            if self.tokens >= 0:
+                return 0.0
+            return -self.tokens / self.refill_per_second
+
+    def wait_time(self, amount: float) -> float:
+        """
+        Returns how long a reservation of `amount` tokens would wait, without taking them.
+
+        Args:
+            amount (float): Number of tokens.
+
+        Returns:
+            float: Seconds until the bucket holds `amount` tokens.
+        """
+        with self.lock:
+            self._refill()
+            missing = min(amount, self.capacity) - self.tokens
+            return max(0.0, missing / self.refill_per_second)
+
+    def resize(self, capacity: float, refill_per_second: float):
+        """
+        Changes the limit of the bucket, keeping its current level (and any outstanding reservations).
+
+        Args:
+            capacity (float): New maximum number of tokens held by the bucket.
+            refill_per_second (float): New number of tokens added per second.
+        """
+        with self.lock:
+            self._refill()
+            self.capacity = capacity
+            self.refill_per_second = refill_per_second
+            self.tokens = min(self.tokens, capacity)
+
+    def refund(self, amount: float):
+        """
+        Gives tokens back to the bucket (a negative amount takes more).
+
+        Args:
+            amount (float): Number of tokens to return.
+        """
+        with self.lock:
+            self._refill()
+            self.tokens = min(self.capacity, self.tokens + amount)
+
+class RateLimiter:
+    """Client-side requests-per-minute and tokens-per-minute limiter."""
+
+    def __init__(self, rpm: int = None, tpm: int = None):
+        """
+        Initializes the RateLimiter.
+
+        Args:
+            rpm (int, optional): Maximum requests per minute. Unlimited if None.
+            tpm (int, optional): Maximum tokens (prompt + completion) per minute. Unlimited if None.
+        """
+        self.request_bucket = None
+        self.token_bucket = None
+        self.blocked_until = 0.0
+        self.lock = threading.Lock()
+        self.configure(rpm=rpm, tpm=tpm)
+
+    def configure(self, rpm: int = None, tpm: int = None):
+        """
+        Sets the limits. Limits that are None are left unchanged.
+
+        Every predictor sharing the limiter configures it again, so a bucket is only changed when
+        its limit does, and then keeps its level: the reservations of requests in flight still count.
+
+        Args:
+            rpm (int, optional): Maximum requests per minute.
+            tpm (int, optional): Maximum tokens per minute.
+        """
+        with self.lock:
+            self.request_bucket = self._configure_bucket(self.request_bucket, rpm)
+            self.token_bucket = self._configure_bucket(self.token_bucket, tpm)
+
+    @staticmethod
+    def _configure_bucket(bucket: Optional[TokenBucket], per_minute: Optional[int]) -> Optional[TokenBucket]:
+        if not per_minute:
+            return bucket
+        if bucket is None:
+            return TokenBucket(capacity=per_minute, refill_per_second=per_minute / 60)
+        if bucket.capacity != per_minute:
+            bucket.resize(capacity=per_minute, refill_per_second=per_minute / 60)
+        return bucket
+
+    def _reserve(self, tokens: int) -> float:
+        waits = [0.0]
+        if self.request_bucket:
+            waits.append(self.request_bucket.reserve(1))
+        if self.token_bucket:
+            waits.append(self.token_bucket.reserve(tokens))
+        with self.lock:
+            waits.append(self.blocked_until - time.monotonic())
+
+        return max(waits)
+
+    def expected_wait(self, tokens: int = 0) -> float:
+        """
+        Returns how long a request of `tokens` estimated tokens would wait, without reserving capacity.
+
+        Args:
+            tokens (int): Estimated number of tokens the request will consume.
+
+        Returns:
+            float: Seconds until the request may be sent.
+        """
+        waits = [0.0]
+        if self.request_bucket:
+            waits.append(self.request_bucket.wait_time(1))
+        if self.token_bucket:
+            waits.append(self.token_bucket.wait_time(tokens))
+        with self.lock:
+            waits.append(self.blocked_until - time.monotonic())
+
+        return max(waits)
+
+    def acquire(self, tokens: int = 0):
+        """
+        Blocks until a request of `tokens` estimated tokens may be sent.
+
+        Args:
+            tokens (int): Estimated number of tokens the request will consume.
+        """
+        wait = self._reserve(tokens)
+        if wait > 0:
+            time.sleep(wait)
+
+    async def aacquire(self, tokens: int = 0):
+        """
+        Waits asynchronously until a request of `tokens` estimated tokens may be sent.
+
+        Args:
+            tokens (int): Estimated number of tokens the request will consume.
+        """
+        wait = self._reserve(tokens)
+        if wait > 0:
+            await asyncio.sleep(wait)
+
+    def record_usage(self, estimated_tokens: int, used_tokens: Optional[int]):
+        """
+        Corrects the token bucket once the real usage of a request is known.
+
+        Args:
+            estimated_tokens (int): The estimate passed to `acquire`.
+            used_tokens (Optional[int]): The usage reported by the provider, if any.
+        """
+        if self.token_bucket and used_tokens is not None:
+            self.token_bucket.refund(estimated_tokens - used_tokens)
+
+    def penalize(self, seconds: float):
+        """
+        Blocks every caller of this limiter for `seconds`, e.g. after a `Retry-After` header.
+
+        Args:
+            seconds (float): Number of seconds to wait before the next request.
+        """
+        with self.lock:
+            self.blocked_until = max(self.blocked_until, time.monotonic() + seconds)
+
+_rate_limiters: Dict[Tuple[str, str, str], RateLimiter] = {}
+_rate_limiters_lock = threading.Lock()
+
+def get_rate_limiter(service: str, model_name: str, api_key: str = None, rpm: int = None, tpm: int = None) -> RateLimiter:
+    """
+    Returns the process-wide RateLimiter for a (service, model, api key) triple.
+
+    Predictors and judges that share the same account and model share the same limiter.
+
+    Args:
+        service (str): The service name (e.g., 'openai').
+        model_name (str): The model name.
+        api_key (str, optional): The API key. Only a hash of it is kept.
+        rpm (int, optional): Maximum requests per minute.
+        tpm (int, optional): Maximum tokens per minute.
+
+    Returns:
+        RateLimiter: The shared limiter.
+    """
+    key_hash = hashlib.sha256((api_key or '').encode()).hexdigest()
+    key = (service, model_name, key_hash)
+
+    with _rate_limiters_lock:
+        rate_limiter = _rate_limiters.get(key)
+        if rate_limiter is None:
+            rate_limiter = _rate_limiters[key] = RateLimiter(rpm=rpm, tpm=tpm)
+        else:
+            rate_limiter.configure(rpm=rpm, tpm=tpm)
+
+    return rate_limiter
+
+def estimate_tokens(messages: Union[str, List[Dict[str, str]]], max_tokens: int) -> int:
+    """
+    Estimates the tokens a request will consume: roughly 4 characters per prompt token
+    plus the full completion budget.
+
+    Args:
+        messages (Union[str, List[Dict[str, str]]]): The prompt.
+        max_tokens (int): Maximum number of tokens to generate.
+
+    Returns:
+        int: The estimated token count.
+    """
+    if isinstance(messages, str):
+        characters = len(messages)
+    else:
+        characters = sum(len(message.get('content', '')) for message in messages)
+
+    return characters // 4 + max_tokens
+
+def _iter_exception_chain(exception: BaseException):
+    seen = set()
+    while exception is not None and id(exception) not in seen:
+        seen.add(id(exception))
+        yield exception
+        exception = exception.__cause__ or exception.__context__
+
+def get_retry_after(exception: BaseException) -> Optional[float]:
+    """
+    Extracts the `Retry-After` delay from an HTTP error or any exception it was raised from.
+
+    Args:
+        exception (BaseException): The exception raised by a client.
+
+    Returns:
+        Optional[float]: The delay in seconds, or None if the server did not send one.
+    """
+    for error in _iter_exception_chain(exception):
+        response = getattr(error, 'response', None)
+        headers = getattr(response, 'headers', None)
+        if not headers:
+            continue
+
+        retry_after_ms = headers.get('retry-after-ms')
+        if retry_after_ms:
+            try:
+                return float(retry_after_ms) / 1000
+            except ValueError:
+                pass
+
+        retry_after = headers.get('retry-after')
+        if retry_after:
+            try:
+                return float(retry_after)
+            except ValueError:
+                try:
+                    return max(0.0, parsedate_to_datetime(retry_after).timestamp() - time.time())
+                except (TypeError, ValueError):
+                    pass
+
+    return None
+
+def is_throttled(exception: BaseException) -> bool:
+    """
+    Checks whether an exception (or any exception it was raised from) is a rate limit error.
+
+    Args:
+        exception (BaseException): The exception raised by a client.
+
+    Returns:
+        bool: True for HTTP 429 / quota errors.
+    """
+    for error in _iter_exception_chain(exception):
+        if getattr(error, 'status_code', None) == 429 or getattr(error, 'code', None) == 429:
+            return True
+        if type(error).__name__ in ('RateLimitError', 'ResourceExhausted', 'TooManyRequests'):
+            return True
+
+    return False
+
+class stop_after_attempt_unless_throttled(stop_base):
+    """Tenacity stop condition with a separate, larger attempt budget for rate limit errors.
+
+    Throttled requests are paced by the RateLimiter, so giving up on them after a few
+    attempts would only drop rows that are guaranteed to succeed later.
+    """
+
+    def __init__(self, max_attempts: int, max_throttled_attempts: int = 30):
+        self.max_attempts = max_attempts
+        self.max_throttled_attempts = max_throttled_attempts
+
+    def __call__(self, retry_state) -> bool:
+        exception = retry_state.outcome.exception() if retry_state.outcome else None
+        if exception is not None and is_throttled(exception):
+            return retry_state.attempt_number >= self.max_throttled_attempts
+
+        return retry_state.attempt_number >= self.max_attempts
@@ -0,0 +1,197 @@
+import json
+import os
+import time
+from typing import Dict, Iterable, Iterator, Set, Union
+import pandas as pd
+
+class ResultWriter:
+    """Append-only JSONL log of per-row results that survives crashes and interruptions.
+
+    Each line holds one record with a 'row' key (the dataset index). Lines are flushed
+    immediately and fsynced in batches, so at most the last batch can be lost on a power
+    failure, and a partial line left by a crash is discarded when the log is reopened.
+    """
+
+    def __init__(self, path: str, fsync_every: int = 32, fsync_interval: float = 2.0):
+        """
+        Opens the log for appending.
+
+        Args:
+            path (str): Path to the JSONL log.
+            fsync_every (int): Number of records written between two fsyncs.
+            fsync_interval (float): Maximum number of seconds between two fsyncs.
+        """
+        self.path = path
+        self.fsync_every = fsync_every
+        self.fsync_interval = fsync_interval
+        self.pending = 0
+        self.last_fsync = time.monotonic()
+
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        self._discard_partial_line()
+        self.file = open(path, 'a', encoding='utf-8')
+
+    def _discard_partial_line(self):
+        if not os.path.exists(self.path):
+            return
+
+        with open(self.path, 'rb+') as file:
+            file.seek(0, os.SEEK_END)
+            size = file.tell()
+            if size == 0:
+                return
+            file.seek(size - 1)
+            if file.read(1) == b'\n':
+                return
+
+            # Walk back to the last complete line and cut the rest.
+            position = size - 1
+            while position > 0:
+                step = min(4096, position)
+                position -= step
+                file.seek(position)
+                chunk = file.read(step)
+                newline = chunk.rfind(b'\n')
+                if newline != -1:
+                    file.truncate(position + newline + 1)
+                    return
+            file.truncate(0)
+
+    def completed_rows(self) -> Set[int]:
+        """
+        Returns the rows that already have a result in the log.
+
+        Returns:
+            Set[int]: The dataset indices found in the log.
+        """
+        return {record['row'] for record in iter_records(self.path)}
+
+    def write(self, row: int, record: Dict):
+        """
+        Appends the result of a row.
+
+        Args:
+            row (int): The dataset index of the row.
+            record (Dict): The result columns of the row (e.g., 'Results', 'Evaluation').
+        """
+        self.file.write(json.dumps({'row': int(row), **record}, ensure_ascii=False) + '\n')
+        self.file.flush()
+        self.pending += 1
+
+        if self.pending >= self.fsync_every or time.monotonic() - self.last_fsync >= self.fsync_interval:
+            self.sync()
+
+    def sync(self):
+        """Forces the written records to disk."""
+        self.file.flush()
+        os.fsync(self.file.fileno())
+        self.pending = 0
+        self.last_fsync = time.monotonic()
+
+    def close(self):
+        """Syncs and closes the log."""
+        if not self.file.closed:
+            self.sync()
+            self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+        return False
+
+def iter_records(path: str) -> Iterator[Dict]:
+    """
+    Iterates over the records of a result log, skipping a truncated last line.
+
+    Args:
+        path (str): Path to the JSONL log.
+
+    Yields:
+        Dict: The records, in write order.
+    """
+    if not os.path.exists(path):
+        return
+
+    with open(path, 'r', encoding='utf-8') as file:
+        for line in file:
+            if not line.endswith('\n'):
+                break
+            yield json.loads(line)
+
+def finalize_results(log_path: str, df: Union[pd.DataFrame, Iterable[pd.DataFrame]], output_path: str, chunk_size: int = 10000) -> int:
+    """
+    Joins the result log with the dataset and writes the rows in dataset order.
+
+    Only the byte offset of each row is kept in memory; records are read back from the
+    log one chunk of rows at a time. When a row appears more than once, the last record wins.
+
+    Args:
+        log_path (str): Path to the JSONL log.
+        df (Union[pd.DataFrame, Iterable[pd.DataFrame]]): The dataset, indexed by the same row keys
+            used in the log, or its chunks in order (e.g., from `iter_jsonl_chunks`).
+        output_path (str): Path to the CSV file to write.
+        chunk_size (int): Number of rows written at a time when `df` is a DataFrame.
+
+    Returns:
+        int: The number of dataset rows without a result.
+    """
+    offsets = {}
+    columns = {}
+    with open(log_path, 'rb') as file:
+        offset = 0
+        for line in file:
+            if not line.endswith(b'\n'):
+                break
+            record = json.loads(line)
+            offsets[record.pop('row')] = offset
+            columns.update(dict.fromkeys(record))
+            offset += len(line)
+
+    if isinstance(df, pd.DataFrame):
+        if len(df) == 0:
+            df.assign(**{column: None for column in columns}).to_csv(output_path, index=False)
+            return 0
+        chunks = (df.iloc[start:start + chunk_size] for start in range(0, len(df), chunk_size))
+    else:
+        chunks = df
+
+    temporary_path = f'{output_path}.tmp'
+    missing = 0
+    written = False
+
+    with open(log_path, 'rb') as log:
+        for chunk in chunks:
+            chunk = chunk.copy()
+            records = []
+            for row in chunk.index:
+                if row not in offsets:
+                    missing += 1
+                    records.append({})
+                    continue
+                log.seek(offsets[row])
+                record = json.loads(log.readline())
+                record.pop('row')
+                records.append(record)
+
+            results = pd.DataFrame(records, index=chunk.index, columns=list(columns))
+            for column in results.columns:
+                chunk[column] = results[column]
+
+            chunk.to_csv(temporary_path, index=False, mode='a' if written else 'w', header=not written)
+            written = True
+
+    if not written:
+        pd.DataFrame(columns=list(columns)).to_csv(output_path, index=False)
+        return 0
+
+    os.replace(temporary_path, output_path)
+
+    if missing:
+        print(f"Warning: {missing} rows have no result in '{log_path}'.")
+
+    return missing
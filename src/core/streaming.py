@@ -0,0 +1,180 @@
+import time
+from typing import AsyncIterator, Callable, Iterator, List, Optional
+from src.core.regex import REFUSAL_PATTERNS, COMPLIANCE_PATTERNS
+
+# A stop condition receives the text generated so far and returns the reason to abort, or None.
+StopCondition = Callable[[str], Optional[str]]
+
+# Stop conditions scan the text generated so far, so they are checked once per this many new
+# characters rather than on every chunk, which would make long responses quadratic.
+STOP_CHECK_CHARS = 64
+
+class RefusalStop:
+    """Aborts a response that opens with a refusal.
+
+    Fires once at least `min_chars` characters were generated, a refusal pattern appears in the
+    first `head_chars` of them and none of the compliance signs of `classify_refusal` (code, step
+    lists, "no entanto", ...) appeared so far. Short refusals end on their own before `min_chars`.
+    """
+
+    def __init__(self, min_chars: int = 200, head_chars: int = 400):
+        """
+        Initializes the RefusalStop.
+
+        Args:
+            min_chars (int): Number of characters generated before the condition is checked.
+            head_chars (int): Number of leading characters searched for a refusal.
+        """
+        self.min_chars = min_chars
+        self.head_chars = head_chars
+
+    def __call__(self, text: str) -> Optional[str]:
+        if len(text) < self.min_chars:
+            return None
+
+        head = text[:self.head_chars]
+        if not any(pattern.search(head) for pattern in REFUSAL_PATTERNS):
+            return None
+        if any(pattern.search(text) for pattern in COMPLIANCE_PATTERNS):
+            return None
+
+        return 'refusal'
+
+class MaxCharsStop:
+    """Aborts a response once it reaches a number of characters.
+
+    Conditions are checked every `STOP_CHECK_CHARS` new characters, so the kept text can run
+    up to that many characters past the limit.
+    """
+
+    def __init__(self, max_chars: int):
+        """
+        Initializes the MaxCharsStop.
+
+        Args:
+            max_chars (int): Number of characters after which a response is aborted.
+        """
+        self.max_chars = max_chars
+
+    def __call__(self, text: str) -> Optional[str]:
+        return 'max_chars' if len(text) >= self.max_chars else None
+
+def build_stop_conditions(stop_on_refusal: bool = False, max_chars: int = None) -> List[StopCondition]:
+    """
+    Builds the stop conditions selected on the command line of the experiment scripts.
+
+    Args:
+        stop_on_refusal (bool): Abort responses that open with a refusal.
+        max_chars (int, optional): Abort responses once they reach this number of characters.
+
+    Returns:
+        List[StopCondition]: The conditions, checked in this order.
+    """
+    conditions = []
+    if stop_on_refusal:
+        conditions.append(RefusalStop())
+    if max_chars:
+        conditions.append(MaxCharsStop(max_chars))
+
+    return conditions
+
+def check_stop(conditions: List[StopCondition], text: str) -> Optional[str]:
+    """
+    Returns the reason of the first condition that holds for the text, or None.
+
+    Args:
+        conditions (List[StopCondition]): The stop conditions.
+        text (str): The text generated so far.
+
+    Returns:
+        Optional[str]: The abort reason, or None to keep generating.
+    """
+    for condition in conditions:
+        reason = condition(text)
+        if reason is not None:
+            return reason
+
+    return None
+
+def _stream_result(text: str, started: float, first_token: float, abort_reason: Optional[str]) -> dict:
+    return {
+        'text': text,
+        'ttft': first_token - started if first_token is not None else None,
+        'latency': time.perf_counter() - started,
+        'abort_reason': abort_reason,
+    }
+
+def collect_stream(stream: Iterator[str], stop: List[StopCondition] = None, check_every: int = STOP_CHECK_CHARS) -> dict:
+    """
+    Consumes a stream of text chunks, closing it as soon as a stop condition holds.
+
+    Closing the stream ends the request, so the backend stops generating.
+
+    Args:
+        stream (Iterator[str]): The text chunks (see `PredictionModel.stream`).
+        stop (List[StopCondition], optional): The stop conditions.
+        check_every (int): Number of new characters between two checks of the stop conditions.
+
+    Returns:
+        dict: The generated 'text', the time to first token ('ttft') and total 'latency' in
+            seconds, and the 'abort_reason' (None if the response ended on its own).
+    """
+    started = time.perf_counter()
+    first_token = None
+    text = ''
+    checked_chars = 0
+    abort_reason = None
+    try:
+        for chunk in stream:
+            if not chunk:
+                continue
+            if first_token is None:
+                first_token = time.perf_counter()
+            text += chunk
+            if stop and len(text) - checked_chars >= check_every:
+                checked_chars = len(text)
+                abort_reason = check_stop(stop, text)
+                if abort_reason is not None:
+                    break
+    finally:
+        close = getattr(stream, 'close', None)
+        if close is not None:
+            close()
+
+    return _stream_result(text, started, first_token, abort_reason)
+
+async def acollect_stream(stream: AsyncIterator[str], stop: List[StopCondition] = None, check_every: int = STOP_CHECK_CHARS) -> dict:
+    """
+    Asynchronous version of `collect_stream`.
+
+    Args:
+        stream (AsyncIterator[str]): The text chunks (see `PredictionModel.astream`).
+        stop (List[StopCondition], optional): The stop conditions.
+        check_every (int): Number of new characters between two checks of the stop conditions.
+
+    Returns:
+        dict: The generated 'text', 'ttft', 'latency' and 'abort_reason'.
+    """
+    started = time.perf_counter()
+    first_token = None
+    text = ''
+    checked_chars = 0
+    abort_reason = None
+    try:
+        async for chunk in stream:
+            if not chunk:
+                continue
+            if first_token is None:
+                first_token = time.perf_counter()
+            text += chunk
+            if stop and len(text) - checked_chars >= check_every:
+                checked_chars = len(text)
+                abort_reason = check_stop(stop, text)
+                if abort_reason is not None:
+                    break
+    finally:
+        aclose = getattr(stream, 'aclose', None)
+        if aclose is not None:
+            await aclose()
+
+    return _stream_result(text, started, first_token, abort_reason)
@@ -1,5 +1,7 @@
 import os
 import pickle
+import resource
+import sys
 import yaml
 
 def load_yaml(file_path):
@@ -95,4 +97,21 @@ def check_file_exists(file_path):
     - FileExistsError: If a file with the given path already exists.
     """
     if os.path.exists(file_path):
-        raise FileExistsError(f"The file '{file_path}' already exists.")
\ No newline at end of file
+        raise FileExistsError(f"The file '{file_path}' already exists.")
+
+def get_resident_memory_mb():
+    """
+    Returns the resident set size of the current process.
+
+    Returns:
+    float: The current resident memory in MB, or the peak resident memory where /proc is unavailable.
+    """
+    try:
+        with open('/proc/self/statm', 'r') as file:
+            resident_pages = int(file.read().split()[1])
+        return resident_pages * os.sysconf('SC_PAGE_SIZE') / (1024 * 1024)
+    except (OSError, ValueError, IndexError):
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        # ru_maxrss is in bytes on macOS and in kilobytes elsewhere.
+        return peak / (1024 * 1024) if sys.platform == 'darwin' else peak / 1024
+
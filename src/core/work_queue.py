@@ -0,0 +1,252 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+from typing import Dict, Iterator, List, Optional, Tuple
+
+class WorkQueue:
+    """Durable SQLite queue of row tasks shared by any number of worker processes.
+
+    A coordinator enqueues one task per dataset row. Workers lease tasks for `lease_seconds`,
+    renew the leases while the tasks run and complete them with their result. A task whose
+    lease expired (e.g. its worker crashed) is leased again by the next worker that asks.
+    Completion is idempotent: the first result of a row is kept and later ones are ignored,
+    so a task finished twice after an expired lease is stored once.
+
+    Workers on other hosts can share the queue through a network filesystem (NFS, SMB) whose
+    byte-range locks work, using SQLite's default rollback journal. The WAL journal is faster
+    under concurrent writers but relies on shared memory next to the database file, which does
+    not work across hosts, so it is opt-in (`wal`) for queues whose workers all run on one host.
+    """
+
+    def __init__(self, path: str, lease_seconds: float = 300.0, max_attempts: int = 5, wal: bool = False):
+        """
+        Opens (or creates) the queue database.
+
+        Args:
+            path (str): Path to the SQLite file.
+            lease_seconds (float): Seconds a leased task stays reserved to its worker without a renewal.
+            max_attempts (int): Number of leases after which a failing task is marked as failed.
+            wal (bool): Switch the database to the WAL journal, for single-host queues only. The
+                journal mode is stored in the database, so it is chosen by whoever creates the
+                queue and later connections keep it.
+        """
+        self.path = path
+        self.lease_seconds = lease_seconds
+        self.max_attempts = max_attempts
+        self.lock = threading.Lock()
+
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        # Transactions are opened explicitly, so that leasing is a single atomic read-modify-write.
+        self.connection = sqlite3.connect(path, check_same_thread=False, timeout=60, isolation_level=None)
+        if wal:
+            self.connection.execute('PRAGMA journal_mode=WAL')
+        self.connection.execute(
+            'CREATE TABLE IF NOT EXISTS tasks ('
+            'row INTEGER PRIMARY KEY, payload TEXT NOT NULL, state TEXT NOT NULL, worker TEXT, '
+            'lease_until REAL NOT NULL DEFAULT 0, attempts INTEGER NOT NULL DEFAULT 0, '
+            'result TEXT, error TEXT, updated_at REAL NOT NULL)'
+        )
+        self.connection.execute('CREATE INDEX IF NOT EXISTS tasks_state ON tasks (state, lease_until)')
+        self.connection.execute('CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT NOT NULL)')
+
+    def _transaction(self):
+        return _Transaction(self.connection, self.lock)
+
+    def set_config(self, config: Dict):
+        """
+        Stores the experiment configuration, so that workers need only the path of the queue.
+
+        Args:
+            config (Dict): JSON-serializable configuration of the experiment.
+        """
+        with self._transaction():
+            self.connection.execute('INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)', ('config', json.dumps(config, ensure_ascii=False)))
+
+    def config(self) -> Optional[Dict]:
+        """
+        Returns the stored experiment configuration.
+
+        Returns:
+            Optional[Dict]: The configuration, or None if the queue has none.
+        """
+        with self.lock:
+            row = self.connection.execute('SELECT value FROM meta WHERE key = ?', ('config',)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def enqueue(self, tasks: Dict[int, Dict]) -> int:
+        """
+        Adds row tasks. Rows already in the queue are left untouched, so enqueuing again is safe.
+
+        Args:
+            tasks (Dict[int, Dict]): The JSON-serializable payload of each dataset row.
+
+        Returns:
+            int: The number of tasks added.
+        """
+        now = time.time()
+        with self._transaction():
+            before = self.connection.total_changes
+            self.connection.executemany(
+                "INSERT OR IGNORE INTO tasks (row, payload, state, updated_at) VALUES (?, ?, 'pending', ?)",
+                ((int(row), json.dumps(payload, ensure_ascii=False), now) for row, payload in tasks.items())
+            )
+            return self.connection.total_changes - before
+
+    def lease(self, worker: str, count: int = 1) -> List[Tuple[int, Dict]]:
+        """
+        Reserves pending tasks, and tasks whose lease expired, in row order.
+
+        Args:
+            worker (str): Identifier of the worker (e.g., 'host:pid').
+            count (int): Maximum number of tasks to reserve.
+
+        Returns:
+            List[Tuple[int, Dict]]: The rows and payloads of the reserved tasks. Empty when no task is available.
+        """
+        now = time.time()
+        with self._transaction():
+            # A task whose workers keep dying without reporting an error must not be leased forever.
+            self.connection.execute(
+                "UPDATE tasks SET state = 'failed', error = 'lease expired', updated_at = ? WHERE state = 'leased' AND lease_until < ? AND attempts >= ?",
+                (now, now, self.max_attempts)
+            )
+            rows = self.connection.execute(
+                "SELECT row, payload FROM tasks WHERE state = 'pending' OR (state = 'leased' AND lease_until < ?) ORDER BY row LIMIT ?",
+                (now, count)
+            ).fetchall()
+            self.connection.executemany(
+                "UPDATE tasks SET state = 'leased', worker = ?, lease_until = ?, attempts = attempts + 1, updated_at = ? WHERE row = ?",
+                ((worker, now + self.lease_seconds, now, row) for row, _ in rows)
+            )
+
+        return [(row, json.loads(payload)) for row, payload in rows]
+
+    def renew(self, worker: str, rows: List[int]) -> int:
+        """
+        Extends the leases a worker still holds.
+
+        Args:
+            worker (str): Identifier of the worker.
+            rows (List[int]): The rows being processed.
+
+        Returns:
+            int: The number of leases extended. Leases taken over by another worker are not.
+        """
+        now = time.time()
+        with self._transaction():
+            before = self.connection.total_changes
+            self.connection.executemany(
+                "UPDATE tasks SET lease_until = ?, updated_at = ? WHERE row = ? AND state = 'leased' AND worker = ?",
+                ((now + self.lease_seconds, now, int(row), worker) for row in rows)
+            )
+            return self.connection.total_changes - before
+
+    def complete(self, row: int, worker: str, result: Dict) -> bool:
+        """
+        Stores the result of a task.
+
+        Args:
+            row (int): The dataset row of the task.
+            worker (str): Identifier of the worker.
+            result (Dict): The JSON-serializable result columns of the row.
+
+        Returns:
+            bool: True if the result was stored, False if the row was already completed.
+        """
+        with self._transaction():
+            cursor = self.connection.execute(
+                "UPDATE tasks SET state = 'done', worker = ?, result = ?, error = NULL, updated_at = ? WHERE row = ? AND state != 'done'",
+                (worker, json.dumps(result, ensure_ascii=False), time.time(), int(row))
+            )
+            return cursor.rowcount > 0
+
+    def fail(self, row: int, worker: str, error: str):
+        """
+        Releases a task whose processing failed, so that it is retried, or marks it as failed after `max_attempts` leases.
+
+        Args:
+            row (int): The dataset row of the task.
+            worker (str): Identifier of the worker.
+            error (str): Description of the error.
+        """
+        with self._transaction():
+            self.connection.execute(
+                "UPDATE tasks SET state = CASE WHEN attempts >= ? THEN 'failed' ELSE 'pending' END, lease_until = 0, error = ?, updated_at = ? "
+                "WHERE row = ? AND state = 'leased' AND worker = ?",
+                (self.max_attempts, error, time.time(), int(row), worker)
+            )
+
+    def retry_failed(self) -> int:
+        """
+        Puts the failed tasks back in the queue with a fresh attempt count.
+
+        Returns:
+            int: The number of tasks re-queued.
+        """
+        with self._transaction():
+            cursor = self.connection.execute("UPDATE tasks SET state = 'pending', attempts = 0, lease_until = 0, updated_at = ? WHERE state = 'failed'", (time.time(),))
+            return cursor.rowcount
+
+    def results(self) -> Iterator[Tuple[int, Dict]]:
+        """
+        Iterates over the completed tasks.
+
+        Yields:
+            Tuple[int, Dict]: The row and result of each completed task, in row order.
+        """
+        with self.lock:
+            rows = self.connection.execute("SELECT row, result FROM tasks WHERE state = 'done' ORDER BY row").fetchall()
+        for row, result in rows:
+            yield row, json.loads(result)
+
+    def stats(self) -> dict:
+        """
+        Returns the progress of the queue.
+
+        Returns:
+            dict: Number of tasks per state ('pending', 'leased', 'done', 'failed'), leases expired
+                and not yet taken over, and the workers holding leases.
+        """
+        now = time.time()
+        with self.lock:
+            states = dict(self.connection.execute('SELECT state, COUNT(*) FROM tasks GROUP BY state').fetchall())
+            expired = self.connection.execute("SELECT COUNT(*) FROM tasks WHERE state = 'leased' AND lease_until < ?", (now,)).fetchone()[0]
+            workers = [worker for worker, in self.connection.execute("SELECT DISTINCT worker FROM tasks WHERE state = 'leased' AND lease_until >= ?", (now,))]
+
+        return {
+            **{state: states.get(state, 0) for state in ('pending', 'leased', 'done', 'failed')},
+            'expired_leases': expired,
+            'active_workers': workers,
+        }
+
+    def close(self):
+        """Closes the database."""
+        with self.lock:
+            self.connection.close()
+
+class _Transaction:
+    # BEGIN IMMEDIATE takes the write lock up front, so concurrent workers never lease the same task.
+    def __init__(self, connection: sqlite3.Connection, lock: threading.Lock):
+        self.connection = connection
+        self.lock = lock
+
+    def __enter__(self):
+        self.lock.acquire()
+        try:
+            self.connection.execute('BEGIN IMMEDIATE')
+        except BaseException:
+            self.lock.release()
+            raise
+        return self.connection
+
+    def __exit__(self, exc_type, exc, tb):
+        try:
+            self.connection.execute('ROLLBACK' if exc_type else 'COMMIT')
+        finally:
+            self.lock.release()
+        return False
@@ -0,0 +1,94 @@
+import argparse
+import time
+import pandas as pd
+from src.core.predictors.huggingface_predictor import HuggingFacePredictor
+
+def count_new_tokens(predictor: HuggingFacePredictor, outputs: list) -> int:
+    """
+    Counts the generated tokens of the outputs.
+
+    Args:
+        predictor (HuggingFacePredictor): The predictor whose tokenizer is used.
+        outputs (list): The generated texts.
+
+    Returns:
+        int: The total number of generated tokens.
+    """
+    tokenizer = predictor.tokenizer
+    return sum(len(tokenizer(output, add_special_tokens=False)['input_ids']) for output in outputs)
+
+def benchmark_generation(model_name: str = 'nicholasKluge/TeenyTinyLlama-460m', dataset_path: str = 'dataset/TechHazardQA_translated.jsonl', device: str = 'cpu', num_prompts: int = 32, max_tokens: int = 64, batch_sizes: list = None, quantize: str = None, fast_decode: bool = False) -> dict:
+    """
+    Compares the generation throughput of the single-prompt path with batched generation.
+
+    Both paths decode greedily with the same token budget, so they do the same work per prompt.
+
+    Args:
+        model_name (str): The Hugging Face model name.
+        dataset_path (str): Dataset whose 'Question' column provides the prompts.
+        device (str): Device to use for inference, 'cpu' or 'gpu'.
+        num_prompts (int): Number of prompts to generate from.
+        max_tokens (int): Maximum number of tokens generated per prompt.
+        batch_sizes (list): Batch sizes of `predict_batch` to measure. Defaults to [4, 8, 16].
+        quantize (str, optional): Quantization mode of the model (e.g., 'int8'). Run once with and once
+            without it to compare resident memory and throughput.
+        fast_decode (bool): Use the static KV cache and compiled forward pass. The warm-up call is then
+            measured separately, and the final statistics split warm-up time from steady-state throughput.
+
+    Returns:
+        dict: Generated tokens per second, keyed by path ('single' or 'batch_<size>').
+    """
+    prompts = pd.read_json(dataset_path, lines=True)['Question'].head(num_prompts).tolist()
+    predictor = HuggingFacePredictor(model_name=model_name, device=device, quantize=quantize, fast_decode=fast_decode)
+    print(f"Loaded {model_name} (quantize={quantize}, fast_decode={fast_decode}): {predictor.stats()['resident_memory_mb']:.0f} MB resident")
+
+    # Warm-up, so that lazy initialization is not counted in the first measurement.
+    started = time.perf_counter()
+    predictor.predict_batch(prompts[:2], max_tokens=4, do_sample=False, batch_size=2)
+    print(f"Warm-up: {time.perf_counter() - started:.1f}s")
+
+    throughput = {}
+
+    started = time.perf_counter()
+    outputs = [predictor.predict(prompt, max_tokens=max_tokens, do_sample=False) for prompt in prompts]
+    elapsed = time.perf_counter() - started
+    tokens = count_new_tokens(predictor, outputs)
+    throughput['single'] = tokens / elapsed
+    print(f"single: {tokens} tokens in {elapsed:.1f}s ({throughput['single']:.1f} tokens/s)")
+
+    for batch_size in batch_sizes or [4, 8, 16]:
+        started = time.perf_counter()
+        outputs = predictor.predict_batch(prompts, max_tokens=max_tokens, do_sample=False, batch_size=batch_size)
+        elapsed = time.perf_counter() - started
+        tokens = count_new_tokens(predictor, outputs)
+        throughput[f'batch_{batch_size}'] = tokens / elapsed
+        speedup = throughput[f'batch_{batch_size}'] / throughput['single']
+        print(f"batch_{batch_size}: {tokens} tokens in {elapsed:.1f}s ({throughput[f'batch_{batch_size}']:.1f} tokens/s, {speedup:.2f}x)")
+
+    print(f"Generation: {predictor.stats()}")
+
+    return throughput
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Compare single-prompt and batched generation throughput of a Hugging Face model.')
+    parser.add_argument('--model_name', type=str, default='nicholasKluge/TeenyTinyLlama-460m', help='The Hugging Face model name.')
+    parser.add_argument('--dataset_path', type=str, default='dataset/TechHazardQA_translated.jsonl', help='Dataset whose questions are used as prompts.')
+    parser.add_argument('--device', type=str, default='cpu', help='Device to use for inference ("cpu" or "gpu").')
+    parser.add_argument('--num_prompts', type=int, default=32, help='Number of prompts to generate from.')
+    parser.add_argument('--max_tokens', type=int, default=64, help='Maximum number of tokens generated per prompt.')
+    parser.add_argument('--batch_sizes', type=str, default='4,8,16', help='Comma-separated batch sizes to measure.')
+    parser.add_argument('--quantize', type=str, default=None, help='Quantization mode of the model (e.g., "int8").')
+    parser.add_argument('--fast_decode', action='store_true', help='Use the static KV cache and compiled forward pass.')
+
+    args = parser.parse_args()
+
+    benchmark_generation(
+        model_name=args.model_name,
+        dataset_path=args.dataset_path,
+        device=args.device,
+        num_prompts=args.num_prompts,
+        max_tokens=args.max_tokens,
+        batch_sizes=[int(batch_size) for batch_size in args.batch_sizes.split(',')],
+        quantize=args.quantize,
+        fast_decode=args.fast_decode
+    )
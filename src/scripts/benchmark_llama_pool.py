@@ -0,0 +1,67 @@
+import argparse
+import time
+import pandas as pd
+from src.core.messages.message_manager import MessageManager
+from src.core.predictors.llama_pool_predictor import LlamaCppPoolPredictor
+
+def benchmark_llama_pool(model_name: str, dataset_path: str = 'dataset/TechHazardQA_translated.jsonl', layouts: list = None, num_prompts: int = 32, max_tokens: int = 64) -> dict:
+    """
+    Measures the aggregate generation throughput of llama.cpp worker pools with different layouts.
+
+    Args:
+        model_name (str): The path to the Llama model file (.gguf).
+        dataset_path (str): Dataset whose 'Question' column provides the prompts.
+        layouts (list): (workers, threads per worker) pairs to measure. Defaults to [(1, 8), (2, 4), (4, 2)].
+        num_prompts (int): Number of prompts generated per layout.
+        max_tokens (int): Maximum number of tokens generated per prompt.
+
+    Returns:
+        dict: Aggregate tokens per second, keyed by layout ('<workers>x<threads>').
+    """
+    message_manager = MessageManager()
+    questions = pd.read_json(dataset_path, lines=True)['Question'].head(num_prompts).tolist()
+    prompts = [message_manager.generate_message('llama-3.1', question) for question in questions]
+
+    throughput = {}
+    for workers, n_threads in layouts or [(1, 8), (2, 4), (4, 2)]:
+        predictor = LlamaCppPoolPredictor(model_name=model_name, device='cpu', workers=workers, n_threads=n_threads)
+        try:
+            # Warm-up: start every worker and load its model before measuring.
+            started = time.perf_counter()
+            predictor.predict_batch(prompts[:workers], max_tokens=1, temperature=0)
+            warmup = time.perf_counter() - started
+
+            tokens_before = predictor.stats()['generated_tokens']
+            started = time.perf_counter()
+            predictor.predict_batch(prompts, max_tokens=max_tokens, temperature=0)
+            elapsed = time.perf_counter() - started
+            tokens = predictor.stats()['generated_tokens'] - tokens_before
+        finally:
+            predictor.close()
+
+        layout = f'{workers}x{n_threads}'
+        throughput[layout] = tokens / elapsed
+        print(f"{layout}: {tokens} tokens in {elapsed:.1f}s ({throughput[layout]:.1f} tokens/s, warm-up {warmup:.1f}s)")
+
+    best = max(throughput, key=throughput.get)
+    print(f"Best layout: {best} workers x threads ({throughput[best]:.1f} tokens/s)")
+
+    return throughput
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Compare the aggregate throughput of llama.cpp worker pool layouts.')
+    parser.add_argument('--model_name', type=str, required=True, help='The path to the Llama model file (.gguf).')
+    parser.add_argument('--dataset_path', type=str, default='dataset/TechHazardQA_translated.jsonl', help='Dataset whose questions are used as prompts.')
+    parser.add_argument('--layouts', type=str, default='1x8,2x4,4x2', help='Comma-separated "<workers>x<threads>" layouts to measure.')
+    parser.add_argument('--num_prompts', type=int, default=32, help='Number of prompts generated per layout.')
+    parser.add_argument('--max_tokens', type=int, default=64, help='Maximum number of tokens generated per prompt.')
+
+    args = parser.parse_args()
+
+    benchmark_llama_pool(
+        model_name=args.model_name,
+        dataset_path=args.dataset_path,
+        layouts=[tuple(int(value) for value in layout.split('x')) for layout in args.layouts.split(',')],
+        num_prompts=args.num_prompts,
+        max_tokens=args.max_tokens
+    )
@@ -0,0 +1,297 @@
+import argparse
+import asyncio
+import os
+import socket
+from src.core.dataset import iter_jsonl_chunks, jsonl_columns
+from src.core.evaluation import Evaluation
+from src.core.messages.message_manager import MessageManager
+from src.core.messages.templates import load_templates
+from src.core.predictors.predictor_manager import PredictionManager
+from src.core.regex import classify_refusal
+from src.core.result_writer import ResultWriter, finalize_results
+from src.core.utils import load_yaml
+from src.core.work_queue import WorkQueue
+
+def enqueue(queue_path: str, dataset_path: str, service: str = 'openai', model_name: str = 'gpt-4o-mini', message_type: str = 'openai', prompt_zero_shot_name: str = None, specialist_zero_shot_name: str = None, judge_service: str = 'openai', judge_model_name: str = 'gpt-4o-mini', prefilter: bool = False, wal: bool = False) -> int:
+    """
+    Renders the zero-shot messages of every row of the dataset into a work queue.
+
+    Enqueuing again into the same queue adds only the rows it does not hold yet.
+
+    Args:
+        queue_path (str): Path to the SQLite work queue.
+        dataset_path (str): Path to the input dataset file.
+        service (str): The service name of the target model. Defaults to 'openai'.
+        model_name (str): The name of the target model. Defaults to 'gpt-4o-mini'.
+        message_type (str): The type of message to use. Defaults to 'openai'.
+        prompt_zero_shot_name (str): The template of the zero-shot prompt in `configs/message.yaml`.
+        specialist_zero_shot_name (str): The template of the specialist prompt in `configs/message.yaml`.
+        judge_service (str): The service name of the judge. Defaults to 'openai'.
+        judge_model_name (str): The name of the judge model. Defaults to 'gpt-4o-mini'.
+        prefilter (bool): Classify obvious refusals locally and send only the other responses to the judge.
+        wal (bool): Use the faster WAL journal. Only for queues whose workers all run on this host,
+            as WAL does not work over network filesystems.
+
+    Returns:
+        int: The number of rows added to the queue.
+    """
+    queue = WorkQueue(queue_path, wal=wal)
+    config = queue.config()
+    experiment = {
+        'dataset_path': dataset_path,
+        'service': service,
+        'model_name': model_name,
+        'message_type': message_type,
+        'prompt_zero_shot_name': prompt_zero_shot_name,
+        'specialist_zero_shot_name': specialist_zero_shot_name,
+        'judge_service': judge_service,
+        'judge_model_name': judge_model_name,
+        'prefilter': prefilter,
+    }
+    if config is not None and config != experiment:
+        queue.close()
+        raise ValueError(f"The queue '{queue_path}' belongs to another experiment: {config}.")
+
+    templates = load_templates('configs/message.yaml')
+    prompt_template = templates[prompt_zero_shot_name]
+    specialist_template = templates[specialist_zero_shot_name]
+    columns = jsonl_columns(dataset_path)
+    prompt_template.check_columns(columns)
+    specialist_template.check_columns(columns, optional=specialist_template.fields)
+    message_manager = MessageManager()
+
+    queue.set_config(experiment)
+    added = 0
+    # Workers can start on the first chunk while the next ones are being enqueued.
+    for chunk in iter_jsonl_chunks(dataset_path):
+        prompts = prompt_template.render_frame(chunk)
+        specialists = specialist_template.render_frame(chunk)
+        added += queue.enqueue({
+            index: {'messages': message_manager.generate_message(message_type, prompt_zero_shot, specialist_zero_shot)}
+            for index, prompt_zero_shot, specialist_zero_shot in zip(chunk.index, prompts, specialists)
+        })
+    print(f"Enqueued {added} rows. Queue: {queue.stats()}")
+    queue.close()
+
+    return added
+
+async def awork(queue_path: str, concurrency: int = 8, lease_seconds: float = 300.0, max_attempts: int = 5, poll_interval: float = 5.0, rpm: int = None, tpm: int = None, judge_rpm: int = None, judge_tpm: int = None, cache_path: str = None, cache_max_size_mb: int = None, endpoints_path: str = None) -> int:
+    """
+    Asynchronous version of `work`.
+
+    Returns:
+        int: The number of rows completed by this worker.
+    """
+    queue = WorkQueue(queue_path, lease_seconds=lease_seconds, max_attempts=max_attempts)
+    config = queue.config()
+    if config is None:
+        queue.close()
+        raise ValueError(f"The queue '{queue_path}' is empty. Enqueue the experiment first.")
+
+    shared_kwargs = {
+        'concurrency': concurrency,
+        'cache_path': cache_path,
+        'cache_max_size_bytes': cache_max_size_mb * 1024 * 1024 if cache_max_size_mb else None,
+        'endpoints': load_yaml(endpoints_path) if endpoints_path else None,
+    }
+    prediction_manager = PredictionManager(service=config['service'], model_name=config['model_name'], rpm=rpm, tpm=tpm, **shared_kwargs)
+    evaluation = Evaluation(service=config['judge_service'], model_name=config['judge_model_name'], rpm=judge_rpm, tpm=judge_tpm, **shared_kwargs)
+
+    worker = f'{socket.gethostname()}:{os.getpid()}'
+    running = {}
+    completed = 0
+
+    async def process(row, payload):
+        nonlocal completed
+        try:
+            item = {'Results': await prediction_manager.apredict(messages=payload['messages'])}
+            local_verdict = classify_refusal(item['Results']) if config['prefilter'] else None
+            if local_verdict is not None:
+                item['Evaluation'] = local_verdict
+                item['Evaluation_Stage'] = 'local'
+            else:
+                item['Evaluation'] = await evaluation.aevaluate_result(result=item['Results'])
+                item['Evaluation_Stage'] = 'judge'
+        except Exception as e:
+            await asyncio.to_thread(queue.fail, row, worker, repr(e))
+            return
+
+        if await asyncio.to_thread(queue.complete, row, worker, item):
+            completed += 1
+
+    async def heartbeat():
+        # Leases are renewed well before they expire, so slow rows are not taken over by other workers.
+        while True:
+            await asyncio.sleep(lease_seconds / 3)
+            if running:
+                await asyncio.to_thread(queue.renew, worker, list(running.values()))
+
+    renewer = asyncio.ensure_future(heartbeat())
+    try:
+        while True:
+            if len(running) < concurrency:
+                for row, payload in await asyncio.to_thread(queue.lease, worker, concurrency - len(running)):
+                    running[asyncio.ensure_future(process(row, payload))] = row
+
+            if not running:
+                stats = await asyncio.to_thread(queue.stats)
+                # Leases held by other workers may still expire and need to be taken over.
+                if not stats['pending'] and not stats['leased']:
+                    break
+                await asyncio.sleep(poll_interval)
+                continue
+
+            done, _ = await asyncio.wait(running, timeout=poll_interval, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                del running[task]
+    finally:
+        renewer.cancel()
+        for task in running:
+            task.cancel()
+        stats = queue.stats()
+        queue.close()
+
+    print(f"Worker {worker}: {completed} rows completed. Queue: {stats}")
+
+    return completed
+
+def work(queue_path: str, concurrency: int = 8, lease_seconds: float = 300.0, max_attempts: int = 5, poll_interval: float = 5.0, rpm: int = None, tpm: int = None, judge_rpm: int = None, judge_tpm: int = None, cache_path: str = None, cache_max_size_mb: int = None, endpoints_path: str = None) -> int:
+    """
+    Processes the rows of a work queue until none is left.
+
+    Any number of workers, on this host or on others sharing the queue file, can run at the
+    same time and can join a running experiment. Each one leases up to `concurrency` rows,
+    predicts and judges them and stores the results in the queue. Rows of a crashed worker
+    are taken over once their lease expires.
+
+    Args:
+        queue_path (str): Path to the SQLite work queue.
+        concurrency (int): Maximum number of rows processed at the same time. Defaults to 8.
+        lease_seconds (float): Seconds a leased row stays reserved to this worker without a renewal.
+        max_attempts (int): Number of leases after which a failing row is marked as failed.
+        poll_interval (float): Seconds between two checks of the queue while waiting for rows.
+        rpm (int): Requests-per-minute limit of this worker for the target model. Unlimited if None.
+        tpm (int): Tokens-per-minute limit of this worker for the target model. Unlimited if None.
+        judge_rpm (int): Requests-per-minute limit of this worker for the judge model. Unlimited if None.
+        judge_tpm (int): Tokens-per-minute limit of this worker for the judge model. Unlimited if None.
+        cache_path (str): Path to the SQLite response cache of this worker. Disabled if None.
+        cache_max_size_mb (int): Size above which the least recently used cache entries are evicted. Unlimited if None.
+        endpoints_path (str): YAML file listing, per service, the API keys and endpoints to spread the requests across.
+
+    Returns:
+        int: The number of rows completed by this worker.
+    """
+    return asyncio.run(awork(
+        queue_path, concurrency=concurrency, lease_seconds=lease_seconds, max_attempts=max_attempts, poll_interval=poll_interval,
+        rpm=rpm, tpm=tpm, judge_rpm=judge_rpm, judge_tpm=judge_tpm, cache_path=cache_path, cache_max_size_mb=cache_max_size_mb,
+        endpoints_path=endpoints_path
+    ))
+
+def merge(queue_path: str, output_path: str = None) -> int:
+    """
+    Writes the results of a work queue in dataset order.
+
+    The results are copied into a result log next to the queue, which is then joined with the
+    dataset like the log of `zero_shot`. Merging can run at any time, also while workers are running.
+
+    Args:
+        queue_path (str): Path to the SQLite work queue.
+        output_path (str): Path to the CSV file to write. Defaults to 'results/{model_name}_zero_shot.csv'.
+
+    Returns:
+        int: The number of dataset rows without a result yet.
+    """
+    queue = WorkQueue(queue_path)
+    config = queue.config()
+    if config is None:
+        queue.close()
+        raise ValueError(f"The queue '{queue_path}' is empty. Enqueue the experiment first.")
+
+    path_to_log = f'{os.path.splitext(queue_path)[0]}.jsonl'
+    if os.path.exists(path_to_log):
+        os.remove(path_to_log)
+    with ResultWriter(path_to_log) as writer:
+        for row, result in queue.results():
+            writer.write(row, result)
+
+    stats = queue.stats()
+    queue.close()
+    print(f"Queue: {stats}")
+
+    return finalize_results(path_to_log, iter_jsonl_chunks(config['dataset_path']), output_path or f"results/{config['model_name']}_zero_shot.csv")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Run a zero-shot experiment through a work queue shared by several workers.')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    enqueue_parser = subparsers.add_parser('enqueue', help='Add the rows of an experiment to the queue.')
+    enqueue_parser.add_argument('--queue_path', type=str, required=True, help='Path to the SQLite work queue (e.g., "queues/gpt-4o-mini.sqlite").')
+    enqueue_parser.add_argument('--dataset_path', type=str, default='dataset/TechHazardQA_translated.jsonl', help='Path to the input dataset file.')
+    enqueue_parser.add_argument('--service', type=str, default='openai', help='The service name (e.g., "openai" or other).')
+    enqueue_parser.add_argument('--model_name', type=str, default='gpt-4o-mini', help='The name of the model.')
+    enqueue_parser.add_argument('--message_type', type=str, default='openai', help='The type of message (e.g., "openai" or other).')
+    enqueue_parser.add_argument('--prompt_zero_shot_name', type=str, required=True, help='The template string for the zero-shot prompt.')
+    enqueue_parser.add_argument('--specialist_zero_shot_name', type=str, required=True, help='The template string for the specialist zero-shot prompt.')
+    enqueue_parser.add_argument('--judge_service', type=str, default='openai', help='The service name of the judge.')
+    enqueue_parser.add_argument('--judge_model_name', type=str, default='gpt-4o-mini', help='The name of the judge model.')
+    enqueue_parser.add_argument('--prefilter', action='store_true', help='Classify obvious refusals locally instead of calling the judge.')
+    enqueue_parser.add_argument('--wal', action='store_true', help='Use the WAL journal; only when every worker runs on this host (not over NFS/SMB).')
+
+    work_parser = subparsers.add_parser('work', help='Process rows of the queue until none is left.')
+    work_parser.add_argument('--queue_path', type=str, required=True, help='Path to the SQLite work queue.')
+    work_parser.add_argument('--concurrency', type=int, default=8, help='Maximum number of rows processed at the same time by this worker.')
+    work_parser.add_argument('--lease_seconds', type=float, default=300.0, help='Seconds a leased row stays reserved without a renewal.')
+    work_parser.add_argument('--max_attempts', type=int, default=5, help='Number of leases after which a failing row is marked as failed.')
+    work_parser.add_argument('--poll_interval', type=float, default=5.0, help='Seconds between two checks of the queue while waiting for rows.')
+    work_parser.add_argument('--rpm', type=int, default=None, help='Requests-per-minute limit for the target model.')
+    work_parser.add_argument('--tpm', type=int, default=None, help='Tokens-per-minute limit for the target model.')
+    work_parser.add_argument('--judge_rpm', type=int, default=None, help='Requests-per-minute limit for the judge model.')
+    work_parser.add_argument('--judge_tpm', type=int, default=None, help='Tokens-per-minute limit for the judge model.')
+    work_parser.add_argument('--cache_path', type=str, default=None, help='Path to the SQLite response cache (e.g., "cache/responses.sqlite").')
+    work_parser.add_argument('--cache_max_size_mb', type=int, default=None, help='Maximum size of the response cache in MB.')
+    work_parser.add_argument('--endpoints_path', type=str, default=None, help='YAML file listing the API keys and endpoints of each service (e.g., "configs/endpoints.yaml").')
+
+    merge_parser = subparsers.add_parser('merge', help='Write the results of the queue in dataset order.')
+    merge_parser.add_argument('--queue_path', type=str, required=True, help='Path to the SQLite work queue.')
+    merge_parser.add_argument('--output_path', type=str, default=None, help='Path to the CSV file to write.')
+
+    retry_parser = subparsers.add_parser('retry', help='Put the failed rows back in the queue.')
+    retry_parser.add_argument('--queue_path', type=str, required=True, help='Path to the SQLite work queue.')
+
+    args = parser.parse_args()
+
+    if args.command == 'enqueue':
+        enqueue(
+            queue_path=args.queue_path,
+            dataset_path=args.dataset_path,
+            service=args.service,
+            model_name=args.model_name,
+            message_type=args.message_type,
+            prompt_zero_shot_name=args.prompt_zero_shot_name,
+            specialist_zero_shot_name=args.specialist_zero_shot_name,
+            judge_service=args.judge_service,
+            judge_model_name=args.judge_model_name,
+            prefilter=args.prefilter,
+            wal=args.wal
+        )
+    elif args.command == 'work':
+        work(
+            queue_path=args.queue_path,
+            concurrency=args.concurrency,
+            lease_seconds=args.lease_seconds,
+            max_attempts=args.max_attempts,
+            poll_interval=args.poll_interval,
+            rpm=args.rpm,
+            tpm=args.tpm,
+            judge_rpm=args.judge_rpm,
+            judge_tpm=args.judge_tpm,
+            cache_path=args.cache_path,
+            cache_max_size_mb=args.cache_max_size_mb,
+            endpoints_path=args.endpoints_path
+        )
+    elif args.command == 'merge':
+        merge(queue_path=args.queue_path, output_path=args.output_path)
+    else:
+        queue = WorkQueue(args.queue_path)
+        print(f"Re-queued {queue.retry_failed()} failed rows.")
+        queue.close()
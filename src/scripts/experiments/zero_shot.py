@@ -1,13 +1,10 @@
 import argparse
-import pandas as pd
-from collections import defaultdict
+from src.core.dataset import jsonl_columns
+from src.core.experiment import add_run_arguments, run_experiment, run_options
 from src.core.messages.message_manager import MessageManager
-from src.core.predictors.predictor_manager import PredictionManager
-from src.core.evaluation import Evaluation
-from src.core.utils import load_yaml, check_file_exists
-from tqdm import tqdm
+from src.core.messages.templates import load_templates
 
-def zero_shot(dataset_path: str, service: str = 'openai', model_name: str = 'gpt-4o-mini', message_type: str = 'openai', prompt_zero_shot_name: str = None, specialist_zero_shot_name: str = None):
+def zero_shot(dataset_path: str, service: str = 'openai', model_name: str = 'gpt-4o-mini', message_type: str = 'openai', prompt_zero_shot_name: str = None, specialist_zero_shot_name: str = None, **options):
     """
     Process the dataset using zero-shot predictions.
 
@@ -16,49 +13,42 @@ def zero_shot(dataset_path: str, service: str = 'openai', model_name: str = 'gpt
         service (str): The service name ('openai' or other service). Defaults to 'openai'.
         model_name (str): The name of the model. Defaults to 'gpt-4o-mini'.
         message_type (str): The type of message to use ('openai' or other type). Defaults to 'openai'.
+        prompt_zero_shot_name (str): The template of the zero-shot prompt in `configs/message.yaml`.
+        specialist_zero_shot_name (str): The template of the specialist prompt in `configs/message.yaml`.
+        **options: The run options of `run_experiment` (concurrency, rate limits, cache, resume, judge modes,
+            Batch API, local model and streaming settings, endpoints and chunk size).
     """
-    path_to_save = f'results/{model_name}_zero_shot.csv'
-    check_file_exists(path_to_save)
-
-    message_configs = load_yaml('configs/message.yaml')
-
-    # Load the dataset
-    df = pd.read_json(dataset_path, lines=True)
+    # The templates are parsed once and checked against the dataset columns before any request is sent.
+    templates = load_templates('configs/message.yaml')
+    prompt_template = templates[prompt_zero_shot_name]
+    specialist_template = templates[specialist_zero_shot_name]
+    columns = jsonl_columns(dataset_path)
+    prompt_template.check_columns(columns)
+    # Missing Domain or Subject columns leave the specialist prompt generic.
+    specialist_template.check_columns(columns, optional=specialist_template.fields)
 
     # Initialize the MessageManager
     message_manager = MessageManager()
 
-    prediction_manager = PredictionManager(service=service, model_name=model_name)
-
-    evaluation = Evaluation()
-
-    results_zero_shot = []
-    results_evaluation = []
-    
-    for index, row in tqdm(df.iterrows(), total=len(df), desc="Zero Shot"):
-        # Get the message type and text from the specific column
-            prompt_zero_shot = message_configs[prompt_zero_shot_name].format(question = row['Question'])
-
-            # Prepare the dictionary for formatting
-            format_dict = defaultdict(str, domain=row.get('Domain', ''), subject=row.get('Subject', ''))
-
-            specialist_zero_shot = message_configs[specialist_zero_shot_name].format_map(format_dict)
-
-            # Generate the message
-            messages_zero_shot = message_manager.generate_message(message_type, prompt_zero_shot, specialist_zero_shot)
-
-            result_zero_shot = prediction_manager.predict(messages=messages_zero_shot)
-
-            result_evaluation = evaluation.evaluate_result(result = result_zero_shot)
-
-            results_zero_shot.append(result_zero_shot)
-            results_evaluation.append(result_evaluation)
-    
-    df['Results'] = results_zero_shot
-    df['Evaluation'] = results_evaluation
+    def render_chunk(chunk):
+        prompts = prompt_template.render_frame(chunk)
+        specialists = specialist_template.render_frame(chunk)
+        return [
+            {'messages': message_manager.generate_message(message_type, prompt_zero_shot, specialist_zero_shot)}
+            for prompt_zero_shot, specialist_zero_shot in zip(prompts, specialists)
+        ]
+
+    run_experiment(
+        'Zero Shot',
+        dataset_path,
+        path_to_save=f'results/{model_name}_zero_shot.csv',
+        path_to_log=f'results/{model_name}_zero_shot.jsonl',
+        service=service,
+        model_name=model_name,
+        render_chunk=render_chunk,
+        **options
+    )
 
-    df.to_csv(path_to_save, index=False)
-    
 if __name__ == "__main__":
     parser = argparse.ArgumentParser(description='Process dataset using zero-shot predictions.')
     parser.add_argument('--dataset_path', type=str, default='dataset/TechHazardQA_translated.jsonl', help='Path to the input dataset file.')
@@ -67,6 +57,7 @@ if __name__ == "__main__":
     parser.add_argument('--message_type', type=str, default='openai', help='The type of message (e.g., "openai" or other).')
     parser.add_argument('--prompt_zero_shot_name', type=str, required=True, help='The template string for the zero-shot prompt.')
     parser.add_argument('--specialist_zero_shot_name', type=str, required=True, help='The template string for the specialist zero-shot prompt.')
+    add_run_arguments(parser)
 
     args = parser.parse_args()
 
@@ -76,5 +67,6 @@ if __name__ == "__main__":
         model_name=args.model_name,
         message_type=args.message_type,
         prompt_zero_shot_name=args.prompt_zero_shot_name,
-        specialist_zero_shot_name=args.specialist_zero_shot_name
-    )
\ No newline at end of file
+        specialist_zero_shot_name=args.specialist_zero_shot_name,
+        **run_options(args)
+    )
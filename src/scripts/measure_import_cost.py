@@ -0,0 +1,69 @@
+import argparse
+import json
+import subprocess
+import sys
+
+_PROBE = """
+import importlib, json, sys, time
+started = time.perf_counter()
+from src.core.predictors.predictor_manager import PredictionManager
+from src.core.predictors.registry import BACKENDS
+from src.core.utils import get_resident_memory_mb
+if {eager}:
+    for backend in BACKENDS.values():
+        try:
+            importlib.import_module(backend.module)
+        except ImportError:
+            pass
+PredictionManager(service='openai', model_name='gpt-4o-mini', api_key='unused')
+print(json.dumps({{
+    'seconds': time.perf_counter() - started,
+    'resident_memory_mb': get_resident_memory_mb(),
+    'heavy_modules': [name for name in ('torch', 'transformers', 'llama_cpp', 'google.generativeai') if name in sys.modules],
+}}))
+"""
+
+def measure(eager: bool, repeats: int) -> dict:
+    """
+    Measures the cost of creating an OpenAI PredictionManager in a fresh interpreter.
+
+    Args:
+        eager (bool): Also import every backend module, as the manager did before backends were loaded lazily.
+        repeats (int): Number of fresh interpreters; the fastest run is kept.
+
+    Returns:
+        dict: Import and construction seconds, resident memory in MB and the heavy modules loaded.
+    """
+    runs = []
+    for _ in range(repeats):
+        output = subprocess.run([sys.executable, '-c', _PROBE.format(eager=eager)], capture_output=True, text=True, check=True).stdout
+        runs.append(json.loads(output.strip().splitlines()[-1]))
+
+    return min(runs, key=lambda run: run['seconds'])
+
+def measure_import_cost(repeats: int = 3) -> dict:
+    """
+    Compares the startup cost of an API-only run with lazy and with eager backend imports.
+
+    Args:
+        repeats (int): Number of fresh interpreters per mode.
+
+    Returns:
+        dict: The measurements, keyed by mode ('lazy' or 'eager').
+    """
+    results = {'lazy': measure(False, repeats), 'eager': measure(True, repeats)}
+    for mode, result in results.items():
+        print(f"{mode}: {result['seconds']:.2f}s, {result['resident_memory_mb']:.0f} MB resident, heavy modules: {result['heavy_modules'] or 'none'}")
+
+    print(f"Lazy loading saves {results['eager']['seconds'] - results['lazy']['seconds']:.2f}s "
+          f"and {results['eager']['resident_memory_mb'] - results['lazy']['resident_memory_mb']:.0f} MB.")
+
+    return results
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Measure the import time and memory of an API-only run.')
+    parser.add_argument('--repeats', type=int, default=3, help='Number of fresh interpreters per mode.')
+
+    args = parser.parse_args()
+
+    measure_import_cost(repeats=args.repeats)
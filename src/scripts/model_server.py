@@ -0,0 +1,58 @@
+import argparse
+from src.core.model_server import ModelServer
+from src.core.predictors.predictor_manager import PredictionManager
+
+def model_server(service: str, model_name: str, device: str = 'cpu', host: str = '127.0.0.1', port: int = 8000, max_batch_size: int = 8, max_wait_ms: float = 10.0, **kwargs):
+    """
+    Loads a local model once and serves it to every experiment through an OpenAI-compatible API.
+
+    Experiments use it with `service='local_server'` and the same `model_name`.
+
+    Args:
+        service (str): The local service to wrap ('huggingface' or 'llama_cpp').
+        model_name (str): The Hugging Face model name or the path to the GGUF file.
+        device (str): Device to use for inference, 'cpu' or 'gpu'.
+        host (str): The interface to listen on.
+        port (int): The port to listen on.
+        max_batch_size (int): Maximum number of requests generated together.
+        max_wait_ms (float): Maximum time the first request of a batch waits for others.
+        **kwargs: Additional arguments for the PredictionManager (e.g., 'quantize', 'llama_workers').
+    """
+    prediction_manager = PredictionManager(service=service, model_name=model_name, device=device, **kwargs)
+
+    server = ModelServer(prediction_manager.predictor, model_name, max_batch_size=max_batch_size, max_wait_ms=max_wait_ms)
+    server.serve(host=host, port=port)
+
+    print(f"Server: {server.stats()}")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Serve a local model to several experiment processes.')
+    parser.add_argument('--service', type=str, required=True, help='The local service to wrap ("huggingface" or "llama_cpp").')
+    parser.add_argument('--model_name', type=str, required=True, help='The Hugging Face model name or the path to the GGUF file.')
+    parser.add_argument('--device', type=str, default='cpu', help='Device to use for inference ("cpu" or "gpu").')
+    parser.add_argument('--host', type=str, default='127.0.0.1', help='The interface to listen on.')
+    parser.add_argument('--port', type=int, default=8000, help='The port to listen on.')
+    parser.add_argument('--max_batch_size', type=int, default=8, help='Maximum number of requests generated together.')
+    parser.add_argument('--max_wait_ms', type=float, default=10.0, help='Maximum time the first request of a batch waits for others.')
+    parser.add_argument('--quantize', type=str, default=None, help='Quantization mode of Hugging Face models (e.g., "int8").')
+    parser.add_argument('--fast_decode', action='store_true', help='Use the static KV cache and compiled forward pass of Hugging Face models.')
+    parser.add_argument('--prefix_cache_mb', type=int, default=None, help='Memory budget of the llama.cpp prefix state cache in MB.')
+    parser.add_argument('--llama_workers', type=int, default=1, help='Number of llama.cpp worker processes.')
+    parser.add_argument('--llama_threads', type=int, default=None, help='Number of CPU threads per llama.cpp worker.')
+
+    args = parser.parse_args()
+
+    model_server(
+        service=args.service,
+        model_name=args.model_name,
+        device=args.device,
+        host=args.host,
+        port=args.port,
+        max_batch_size=args.max_batch_size,
+        max_wait_ms=args.max_wait_ms,
+        quantize=args.quantize,
+        fast_decode=args.fast_decode,
+        prefix_cache_mb=args.prefix_cache_mb,
+        llama_workers=args.llama_workers,
+        llama_threads=args.llama_threads
+    )
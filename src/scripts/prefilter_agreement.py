@@ -0,0 +1,74 @@
+import argparse
+from collections import Counter
+import pandas as pd
+from src.core.regex import classify_refusal, normalize_verdict
+
+def prefilter_agreement(paths: list, refusal_verdict: str = 'não', show_disagreements: int = 5) -> dict:
+    """
+    Measures how often the local refusal classifier agrees with the judge on existing result files.
+
+    Args:
+        paths (list): Paths to result CSV files with 'Results' and 'Evaluation' columns.
+        refusal_verdict (str): The verdict the local stage gives to refusals.
+        show_disagreements (int): Number of disagreeing responses to print.
+
+    Returns:
+        dict: Coverage of the local stage, agreement with the judge and the confusion counts.
+    """
+    confusion = Counter()
+    total = 0
+    covered = 0
+    disagreements = []
+
+    for path in paths:
+        df = pd.read_csv(path)
+        if 'Results' not in df.columns or 'Evaluation' not in df.columns:
+            raise ValueError(f"The file '{path}' must contain 'Results' and 'Evaluation' columns.")
+
+        for result, evaluation in zip(df['Results'], df['Evaluation']):
+            judge_verdict = normalize_verdict(evaluation)
+            if judge_verdict is None:
+                continue
+
+            total += 1
+            local_verdict = classify_refusal(None if pd.isna(result) else result, refusal_verdict=refusal_verdict)
+            if local_verdict is None:
+                continue
+
+            covered += 1
+            confusion[(local_verdict, judge_verdict)] += 1
+            if local_verdict != judge_verdict and len(disagreements) < show_disagreements:
+                disagreements.append((path, judge_verdict, result))
+
+    agreed = sum(count for (local_verdict, judge_verdict), count in confusion.items() if local_verdict == judge_verdict)
+    report = {
+        'rows': total,
+        'covered': covered,
+        'coverage': covered / total if total else 0.0,
+        'agreement': agreed / covered if covered else 0.0,
+        'confusion': {f'local={local_verdict} judge={judge_verdict}': count for (local_verdict, judge_verdict), count in confusion.items()},
+    }
+
+    print(f"Rows with a judge verdict: {total}")
+    print(f"Classified locally: {covered} ({report['coverage']:.1%})")
+    print(f"Agreement with the judge: {report['agreement']:.1%}")
+    for label, count in report['confusion'].items():
+        print(f"  {label}: {count}")
+    for path, judge_verdict, result in disagreements:
+        print(f"\n[{path}] judge={judge_verdict}\n{str(result)[:300]}")
+
+    return report
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Measure the agreement between the local refusal classifier and the judge.')
+    parser.add_argument('paths', type=str, nargs='+', help='Result CSV files (e.g., "results/gpt-4o-mini_zero_shot.csv").')
+    parser.add_argument('--refusal_verdict', type=str, default='não', help='The verdict the local stage gives to refusals.')
+    parser.add_argument('--show_disagreements', type=int, default=5, help='Number of disagreeing responses to print.')
+
+    args = parser.parse_args()
+
+    prefilter_agreement(
+        paths=args.paths,
+        refusal_verdict=args.refusal_verdict,
+        show_disagreements=args.show_disagreements
+    )
@@ -0,0 +1,172 @@
+import argparse
+import asyncio
+import os
+import pandas as pd
+from src.core.evaluation import Evaluation
+from src.core.pipeline import Pipeline, Stage
+from src.core.result_writer import ResultWriter, iter_records
+from src.core.utils import load_yaml
+from tqdm import tqdm
+
+def rejudge(paths: list, service: str = 'openai', model_name: str = 'gpt-4o-mini', message_type: str = 'openai', concurrency: int = 8, rpm: int = None, tpm: int = None, adaptive_concurrency: bool = False, cache_path: str = None, cache_max_size_mb: int = None, cache_bypass: bool = False, evaluate_workers: int = None, judge_batch_size: int = 1, promote: bool = False, endpoints_path: str = None) -> dict:
+    """
+    Judges the 'Results' column of existing result files again, without regenerating the responses.
+
+    Verdicts are stored in an 'Evaluation_<version>' column, where the version is a hash of the judge
+    model and prompts (see `Evaluation.judge_version`). Only rows without a verdict for the current
+    version are sent to the judge, so a run after changing the prompts or the judge redoes every row,
+    while a repeated or interrupted run only does the missing ones.
+
+    Args:
+        paths (list): Paths to result CSV files with a 'Results' column.
+        service (str): The judge service name. Defaults to 'openai'.
+        model_name (str): The judge model name. Defaults to 'gpt-4o-mini'.
+        message_type (str): The type of message of the judge. Defaults to 'openai'.
+        concurrency (int): Maximum number of in-flight judge requests. Defaults to 8.
+        rpm (int): Requests-per-minute limit for the judge model. Unlimited if None.
+        tpm (int): Tokens-per-minute limit for the judge model. Unlimited if None.
+        adaptive_concurrency (bool): Adapt the number of in-flight requests, starting from `concurrency`.
+        cache_path (str): Path to the SQLite response cache. Disabled if None.
+        cache_max_size_mb (int): Size above which the least recently used cache entries are evicted. Unlimited if None.
+        cache_bypass (bool): Skip cache lookups but still store the fresh responses.
+        evaluate_workers (int): Number of judge requests in flight at the same time. Defaults to `concurrency`
+            (or the maximum adaptive window).
+        judge_batch_size (int): Number of responses packed into a single judge request. Defaults to 1.
+        promote (bool): Also copy the new verdicts to the 'Evaluation' column and record their version
+            in 'Evaluation_Version' ('Evaluation_Stage' becomes 'judge').
+        endpoints_path (str): YAML file listing, per service, the API keys and endpoints to spread the judge
+            requests across. Disabled if None.
+
+    Returns:
+        dict: The number of rows judged in this run, keyed by file path.
+    """
+    evaluation = Evaluation(
+        service=service,
+        model_name=model_name,
+        concurrency=concurrency,
+        rpm=rpm,
+        tpm=tpm,
+        adaptive_concurrency=adaptive_concurrency,
+        cache_path=cache_path,
+        cache_max_size_bytes=cache_max_size_mb * 1024 * 1024 if cache_max_size_mb else None,
+        cache_bypass=cache_bypass,
+        endpoints=load_yaml(endpoints_path) if endpoints_path else None
+    )
+
+    version = evaluation.judge_version(message_type, packed=judge_batch_size > 1)
+    column = f'Evaluation_{version}'
+    print(f"Judge version: {version} ({service}:{model_name})")
+
+    controller = evaluation.prediction_manager.controller
+    workers = evaluate_workers or (controller.max_limit if controller else concurrency)
+    judged = {}
+
+    for path in paths:
+        df = pd.read_csv(path)
+        if 'Results' not in df.columns:
+            raise ValueError(f"The file '{path}' must contain a 'Results' column.")
+
+        # Verdicts are logged as they arrive, so an interrupted run resumes where it stopped.
+        log_path = f'{os.path.splitext(path)[0]}.rejudge_{version}.jsonl'
+        writer = ResultWriter(log_path)
+        completed_rows = writer.completed_rows()
+
+        has_verdict = df[column].notna() if column in df.columns else pd.Series(False, index=df.index)
+        to_judge = df.index[df['Results'].notna() & ~has_verdict & ~df.index.isin(list(completed_rows))]
+
+        def pending_rows():
+            for index in to_judge:
+                yield {'index': index, 'Results': df.at[index, 'Results']}
+
+        async def evaluate(item):
+            item[column] = await evaluation.aevaluate_result(result=item['Results'], message_type=message_type)
+            return item
+
+        async def evaluate_batch(items):
+            verdicts = await evaluation.aevaluate_batch([item['Results'] for item in items], message_type=message_type, batch_size=judge_batch_size)
+            for item, verdict in zip(items, verdicts):
+                item[column] = verdict
+            return items
+
+        progress = tqdm(total=len(to_judge), desc=os.path.basename(path))
+
+        def write(item):
+            writer.write(item['index'], {column: item[column]})
+            progress.update(1)
+
+        pipeline = Pipeline([
+            Stage('evaluate', evaluate_batch if judge_batch_size > 1 else evaluate, workers=workers, batch_size=judge_batch_size),
+            Stage('write', write),
+        ])
+
+        try:
+            asyncio.run(pipeline.run(pending_rows()))
+        finally:
+            progress.close()
+            writer.close()
+
+        if column not in df.columns:
+            df[column] = None
+        for record in iter_records(log_path):
+            df.at[record['row'], column] = record[column]
+
+        if promote:
+            promoted = df[column].notna()
+            df.loc[promoted, 'Evaluation'] = df.loc[promoted, column]
+            df.loc[promoted, 'Evaluation_Version'] = version
+            if 'Evaluation_Stage' in df.columns:
+                df.loc[promoted, 'Evaluation_Stage'] = 'judge'
+
+        temporary_path = f'{path}.tmp'
+        df.to_csv(temporary_path, index=False)
+        os.replace(temporary_path, path)
+        os.remove(log_path)
+
+        judged[path] = len(to_judge)
+        print(f"{path}: {len(to_judge)} rows judged, {int(has_verdict.sum())} already had a verdict for version {version}.")
+
+    if cache_path:
+        print(f"Cache: {evaluation.prediction_manager.cache_stats()}")
+
+    if endpoints_path:
+        print(f"Judge endpoints: {evaluation.prediction_manager.endpoint_stats()}")
+
+    return judged
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Judge existing result files again without regenerating the responses.')
+    parser.add_argument('paths', type=str, nargs='+', help='Result CSV files (e.g., "results/gpt-4o-mini_zero_shot.csv").')
+    parser.add_argument('--service', type=str, default='openai', help='The judge service name (e.g., "openai" or other).')
+    parser.add_argument('--model_name', type=str, default='gpt-4o-mini', help='The judge model name.')
+    parser.add_argument('--message_type', type=str, default='openai', help='The type of message of the judge (e.g., "openai" or other).')
+    parser.add_argument('--concurrency', type=int, default=8, help='Maximum number of in-flight requests.')
+    parser.add_argument('--rpm', type=int, default=None, help='Requests-per-minute limit for the judge model.')
+    parser.add_argument('--tpm', type=int, default=None, help='Tokens-per-minute limit for the judge model.')
+    parser.add_argument('--adaptive_concurrency', action='store_true', help='Adapt the number of in-flight requests to the observed latency and throttling.')
+    parser.add_argument('--cache_path', type=str, default=None, help='Path to the SQLite response cache (e.g., "cache/responses.sqlite").')
+    parser.add_argument('--cache_max_size_mb', type=int, default=None, help='Maximum size of the response cache in MB.')
+    parser.add_argument('--cache_bypass', action='store_true', help='Ignore cached responses but store the fresh ones.')
+    parser.add_argument('--evaluate_workers', type=int, default=None, help='Number of judge requests in flight at the same time.')
+    parser.add_argument('--judge_batch_size', type=int, default=1, help='Number of responses packed into a single judge request.')
+    parser.add_argument('--endpoints_path', type=str, default=None, help='YAML file listing the API keys and endpoints of each service (e.g., "configs/endpoints.yaml").')
+    parser.add_argument('--promote', action='store_true', help='Copy the new verdicts to the "Evaluation" column.')
+
+    args = parser.parse_args()
+
+    rejudge(
+        paths=args.paths,
+        service=args.service,
+        model_name=args.model_name,
+        message_type=args.message_type,
+        concurrency=args.concurrency,
+        rpm=args.rpm,
+        tpm=args.tpm,
+        adaptive_concurrency=args.adaptive_concurrency,
+        cache_path=args.cache_path,
+        cache_max_size_mb=args.cache_max_size_mb,
+        cache_bypass=args.cache_bypass,
+        evaluate_workers=args.evaluate_workers,
+        judge_batch_size=args.judge_batch_size,
+        promote=args.promote,
+        endpoints_path=args.endpoints_path
+    )
@@ -0,0 +1,259 @@
+import argparse
+import asyncio
+import hashlib
+import itertools
+import time
+from collections import Counter
+from src.core.cache import make_cache_key
+from src.core.dataset import count_jsonl_rows, iter_jsonl_chunks, jsonl_columns
+from src.core.evaluation import Evaluation
+from src.core.messages.message_manager import MessageManager
+from src.core.messages.templates import load_templates
+from src.core.predictors.predictor_manager import PredictionManager
+from src.core.regex import classify_refusal
+from src.core.result_writer import ResultWriter, finalize_results
+from src.core.utils import load_yaml, check_file_exists
+from tqdm import tqdm
+
+def expand_matrix(config: dict) -> list:
+    """
+    Expands the matrix of a sweep config into its cells.
+
+    Args:
+        config (dict): The sweep config. Its 'matrix' holds 'models' (dicts with 'service', 'model_name'
+            and an optional 'message_type'), 'prompt_zero_shot_name' and 'specialist_zero_shot_name'
+            (lists of template names of `configs/message.yaml`).
+
+    Returns:
+        list: One dict per combination, with the model, the template names and the 'name' of the cell.
+    """
+    matrix = config['matrix']
+    cells = []
+    for model, prompt_name, specialist_name in itertools.product(matrix['models'], matrix['prompt_zero_shot_name'], matrix['specialist_zero_shot_name']):
+        cell = {
+            'service': model['service'],
+            'model_name': model['model_name'],
+            'message_type': model.get('message_type', 'openai'),
+            'prompt_zero_shot_name': prompt_name,
+            'specialist_zero_shot_name': specialist_name,
+        }
+        cell['name'] = f"{cell['model_name'].replace('/', '_')}_{prompt_name}_{specialist_name}"
+        cells.append(cell)
+
+    return cells
+
+def sweep(config_path: str, resume: bool = False, cache_path: str = None, cache_max_size_mb: int = None, cache_bypass: bool = False, prefilter: bool = False, endpoints_path: str = None) -> dict:
+    """
+    Runs every cell of an experiment matrix as one zero-shot run.
+
+    Each provider has its own feeder, which reads the dataset a chunk at a time, renders the rows of
+    the provider's cells into a work plan for that chunk and feeds it to the bounded queue of the
+    provider, so memory stays flat on large datasets. Identical rendered requests of different cells
+    (e.g., templates that ignore the domain) are generated once, and identical responses in flight
+    at the same time are judged once. Every provider works through its share of the plan at the same
+    time, bounded by its own concurrency, so the sweep takes about as long as its slowest provider. Each cell gets its own result log and CSV, and an interrupted sweep
+    continues with `resume`.
+
+    Args:
+        config_path (str): YAML sweep config with 'dataset_path', 'save_path' (default 'results'),
+            'matrix' (see `expand_matrix`), 'providers' (per-service PredictionManager arguments such as
+            'concurrency', 'rpm' and 'tpm') and 'judge' ('service', 'model_name', 'message_type' and
+            Evaluation arguments such as 'concurrency'). The optional 'chunk_size' (default 1000) is the
+            number of dataset rows planned at a time.
+        resume (bool): Continue an interrupted sweep from the result logs of its cells.
+        cache_path (str): Path to the SQLite response cache shared by the models and the judge. Disabled if None.
+        cache_max_size_mb (int): Size above which the least recently used cache entries are evicted. Unlimited if None.
+        cache_bypass (bool): Skip cache lookups but still store the fresh responses.
+        prefilter (bool): Classify obvious refusals locally and send only the other responses to the judge.
+        endpoints_path (str): YAML file listing, per service, the API keys and endpoints to spread the requests across.
+
+    Returns:
+        dict: Counts of planned, generated and judged requests, and the elapsed seconds of the sweep and of each provider.
+    """
+    config = load_yaml(config_path)
+    cells = expand_matrix(config)
+    save_path = config.get('save_path', 'results')
+    paths = {cell['name']: (f"{save_path}/{cell['name']}_zero_shot.csv", f"{save_path}/{cell['name']}_zero_shot.jsonl") for cell in cells}
+    if not resume:
+        for path_to_save, path_to_log in paths.values():
+            check_file_exists(path_to_save)
+            check_file_exists(path_to_log)
+
+    # The templates and the judge are loaded once for the whole sweep, and every template is checked before any request.
+    templates = load_templates('configs/message.yaml')
+    columns = jsonl_columns(config['dataset_path'])
+    for cell in cells:
+        templates[cell['prompt_zero_shot_name']].check_columns(columns)
+        templates[cell['specialist_zero_shot_name']].check_columns(columns, optional=templates[cell['specialist_zero_shot_name']].fields)
+    message_manager = MessageManager()
+
+    shared_kwargs = {
+        'cache_path': cache_path,
+        'cache_max_size_bytes': cache_max_size_mb * 1024 * 1024 if cache_max_size_mb else None,
+        'cache_bypass': cache_bypass,
+        'endpoints': load_yaml(endpoints_path) if endpoints_path else None,
+    }
+    providers = config.get('providers') or {}
+    managers = {}
+    for cell in cells:
+        key = (cell['service'], cell['model_name'])
+        if key not in managers:
+            managers[key] = PredictionManager(service=cell['service'], model_name=cell['model_name'], **{**shared_kwargs, **providers.get(cell['service'], {})})
+
+    judge_config = dict(config.get('judge') or {})
+    judge_message_type = judge_config.pop('message_type', 'openai')
+    evaluation = Evaluation(**{**shared_kwargs, **judge_config})
+
+    writers = {cell['name']: ResultWriter(paths[cell['name']][1]) for cell in cells}
+    completed_rows = {cell['name']: writers[cell['name']].completed_rows() for cell in cells}
+
+    def plan_chunks(service_cells: list):
+        for chunk in iter_jsonl_chunks(config['dataset_path'], chunk_size=config.get('chunk_size', 1000)):
+            entries = []
+            for cell in service_cells:
+                pending = chunk[~chunk.index.isin(completed_rows[cell['name']])]
+                prompts = templates[cell['prompt_zero_shot_name']].render_frame(pending)
+                specialists = templates[cell['specialist_zero_shot_name']].render_frame(pending)
+                for index, prompt, specialist in zip(pending.index, prompts, specialists):
+                    messages = message_manager.generate_message(cell['message_type'], prompt, specialist)
+                    key = make_cache_key(cell['service'], cell['model_name'], messages, None, 0.3)
+                    entries.append((cell, index, messages, key))
+            yield entries
+
+    # Number of queued plan entries waiting on each generation, and of entries waiting on each
+    # verdict, so that finished responses and verdicts can be released.
+    consumers = Counter()
+    verdict_consumers = Counter()
+    counters = Counter(planned=0, generated=0, judged=0, failed=0)
+    finished_at = {}
+    rows = count_jsonl_rows(config['dataset_path'])
+    progress = tqdm(total=sum(rows - len(completed_rows[cell['name']]) for cell in cells), desc="Sweep")
+
+    async def run():
+        concurrency = {service: providers.get(service, {}).get('concurrency', 8) for service, _ in managers}
+        semaphores = {service: asyncio.Semaphore(limit) for service, limit in concurrency.items()}
+        judge_concurrency = judge_config.get('concurrency', 8)
+        judge_semaphore = asyncio.Semaphore(judge_concurrency)
+        # Workers waiting on the judge do not hold a generation slot, so each provider gets enough
+        # workers to keep both its generations and the judge busy.
+        workers = {service: limit + judge_concurrency for service, limit in concurrency.items()}
+        queues = {service: asyncio.Queue(maxsize=2 * workers[service]) for service in concurrency}
+        generations = {}
+        verdicts = {}
+        started = time.perf_counter()
+
+        async def generate(cell, messages):
+            async with semaphores[cell['service']]:
+                return await managers[(cell['service'], cell['model_name'])].apredict(messages=messages)
+
+        async def judge(result):
+            async with judge_semaphore:
+                return await evaluation.aevaluate_result(result=result, message_type=judge_message_type)
+
+        async def run_entry(cell, index, messages, key):
+            if key not in generations:
+                generations[key] = asyncio.ensure_future(generate(cell, messages))
+                counters['generated'] += 1
+            try:
+                result = await asyncio.shield(generations[key])
+            finally:
+                consumers[key] -= 1
+                if not consumers[key]:
+                    del consumers[key]
+                    del generations[key]
+            finished_at[cell['service']] = time.perf_counter() - started
+
+            record = {'Results': result}
+            local_verdict = classify_refusal(result) if prefilter else None
+            if local_verdict is not None:
+                record['Evaluation'] = local_verdict
+                record['Evaluation_Stage'] = 'local'
+            else:
+                verdict_key = hashlib.sha256(str(result).encode('utf-8')).hexdigest()
+                if verdict_key not in verdicts:
+                    verdicts[verdict_key] = asyncio.ensure_future(judge(result))
+                    counters['judged'] += 1
+                verdict_consumers[verdict_key] += 1
+                verdict = verdicts[verdict_key]
+                try:
+                    record['Evaluation'] = await asyncio.shield(verdict)
+                except Exception:
+                    # A failed verdict is not reused, so the next identical response asks the judge again.
+                    if verdicts.get(verdict_key) is verdict:
+                        del verdicts[verdict_key]
+                    raise
+                finally:
+                    verdict_consumers[verdict_key] -= 1
+                    if not verdict_consumers[verdict_key]:
+                        del verdict_consumers[verdict_key]
+                        verdicts.pop(verdict_key, None)
+                record['Evaluation_Stage'] = 'judge'
+
+            writers[cell['name']].write(index, record)
+            progress.update(1)
+
+        async def feed(service):
+            # Each provider reads the dataset with its own feeder, so a full queue only holds back its own provider.
+            queue = queues[service]
+            for entries in plan_chunks([cell for cell in cells if cell['service'] == service]):
+                # Every duplicate of the chunk is counted before the first one can finish and release its generation.
+                consumers.update(key for _, _, _, key in entries)
+                counters['planned'] += len(entries)
+                for entry in entries:
+                    await queue.put(entry)
+            for _ in range(workers[service]):
+                await queue.put(None)
+
+        async def work(queue):
+            while True:
+                entry = await queue.get()
+                if entry is None:
+                    return
+                try:
+                    await run_entry(*entry)
+                except Exception:
+                    # Rows whose requests kept failing stay out of the logs and are retried on resume.
+                    counters['failed'] += 1
+
+        await asyncio.gather(*(feed(service) for service in queues), *(work(queues[service]) for service in queues for _ in range(workers[service])))
+        return time.perf_counter() - started
+
+    try:
+        elapsed = asyncio.run(run())
+    finally:
+        progress.close()
+        for writer in writers.values():
+            writer.close()
+
+    for cell in cells:
+        path_to_save, path_to_log = paths[cell['name']]
+        finalize_results(path_to_log, iter_jsonl_chunks(config['dataset_path']), path_to_save)
+
+    stats = {**counters, 'elapsed_seconds': elapsed, 'provider_seconds': finished_at}
+    print(f"Sweep: {len(cells)} cells, {stats}")
+    if cache_path:
+        print(f"Judge cache: {evaluation.prediction_manager.cache_stats()}")
+
+    return stats
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Run every cell of an experiment matrix as one zero-shot sweep.')
+    parser.add_argument('--config_path', type=str, default='configs/sweep.yaml', help='YAML sweep config with the dataset, matrix, providers and judge.')
+    parser.add_argument('--resume', action='store_true', help='Continue an interrupted sweep, skipping the rows already in the result logs.')
+    parser.add_argument('--cache_path', type=str, default=None, help='Path to the SQLite response cache (e.g., "cache/responses.sqlite").')
+    parser.add_argument('--cache_max_size_mb', type=int, default=None, help='Maximum size of the response cache in MB.')
+    parser.add_argument('--cache_bypass', action='store_true', help='Ignore cached responses but store the fresh ones.')
+    parser.add_argument('--prefilter', action='store_true', help='Classify obvious refusals locally instead of calling the judge.')
+    parser.add_argument('--endpoints_path', type=str, default=None, help='YAML file listing the API keys and endpoints of each service (e.g., "configs/endpoints.yaml").')
+
+    args = parser.parse_args()
+
+    sweep(
+        config_path=args.config_path,
+        resume=args.resume,
+        cache_path=args.cache_path,
+        cache_max_size_mb=args.cache_max_size_mb,
+        cache_bypass=args.cache_bypass,
+        prefilter=args.prefilter,
+        endpoints_path=args.endpoints_path
+    )
@@ -0,0 +1,69 @@
+import json
+from types import SimpleNamespace
+
+class FakeBatchAPI:
+    """In-memory stand-in for the file and batch endpoints of the OpenAI client.
+
+    Batches finish after `polls_to_finish` status checks. Every request is answered with
+    'echo: <last message>', except the ids in `fail_once` (which fail in their first batch
+    only) and in `fail_always`.
+    """
+
+    def __init__(self, polls_to_finish: int = 1, fail_once=(), fail_always=(), interrupt_on_poll: int = None):
+        self.polls_to_finish = polls_to_finish
+        self.fail_once = set(fail_once)
+        self.fail_always = set(fail_always)
+        self.interrupt_on_poll = interrupt_on_poll
+
+        self.files = SimpleNamespace(create=self._create_file, content=self._file_content)
+        self.batches = SimpleNamespace(create=self._create_batch, retrieve=self._retrieve_batch)
+
+        self._files = {}
+        self._batches = {}
+        self.submitted = []
+        self.polls = 0
+
+    def _add_file(self, content: bytes) -> str:
+        file_id = f'file_{len(self._files)}'
+        self._files[file_id] = content
+        return file_id
+
+    def _create_file(self, file, purpose: str):
+        return SimpleNamespace(id=self._add_file(file.read()), purpose=purpose)
+
+    def _file_content(self, file_id: str):
+        return SimpleNamespace(text=self._files[file_id].decode('utf-8'))
+
+    def _create_batch(self, input_file_id: str, endpoint: str, completion_window: str):
+        batch_id = f'batch_{len(self._batches)}'
+        lines = [json.loads(line) for line in self._files[input_file_id].decode('utf-8').splitlines()]
+        self._batches[batch_id] = {'lines': lines, 'polls': 0, 'output_file_id': None, 'error_file_id': None}
+        self.submitted.append([line['custom_id'] for line in lines])
+        return SimpleNamespace(id=batch_id)
+
+    def _retrieve_batch(self, batch_id: str):
+        self.polls += 1
+        if self.interrupt_on_poll is not None and self.polls == self.interrupt_on_poll:
+            raise KeyboardInterrupt
+
+        batch = self._batches[batch_id]
+        batch['polls'] += 1
+        if batch['polls'] < self.polls_to_finish:
+            return SimpleNamespace(id=batch_id, status='in_progress', output_file_id=None, error_file_id=None)
+
+        if batch['output_file_id'] is None:
+            outputs = []
+            errors = []
+            for line in batch['lines']:
+                custom_id = line['custom_id']
+                if custom_id in self.fail_always or custom_id in self.fail_once:
+                    self.fail_once.discard(custom_id)
+                    errors.append({'custom_id': custom_id, 'response': {'status_code': 500, 'body': {'error': {'message': 'server error'}}}})
+                else:
+                    content = 'echo: ' + line['body']['messages'][-1]['content']
+                    outputs.append({'custom_id': custom_id, 'response': {'status_code': 200, 'body': {'choices': [{'message': {'content': content}}]}}})
+            batch['output_file_id'] = self._add_file('\n'.join(json.dumps(output) for output in outputs).encode('utf-8'))
+            if errors:
+                batch['error_file_id'] = self._add_file('\n'.join(json.dumps(error) for error in errors).encode('utf-8'))
+
+        return SimpleNamespace(id=batch_id, status='completed', output_file_id=batch['output_file_id'], error_file_id=batch['error_file_id'])
@@ -0,0 +1,59 @@
+import asyncio
+import time
+from src.core.predictors.base import PredictionModel
+
+class SlowStreamPredictor(PredictionModel):
+    """Local-style predictor whose chunks take a while, to cancel streams mid-generation."""
+
+    def __init__(self, chunks: int = 3, chunk_seconds: float = 0.05):
+        self.chunks = chunks
+        self.chunk_seconds = chunk_seconds
+        self.closed = 0
+
+    def predict(self, messages, max_tokens: int = 16, temperature: float = 0.3) -> str:
+        return f'answer to {messages}'
+
+    def stream(self, messages, max_tokens: int = 16, temperature: float = 0.3):
+        try:
+            for number in range(self.chunks):
+                time.sleep(self.chunk_seconds)
+                yield f'{number} '
+        finally:
+            self.closed += 1
+
+async def consume(predictor, messages):
+    return ''.join([chunk async for chunk in predictor.astream(messages)])
+
+def test_astream_yields_the_chunks_of_stream():
+    predictor = SlowStreamPredictor()
+
+    assert asyncio.run(consume(predictor, 'a')) == '0 1 2 '
+    assert predictor.closed == 1
+
+def test_cancelled_astream_waiting_for_the_lock_releases_it():
+    predictor = SlowStreamPredictor()
+
+    async def run():
+        first = asyncio.ensure_future(consume(predictor, 'a'))
+        await asyncio.sleep(0.01)
+        second = asyncio.ensure_future(consume(predictor, 'b'))
+        await asyncio.sleep(0.01)
+        second.cancel()
+        assert await first == '0 1 2 '
+        return await asyncio.wait_for(predictor.apredict('c'), timeout=5)
+
+    assert asyncio.run(run()) == 'answer to c'
+
+def test_astream_cancelled_mid_chunk_closes_the_stream_and_releases_the_lock():
+    predictor = SlowStreamPredictor(chunks=10, chunk_seconds=0.05)
+
+    async def run():
+        task = asyncio.ensure_future(consume(predictor, 'a'))
+        await asyncio.sleep(0.07)
+        task.cancel()
+        await asyncio.gather(task, return_exceptions=True)
+        return await asyncio.wait_for(predictor.apredict('b'), timeout=5)
+
+    assert asyncio.run(run()) == 'answer to b'
+    assert predictor.closed == 1
+    assert not predictor._predict_lock.locked()
@@ -0,0 +1,62 @@
+import pytest
+from src.core.batch_api import BatchRunner
+from tests.fake_batch_api import FakeBatchAPI
+
+def make_requests(*custom_ids):
+    return {custom_id: {'model': 'gpt-4o-mini', 'messages': [{'role': 'user', 'content': custom_id}]} for custom_id in custom_ids}
+
+def test_submits_polls_and_collects(tmp_path):
+    client = FakeBatchAPI(polls_to_finish=3)
+    runner = BatchRunner(client, str(tmp_path), poll_interval=0)
+
+    results = runner.run(make_requests('a', 'b'))
+
+    assert results == {'a': 'echo: a', 'b': 'echo: b'}
+    assert client.submitted == [['a', 'b']]
+    assert client.polls == 3
+
+def test_resubmits_only_failed_requests(tmp_path):
+    client = FakeBatchAPI(fail_once={'b'})
+    runner = BatchRunner(client, str(tmp_path), poll_interval=0)
+
+    results = runner.run(make_requests('a', 'b', 'c'))
+
+    assert results == {'a': 'echo: a', 'b': 'echo: b', 'c': 'echo: c'}
+    assert client.submitted == [['a', 'b', 'c'], ['b']]
+    assert runner.attempts == {'a': 1, 'b': 2, 'c': 1}
+    assert runner.errors == {}
+
+def test_gives_up_after_max_attempts(tmp_path):
+    client = FakeBatchAPI(fail_always={'b'})
+    runner = BatchRunner(client, str(tmp_path), poll_interval=0, max_attempts=2)
+
+    results = runner.run(make_requests('a', 'b'))
+
+    assert results == {'a': 'echo: a', 'b': None}
+    assert client.submitted == [['a', 'b'], ['b']]
+    assert runner.errors == {'b': 'server error'}
+
+def test_resume_keeps_attempts_and_results(tmp_path):
+    requests = make_requests('a', 'b')
+    BatchRunner(FakeBatchAPI(fail_always={'b'}), str(tmp_path), poll_interval=0, max_attempts=2).run(requests)
+
+    client = FakeBatchAPI()
+    runner = BatchRunner(client, str(tmp_path), poll_interval=0, max_attempts=2)
+    results = runner.run(requests)
+
+    assert results == {'a': 'echo: a', 'b': None}
+    assert client.submitted == []
+    assert runner.attempts == {'a': 1, 'b': 2}
+
+def test_resume_polls_submitted_batches_instead_of_resubmitting(tmp_path):
+    requests = make_requests('a', 'b')
+    client = FakeBatchAPI(interrupt_on_poll=1)
+    with pytest.raises(KeyboardInterrupt):
+        BatchRunner(client, str(tmp_path), poll_interval=0).run(requests)
+
+    # The interrupted batch is still known to the server and finishes there.
+    client.interrupt_on_poll = None
+    results = BatchRunner(client, str(tmp_path), poll_interval=0).run(requests)
+
+    assert results == {'a': 'echo: a', 'b': 'echo: b'}
+    assert client.submitted == [['a', 'b']]
@@ -0,0 +1,50 @@
+import asyncio
+from src.core.evaluation import EnsembleEvaluation
+
+class FixedJudge:
+    """Judge answering a fixed verdict, or raising when the verdict is an exception."""
+
+    def __init__(self, verdict, delay: float = 0):
+        self.verdict = verdict
+        self.delay = delay
+
+    async def aevaluate_result(self, result, message_type):
+        await asyncio.sleep(self.delay)
+        if isinstance(self.verdict, Exception):
+            raise self.verdict
+        return self.verdict
+
+def make_ensemble(*judges, quorum: int = None) -> EnsembleEvaluation:
+    ensemble = EnsembleEvaluation.__new__(EnsembleEvaluation)
+    ensemble.quorum = quorum or len(judges) // 2 + 1
+    ensemble.judges = [(f'judge:{number}', judge, 'openai') for number, judge in enumerate(judges)]
+    return ensemble
+
+def test_ensemble_stops_at_the_quorum():
+    ensemble = make_ensemble(FixedJudge('sim'), FixedJudge('sim'), FixedJudge('não', delay=5))
+
+    outcome = asyncio.run(ensemble.aevaluate_result('resposta'))
+
+    assert outcome['verdict'] == 'sim'
+    assert outcome['quorum_reached']
+    assert outcome['votes']['judge:2'] == 'cancelled'
+    assert outcome['agreement'] == 1.0
+
+def test_ensemble_without_quorum_returns_the_plurality_verdict():
+    ensemble = make_ensemble(FixedJudge('não'), FixedJudge('sim'), FixedJudge('não'), FixedJudge(RuntimeError('down')))
+
+    outcome = asyncio.run(ensemble.aevaluate_result('resposta'))
+
+    assert outcome['verdict'] == 'não'
+    assert not outcome['quorum_reached']
+    assert outcome['votes']['judge:3'] == 'error'
+    assert outcome['agreement'] == 2 / 3
+
+def test_ensemble_tie_leaves_the_verdict_undecided_whatever_the_arrival_order():
+    for delays in ((0, 0.01, 0.02, 0.03), (0.03, 0.02, 0.01, 0)):
+        judges = [FixedJudge(verdict, delay) for verdict, delay in zip(('sim', 'não', 'sim', 'não'), delays)]
+        outcome = asyncio.run(make_ensemble(*judges).aevaluate_result('resposta'))
+
+        assert outcome['verdict'] is None
+        assert not outcome['quorum_reached']
+        assert outcome['agreement'] is None
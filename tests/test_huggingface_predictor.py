@@ -0,0 +1,72 @@
+import pytest
+
+torch = pytest.importorskip('torch')
+transformers = pytest.importorskip('transformers')
+tokenizers = pytest.importorskip('tokenizers')
+
+from src.core.predictors.huggingface_predictor import HuggingFacePredictor
+
+CHAT = [{'role': 'user', 'content': 'Qual é a capital do Brasil?'}]
+
+@pytest.fixture(scope='module')
+def tiny_model(tmp_path_factory):
+    """A randomly initialized two-layer Llama with a small byte-level tokenizer, saved like a Hub model."""
+    path = str(tmp_path_factory.mktemp('tiny_llama'))
+
+    tokenizer = tokenizers.Tokenizer(tokenizers.models.BPE(unk_token='<unk>'))
+    tokenizer.pre_tokenizer = tokenizers.pre_tokenizers.ByteLevel(add_prefix_space=False)
+    tokenizer.decoder = tokenizers.decoders.ByteLevel()
+    trainer = tokenizers.trainers.BpeTrainer(
+        vocab_size=300,
+        special_tokens=['<unk>', '<s>', '</s>'],
+        initial_alphabet=tokenizers.pre_tokenizers.ByteLevel.alphabet()
+    )
+    tokenizer.train_from_iterator(['Olá, bom dia! Qual é a capital do Brasil? Sim, não.'] * 10, trainer)
+
+    fast_tokenizer = transformers.PreTrainedTokenizerFast(
+        tokenizer_object=tokenizer,
+        bos_token='<s>',
+        eos_token='</s>',
+        unk_token='<unk>',
+        model_input_names=['input_ids', 'attention_mask']
+    )
+    fast_tokenizer.chat_template = "{% for message in messages %}{{ message['role'] }}: {{ message['content'] }}\n{% endfor %}assistant:"
+    fast_tokenizer.save_pretrained(path)
+
+    torch.manual_seed(0)
+    config = transformers.LlamaConfig(
+        vocab_size=len(fast_tokenizer),
+        hidden_size=32,
+        intermediate_size=64,
+        num_hidden_layers=2,
+        num_attention_heads=4,
+        max_position_embeddings=512,
+        bos_token_id=fast_tokenizer.bos_token_id,
+        eos_token_id=fast_tokenizer.eos_token_id
+    )
+    transformers.LlamaForCausalLM(config).save_pretrained(path)
+
+    return path
+
+@pytest.fixture
+def no_compile(monkeypatch):
+    # Compiling the forward pass takes minutes on CPU and does not change the outputs.
+    monkeypatch.setattr(torch, 'compile', lambda function, **kwargs: function)
+
+@pytest.mark.parametrize('messages', ['Olá, bom dia!', CHAT], ids=['prompt', 'chat'])
+def test_predict_returns_only_the_generated_text(tiny_model, messages):
+    predictor = HuggingFacePredictor(tiny_model)
+
+    output = predictor.predict(messages, max_tokens=5, do_sample=False)
+
+    assert isinstance(output, str)
+    assert not output.startswith('Olá, bom dia!')
+    assert output == predictor.predict_batch([messages], max_tokens=5, do_sample=False)[0]
+
+@pytest.mark.parametrize('messages', ['Olá, bom dia!', CHAT], ids=['prompt', 'chat'])
+def test_fast_decode_matches_the_default_path(tiny_model, no_compile, messages):
+    default = HuggingFacePredictor(tiny_model).predict(messages, max_tokens=5, do_sample=False)
+    fast = HuggingFacePredictor(tiny_model, fast_decode=True).predict(messages, max_tokens=5, do_sample=False)
+
+    assert isinstance(fast, str)
+    assert fast == default